@@ -0,0 +1,156 @@
+"""Agent 消息处理流程（main*.py 与单进程启动器共用）"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from ai_agent import AIAgent
+from message_coalescer import MessageCoalescer
+from stale_replies import ChannelActivity, InFlightReply
+
+logger = logging.getLogger(__name__)
+
+# 投机生成专用线程池（与判断调用并行执行）
+_speculative_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative")
+
+
+class SpeculativeBudget:
+    """
+    投机生成的预算：限制每小时被丢弃的投机生成次数
+    
+    判断通过的投机生成本来就要调用，不算额外开销；只有判断为"不回复"而被丢弃的
+    生成才是浪费。滑动一小时窗口内浪费次数达到上限后，退回先判断后生成的串行模式。
+    """
+    
+    def __init__(self, max_wasted_per_hour: int):
+        self.max_wasted_per_hour = max_wasted_per_hour
+        self._wasted: deque[float] = deque()
+        self._lock = threading.Lock()
+    
+    def _prune(self, now: float):
+        while self._wasted and now - self._wasted[0] > 3600:
+            self._wasted.popleft()
+    
+    def available(self) -> bool:
+        """当前是否还能投机"""
+        with self._lock:
+            self._prune(time.monotonic())
+            return len(self._wasted) < self.max_wasted_per_hour
+    
+    def record_waste(self):
+        """记录一次被丢弃的投机生成"""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            self._wasted.append(now)
+
+
+def create_channel_activity(agent: AIAgent, nickname: str) -> ChannelActivity:
+    """创建 Agent 的频道进度跟踪（用于放弃过时的回复）"""
+    return ChannelActivity(nickname, AIAgent.KNOWN_BOTS, agent.agent_config.stale_reply_after)
+
+
+def deliver_reply(agent: AIAgent, irc_client, channel: str, sender: str, message: str,
+                  inflight: InFlightReply | None = None):
+    """
+    生成回复并发送；开启流式时每完成一句就立即发送
+
+    Args:
+        inflight: 这条消息的进度标记；对话已经继续时放弃回复（流式生成会中断请求）
+    """
+    cancelled = inflight.is_stale if inflight is not None else None
+    if cancelled is not None and cancelled():
+        return
+
+    if agent.openai_config.stream:
+        for sentence in agent.generate_response_stream(channel, sender, message, cancelled):
+            irc_client.send_message(channel, sentence)
+        return
+
+    response = agent.generate_response(channel, sender, message, cancelled)
+    if response is None:
+        return
+
+    # 发送回复（不添加前缀，让 AI 自己决定如何回复）
+    irc_client.send_message(channel, response)
+
+
+def respond_speculatively(agent: AIAgent, irc_client, nickname: str, budget: SpeculativeBudget,
+                          channel: str, sender: str, message: str, inflight: InFlightReply | None = None):
+    """
+    投机模式：需要 LLM 判断时，判断与生成同时开始
+
+    判断通过则直接使用已生成（或正在生成）的草稿，端到端延迟约为两者中较慢的一个；
+    判断不通过则丢弃草稿。同步客户端无法中途取消 HTTP 请求，尚未开始的草稿会被取消，
+    已在进行中的会在后台跑完后被丢弃。草稿生成失败时按普通流程重新生成，行为与串行模式一致。
+    """
+    decision = agent.check_fast_path(message, sender, nickname)
+    if decision is None:
+        decision = agent.check_local_model(message, sender)
+    if decision is False:
+        return
+    if decision is True:
+        logger.info(f"触发回复条件: {sender}: {message}")
+        deliver_reply(agent, irc_client, channel, sender, message, inflight)
+        return
+
+    draft = _speculative_pool.submit(agent.draft_response, channel, sender, message)
+    if not agent.judge_with_llm(message, sender):
+        if not draft.cancel():
+            budget.record_waste()
+        return
+
+    logger.info(f"触发回复条件（投机）: {sender}: {message}")
+    reply, ok = draft.result()
+    if not ok:
+        logger.warning("投机草稿生成失败，改用普通流程")
+        deliver_reply(agent, irc_client, channel, sender, message, inflight)
+        return
+    if inflight is not None and inflight.is_stale():
+        return
+    agent.commit_response(channel, sender, message, reply)
+    irc_client.send_message(channel, reply)
+
+
+def create_message_handler(agent: AIAgent, irc_client, nickname: str) -> Callable[[str, str, str], None]:
+    """
+    创建标准的消息处理器：判断 → 生成 → 发送
+
+    Args:
+        agent: 处理消息的 AI Agent
+        irc_client: IRCClient 或 AsyncIRCClient
+        nickname: bot 昵称
+
+    Returns:
+        可注册到 irc_client.on_message 的处理函数（开启消息合并时，同一个人的连续消息合并后再处理）
+    """
+    budget = None
+    if agent.agent_config.speculative_generation:
+        budget = SpeculativeBudget(agent.agent_config.speculative_waste_per_hour)
+        logger.info(f"已启用投机生成，每小时最多丢弃 {budget.max_wasted_per_hour} 次")
+
+    # 收到时就计数，而不是等排到处理时：前一条还在生成时，后面排队的消息也能让它过时
+    activity = create_channel_activity(agent, nickname)
+    irc_client.on_receive(activity.received)
+
+    def handle_message(channel: str, sender: str, message: str):
+        """处理 IRC 消息"""
+        inflight = activity.claim(channel, sender, message)
+
+        if budget is not None and budget.available():
+            respond_speculatively(agent, irc_client, nickname, budget, channel, sender, message, inflight)
+            return
+
+        # 判断是否需要回复
+        if agent.should_respond(message, sender, nickname):
+            logger.info(f"触发回复条件: {sender}: {message}")
+
+            # 生成并发送回复
+            deliver_reply(agent, irc_client, channel, sender, message, inflight)
+
+    window = agent.agent_config.coalesce_window
+    if window > 0:
+        logger.info(f"已启用消息合并，窗口 {window} 秒")
+        return MessageCoalescer(handle_message, window, passthrough=agent.is_known_bot).submit
+    return handle_message
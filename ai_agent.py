@@ -1,14 +1,24 @@
 """OpenAI Agent 实现"""
-import json
 import logging
 import os
 import re
 import tempfile
+import threading
 from datetime import datetime
+from typing import Callable, Iterator
 from openai import OpenAI
 from config import OpenAIConfig, AgentConfig
+from openai_clients import get_openai_client
 from weather_service import get_city_weather
 from news_fetcher import format_news_for_injection
+from context_snapshot import format_context, get_context_snapshot, prefetch_context
+from conversation_history import ConversationHistory
+from history_summarizer import HistorySummarizer
+from trigger_matcher import GREETING, KEYWORD, MENTION, TriggerMatcher
+from relevance_filter import RelevanceFilter
+from judge_cache import JudgeCache, fingerprint
+from prompt_builder import PromptCacheStats, build_messages
+from status_publisher import APPEND, EVICT, RESET, StatusPublisher
 
 logger = logging.getLogger(__name__)
 
@@ -23,34 +33,29 @@ def format_current_time(location: str = None, include_news: bool = True) -> str:
     
     Returns:
         格式化的时间字符串，如：2025年10月13日 星期二 22点45分，北京☀️晴朗，气温12°C
-    """
-    current_time = datetime.now()
-    weekdays = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
-    weekday = weekdays[current_time.weekday()]
-    
-    time_str = (f"{current_time.year}年{current_time.month}月{current_time.day}日 "
-                f"{weekday} {current_time.hour}点{current_time.minute}分")
     
+    注意：本函数每次都会同步查询天气、读取新闻文件；回复路径上请使用
+    context_snapshot.get_context_snapshot（带缓存、不阻塞）。
+    """
+    weather = None
     # 如果提供了城市，添加天气信息
     if location:
         try:
             weather = get_city_weather(location)
-            time_str += f"，{location}{weather}"
         except Exception as e:
             logger.warning(f"获取天气信息失败: {e}")
             # 获取天气失败不影响时间显示
     
     # 添加今日重要新闻
+    news_info = ""
     if include_news:
         try:
             news_info = format_news_for_injection()
-            if news_info:
-                time_str += f"\n[今日要闻：{news_info}]"
         except Exception as e:
             logger.warning(f"获取新闻信息失败: {e}")
             # 获取新闻失败不影响时间显示
     
-    return time_str
+    return format_context(datetime.now(), location, weather, news_info)
 
 
 def remove_parenthetical_content(text: str) -> str:
@@ -72,6 +77,56 @@ def remove_parenthetical_content(text: str) -> str:
     return text.strip()
 
 
+class StreamingParenStripper:
+    """
+    remove_parenthetical_content 的增量版本（用于流式回复）
+    
+    逐段喂入模型输出的增量文本，括号外每出现一个句末标点或换行就产出一句清理后的文本；
+    只有处在未闭合的括号内时才暂存，括号闭合后立即继续。
+    """
+    
+    SENTENCE_ENDS = "。！？!?…\n"
+    # 紧跟在句末标点后、应归入同一句的字符（连续标点、右引号）
+    TRAILING = "。！？!?…”’」』\"'"
+    OPEN_BRACKETS = "（("
+    CLOSE_BRACKETS = "）)"
+    
+    def __init__(self):
+        self._buffer: list[str] = []
+        self._depth = 0
+        self._sentence_ended = False
+    
+    def feed(self, delta: str) -> list[str]:
+        """喂入增量文本，返回已完成的句子（可能为空列表）"""
+        sentences = []
+        for ch in delta:
+            if self._sentence_ended and ch not in self.TRAILING:
+                self._sentence_ended = False
+                sentence = self._take()
+                if sentence:
+                    sentences.append(sentence)
+            
+            self._buffer.append(ch)
+            if ch in self.OPEN_BRACKETS:
+                self._depth += 1
+            elif ch in self.CLOSE_BRACKETS:
+                self._depth = max(0, self._depth - 1)
+            elif ch in self.SENTENCE_ENDS and self._depth == 0:
+                self._sentence_ended = True
+        return sentences
+    
+    def flush(self) -> str:
+        """流结束时取出剩余内容（未闭合的括号按原规则只移除括号符号）"""
+        self._depth = 0
+        self._sentence_ended = False
+        return self._take()
+    
+    def _take(self) -> str:
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        return remove_parenthetical_content(text)
+
+
 class AIAgent:
     """基于 OpenAI 的 AI Agent"""
     
@@ -79,125 +134,198 @@ class AIAgent:
     
     # 已知的 bot 昵称列表
     KNOWN_BOTS = ["mingxuan", "yueran", "zhiyuan"]
+    _known_bots_lower = frozenset(name.lower() for name in KNOWN_BOTS)
     
     # 全局字典，存储所有agent实例（用于web监控）
     _instances = {}
     
-    def __init__(self, openai_config: OpenAIConfig, agent_config: AgentConfig, nickname: str = None):
+    def __init__(self, openai_config: OpenAIConfig, agent_config: AgentConfig, nickname: str = None,
+                 client: OpenAI = None):
         self.openai_config = openai_config
         self.agent_config = agent_config
         self.nickname = nickname  # agent昵称，用于标识
-        self.client = OpenAI(
-            api_key=openai_config.api_key,
-            base_url=openai_config.base_url
+        # 允许注入共享客户端（单进程多 agent 时共用连接池）
+        self.client = client or get_openai_client(openai_config.api_key, openai_config.base_url)
+        # 对话历史：按 token 预算保留最近的对话（预算随模型配置）
+        self.conversation_history = ConversationHistory(
+            agent_config.system_prompt, openai_config.history_token_budget
         )
-        # 对话历史（简单实现，可以后续优化为更复杂的记忆系统）
-        self.conversation_history: list[dict] = [
-            {"role": "system", "content": agent_config.system_prompt}
-        ]
-        self.max_history = 20  # 保留最近的对话
+        # 滚动摘要：被淘汰的旧对话在后台合并成摘要
+        self.summarizer = None
+        if agent_config.summarize_history:
+            self.summarizer = HistorySummarizer(self.client, openai_config.model, speaker=nickname or "我")
+        # 本地预判模型（按昵称区分人格，需要昵称才启用）
+        self.relevance_filter = None
+        if agent_config.relevance_filter and nickname:
+            self.relevance_filter = RelevanceFilter(nickname)
+        # LLM 判断结果缓存（重复的闲聊直接复用上次的判断）
+        self.judge_cache = JudgeCache(ttl=agent_config.judge_cache_ttl) if agent_config.judge_cache_ttl > 0 else None
+        # 前缀缓存命中统计（来自 API 返回的 usage）
+        self.prompt_cache_stats = PromptCacheStats()
+        # 触发词匹配器（按昵称构建一次，见 _get_matcher）
+        self._matcher: TriggerMatcher | None = None
+        # 历史记录锁：asyncio 传输模式下多个分发 worker 可能并发调用本 agent
+        self._history_lock = threading.RLock()
         # 随机最大 bot 连续轮数（1~3）
         self.max_bot_turns = self.random.randint(1, 3)
         # 最后消息时间（用于时间重置）
         self.last_message_time = None
+        # 最近一次请求注入的时间信息（状态文件直接复用，不再重新生成）
+        self._injected_time_info = None
         # 提前触发 client 初始化，避免在多线程环境中首次调用时出错
         try:
             _ = self.client.models
         except Exception:
             pass  # 忽略初始化错误
         
+        # 后台预热天气缓存（尽力而为，不阻塞启动）
+        prefetch_context(agent_config.location)
+        
         # 注册到全局实例字典（用于web监控）
         if nickname:
             AIAgent._instances[nickname] = self
-            # 同时创建状态文件用于进程间通信
+            # 同时创建状态文件用于进程间通信（后台线程写入，不占用回复时间）
             self._status_file_path = os.path.join(
                 tempfile.gettempdir(), 
                 f"irc_agent_{nickname}.json"
             )
+            self.status_publisher = StatusPublisher(self._status_file_path, self._build_status)
             self._update_status_file()
     
     def _update_status_file(self):
-        """更新状态文件（每个agent独立的JSON文件）"""
+        """通知后台线程更新状态文件（每个agent独立的JSON文件）"""
         if not self.nickname:
             return
-        
-        try:
-            # 生成当前注入的时间和天气信息（与generate_response中保持一致）
-            time_info = f"[当前时间：{format_current_time(self.agent_config.location)}]"
-            
-            status_data = {
+        self.status_publisher.publish()
+    
+    def _emit_status(self, kind: str, **fields):
+        """登记对话历史的变化事件（调用方需持有 _history_lock）"""
+        if self.nickname:
+            self.status_publisher.emit(kind, **fields)
+    
+    def _build_status(self, include_history: bool = True) -> dict:
+        """生成状态数据（在状态发布线程中调用）；不含历史时只生成元数据"""
+        with self._history_lock:
+            status = {
                 'nickname': self.nickname,
                 'last_update': datetime.now().isoformat(),
-                'conversation_history': self.conversation_history.copy(),
-                'injected_time_info': time_info,  # 添加注入的时间信息
+                'history_summary': self.summarizer.summary if self.summarizer else "",
+                'injected_time_info': self._injected_time_info,  # 最近一次请求注入的时间信息
                 'max_bot_turns': self.max_bot_turns,
                 'last_message_time': self.last_message_time.isoformat() if self.last_message_time else None,
-                'history_length': len(self.conversation_history)
+                'judge_cache': self.judge_cache.stats() if self.judge_cache else None,
+                'prompt_cache': self.prompt_cache_stats.stats()
             }
-            
-            with open(self._status_file_path, 'w', encoding='utf-8') as f:
-                json.dump(status_data, f, ensure_ascii=False, indent=2)
-                
-        except Exception as e:
-            logger.warning(f"更新状态文件失败: {e}")
+            if include_history:
+                status['conversation_history'] = self.conversation_history.messages()
+                status['history_length'] = len(self.conversation_history)
+                # 与历史在同一把锁下读取：快照恰好包含 seq 及之前的所有事件
+                status['seq'] = self.status_publisher.current_seq()
+        return status
     
     def should_respond(self, message: str, sender: str, bot_nickname: str) -> bool:
         """判断是否应该响应这条消息 - 使用 AI 智能判断"""
+        decision = self.check_fast_path(message, sender, bot_nickname)
+        if decision is not None:
+            return decision
+        decision = self.check_local_model(message, sender)
+        if decision is not None:
+            return decision
+        return self.judge_with_llm(message, sender)
+    
+    def check_fast_path(self, message: str, sender: str, bot_nickname: str) -> bool | None:
+        """
+        本地规则判断（不调用 LLM）
+        
+        Returns:
+            True 必须回复（被提及 / 问候），False 不回复（自己的消息 / 连续轮数已满），
+            None 无法确定，需要交给 LLM 判断
+        """
         # 忽略自己发送的消息
         if sender == bot_nickname:
             return False
         
         # 判断发送者是否为人类（不在已知 bot 列表中，大小写不敏感）
-        is_human = sender.lower() not in [bot.lower() for bot in self.KNOWN_BOTS]
-        
-        message_lower = message.lower()
+        is_human = not self.is_known_bot(sender)
+        if is_human:
+            # 人类发言，重新随机最大轮数
+            self.max_bot_turns = self.random.randint(1, 3)
+            self._update_status_file()
         
         # 0. 检查连续对话轮数 - 如果太多轮，只有被 @ 或人类发言才回复
-        consecutive_bot_turns = 0
-        for msg in reversed(self.conversation_history[1:]):  # 跳过系统提示
-            if msg["role"] == "assistant":
-                consecutive_bot_turns += 1
-            else:
-                # 遇到任何用户消息（包括人类和其他bot），检查是否为人类
-                for bot_name in self.KNOWN_BOTS:
-                    if bot_name in msg["content"]:
-                        # 是 bot 消息，继续计数
-                        break
-                else:
-                    # 是人类消息，重置最大轮数并停止计数
-                    self.max_bot_turns = self.random.randint(1, 3)
-                    break
+        consecutive_bot_turns = self.conversation_history.bot_streak
         
         # 如果已经达到最大轮数，且不是人类发言，则不回复
         if consecutive_bot_turns >= self.max_bot_turns and not is_human:
             logger.info(f"已连续对话 {consecutive_bot_turns} 轮（最大{self.max_bot_turns}），暂停回复等待人类")
             return False
         
+        trigger = self.classify_trigger(message, bot_nickname)
+        
         # 1. 如果直接提及 bot 名字，必须回复
-        if bot_nickname.lower() in message_lower:
+        if trigger == MENTION:
             return True
         
         # 2. 对常见问候语快速响应
-        greetings = [
-            # 通用问候
-            "大家好", "有人么", "有人吗", "在吗", "在不在",
-            "hello", "hi", "hey", "anyone", "anyone here",
-            "有没有人", "人呢", "都在吗",
-            # 时间问候
-            "早上好", "上午好", "中午好", "下午好", "晚上好", "晚安",
-            "good morning", "good afternoon", "good evening", "good night",
-            # 称呼问候
-            "两位", "各位", "大伙", "诸位"
-        ]
-        for greeting in greetings:
-            if greeting in message_lower:
-                logger.info(f"检测到问候语，将回复: {message[:50]}...")
-                return True
+        if trigger == GREETING:
+            logger.info(f"检测到问候语，将回复: {message[:50]}...")
+            return True
+        
+        return None
+    
+    def check_local_model(self, message: str, sender: str) -> bool | None:
+        """
+        本地模型预判（不调用 LLM）
+        
+        Returns:
+            True/False 模型有把握的结论，None 表示拿不准或未启用，需要 LLM 判断
+        """
+        if self.relevance_filter is None:
+            return None
+        decision = self.relevance_filter.decide(message, self.is_known_bot(sender))
+        if decision is not None:
+            logger.info(f"本地预判{'需要' if decision else '不需要'}回复: {message[:50]}...")
+        return decision
+    
+    def _get_matcher(self, bot_nickname: str | None) -> TriggerMatcher:
+        """获取（必要时构建）当前昵称的触发词匹配器"""
+        matcher = self._matcher
+        if matcher is None or matcher.nickname != bot_nickname:
+            matcher = TriggerMatcher(bot_nickname, self.agent_config.trigger_keywords)
+            self._matcher = matcher
+        return matcher
+    
+    def classify_trigger(self, message: str, bot_nickname: str | None = None) -> str | None:
+        """
+        一次扫描判断消息的触发类型
+        
+        Returns:
+            MENTION（点名）、GREETING（问候）、KEYWORD（关键词）或 None
+        """
+        return self._get_matcher(bot_nickname or self.nickname).match(message)
+    
+    def is_known_bot(self, sender: str) -> bool:
+        """发送者是否为已知 bot（按昵称判断，大小写不敏感）"""
+        return sender.lower() in self._known_bots_lower
+    
+    def matches_trigger_keywords(self, message: str) -> bool:
+        """关键词触发（LLM 判断失败时的降级方案）"""
+        return KEYWORD in self._get_matcher(self.nickname).scan(message)
+    
+    def judge_with_llm(self, message: str, sender: str) -> bool:
+        """使用 AI 判断是否需要参与对话（本地规则无法确定时调用）"""
+        # 相同（归一化后）的消息在相同的上下文状态下直接复用缓存的判断
+        is_bot = self.is_known_bot(sender)
+        cache_key = (fingerprint(message), is_bot, min(self.conversation_history.bot_streak, 3))
+        if self.judge_cache is not None:
+            cached = self.judge_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"使用缓存的判断结果（{'回复' if cached else '不回复'}）: {message[:50]}...")
+                return cached
         
-        # 3. 使用 AI 判断是否需要参与对话
         try:
             # 获取当前时间和天气（包含星期）
-            time_str = format_current_time(self.agent_config.location)
+            time_str = get_context_snapshot(self.agent_config.location)
             
             # 构建判断提示
             judge_prompt = f"""你是 IRC 聊天室的参与者。判断是否回应这条消息：
@@ -241,82 +369,111 @@ class AIAgent:
             if should_reply:
                 logger.info(f"AI 判断需要回复: {message[:50]}...")
             
+            if self.judge_cache is not None:
+                self.judge_cache.put(cache_key, should_reply)
+            
+            # 记录判断结果，用于训练本地预判模型
+            if self.relevance_filter is not None:
+                self.relevance_filter.record(message, is_bot, should_reply)
+            
             return should_reply
             
         except Exception as e:
             logger.error(f"AI 判断失败: {e}")
             # 如果判断失败，降级到关键词触发
-            for keyword in self.agent_config.trigger_keywords:
-                if keyword.lower() in message_lower:
-                    return True
-            return False
+            return self.matches_trigger_keywords(message)
     
-    def generate_response(self, channel: str, sender: str, message: str) -> str:
-        """生成对消息的回复"""
-        now = datetime.now()
-        
-        # 检查距离上次消息是否超过30分钟，如果是则重置历史
-        if self.last_message_time is not None:
-            time_gap = (now - self.last_message_time).total_seconds() / 60  # 分钟
-            if time_gap > 30:
-                logger.info(f"距离上次消息已过 {time_gap:.1f} 分钟，重置对话历史")
-                self.conversation_history = [
-                    {"role": "system", "content": self.agent_config.system_prompt}
-                ]
-        
-        # 更新最后消息时间
-        self.last_message_time = now
-        
-        # 添加用户消息到历史
-        user_message = f"[来自 {sender} 在 {channel}]: {message}"
-        self.conversation_history.append({
-            "role": "user",
-            "content": user_message
-        })
-        
-        # 保持历史长度
-        if len(self.conversation_history) > self.max_history:
-            # 保留系统提示和最近的消息
-            self.conversation_history = [
-                self.conversation_history[0]
-            ] + self.conversation_history[-(self.max_history-1):]
-        
-        # 统计最近的连续 bot 对话轮数（从历史记录倒数）
-        consecutive_bot_turns = 0
-        for msg in reversed(self.conversation_history[1:]):  # 跳过系统提示
-            if msg["role"] == "assistant":
-                consecutive_bot_turns += 1
-            else:
-                # 遇到用户消息，检查是否为人类
-                is_human_msg = True
-                for bot_name in self.KNOWN_BOTS:
-                    if bot_name in msg["content"]:
-                        # 是 bot 消息
-                        is_human_msg = False
-                        break
-                if is_human_msg:
-                    # 如果遇到人类发言，停止计数
-                    break
-        
-        # 在最后一条消息中添加对话轮数提示
-        context_note = f"\n\n[系统提示：这是最近第 {consecutive_bot_turns + 1} 轮 bot 连续对话。如果已经3轮以上，应该暂停让人类参与]"
-        self.conversation_history[-1]["content"] += context_note
-        
-        # 更新系统提示，添加当前时间和天气信息（包含星期）
-        time_info = f"\n\n[当前时间：{format_current_time(self.agent_config.location)}]"
+    def _prepare_messages(self, channel: str, sender: str, message: str, commit: bool = True) -> list[dict]:
+        """
+        构建本次请求的消息列表（包含时间信息）
         
-        # 创建包含时间信息的消息列表（不修改原始历史记录中的系统提示）
-        messages_with_time = self.conversation_history.copy()
-        messages_with_time[0] = {
-            "role": "system",
-            "content": self.agent_config.system_prompt + time_info
-        }
+        Args:
+            commit: True 时把用户消息写入历史；False 时只在副本上构建（用于投机生成，
+                    判断通过后再调用 commit_response 写入）
+        """
+        with self._history_lock:
+            now = datetime.now()
+            history = self.conversation_history if commit else self.conversation_history.copy()
+            
+            # 检查距离上次消息是否超过30分钟，如果是则重置历史
+            if self.last_message_time is not None:
+                time_gap = (now - self.last_message_time).total_seconds() / 60  # 分钟
+                if time_gap > 30:
+                    evicted = history.reset()
+                    if commit:
+                        logger.info(f"距离上次消息已过 {time_gap:.1f} 分钟，重置对话历史"
+                                    + ("（保留对话摘要）" if self.summarizer else ""))
+                        self._emit_status(RESET)
+                        self._fold_into_summary(evicted, force=True)
+            
+            user_message = f"[来自 {sender} 在 {channel}]: {message}"
+            
+            # 最近的连续 bot 对话轮数（人类发言则从零开始）
+            is_bot = self.is_known_bot(sender)
+            consecutive_bot_turns = history.bot_streak if is_bot else 0
+            
+            # 添加用户消息到历史，超出 token 预算时淘汰最旧的消息
+            message_entry = {
+                "role": "user",
+                "content": user_message
+            }
+            evicted = history.append(message_entry, sender=sender, is_bot=is_bot)
+            
+            if commit:
+                # 更新最后消息时间
+                self.last_message_time = now
+                self._fold_into_summary(evicted)
+                self._emit_history_append(message_entry, evicted)
+            
+            # 时间、天气、新闻和对话轮数提示每次都会变化，放在请求末尾（只附加在本次请求上，
+            # 不写入历史），系统提示、摘要和历史组成的前缀保持不变，服务端前缀缓存才能命中
+            time_info = f"[当前时间：{get_context_snapshot(self.agent_config.location)}]"
+            if commit:
+                self._injected_time_info = time_info
+            volatile_context = (
+                f"{time_info}\n"
+                f"[系统提示：这是最近第 {consecutive_bot_turns + 1} 轮 bot 连续对话。如果已经3轮以上，应该暂停让人类参与]"
+            )
+            
+            # 较早对话的摘要紧跟在系统提示之后
+            summary_message = self.summarizer.summary_message() if self.summarizer else None
+            return build_messages(history.messages(), summary_message, volatile_context)
+    
+    def _fold_into_summary(self, evicted: list[dict], force: bool = False):
+        """把被淘汰的消息交给后台摘要器（未启用摘要时直接丢弃）"""
+        if self.summarizer and evicted:
+            self.summarizer.fold(evicted, force=force)
+    
+    def _record_reply(self, cleaned_message: str):
+        """添加助手回复到历史（使用清理后的消息）并更新状态文件"""
+        with self._history_lock:
+            message = {
+                "role": "assistant",
+                "content": cleaned_message
+            }
+            evicted = self.conversation_history.append(message, sender=self.nickname)
+            
+            # 更新状态文件
+            self._emit_history_append(message, evicted)
+    
+    def _emit_history_append(self, message: dict, evicted: list[dict]):
+        """登记新增消息及随之淘汰的旧消息"""
+        self._emit_status(APPEND, message=message)
+        if evicted:
+            self._emit_status(EVICT, count=len(evicted))
+    
+    def _complete(self, messages: list[dict]) -> tuple[str, bool]:
+        """
+        调用 API 并清理回复
         
+        Returns:
+            (回复文本, 是否成功)；失败时回复文本为给用户看的提示语，不应写入历史
+        """
         try:
             # 调用 OpenAI API
             response = self.client.chat.completions.create(
                 model=self.openai_config.model,
-                messages=messages_with_time,  # 使用包含时间信息的消息列表
+                messages=messages,  # 使用包含时间信息的消息列表
                 max_tokens=self.openai_config.max_tokens,
                 temperature=self.openai_config.temperature
             )
@@ -324,17 +481,18 @@ class AIAgent:
             # 健壮的响应解析
             if not response or not response.choices:
                 logger.error(f"API 返回了空响应: {response}")
-                return "抱歉，我没有收到有效的响应。"
+                return "抱歉，我没有收到有效的响应。", False
+            self.prompt_cache_stats.record(getattr(response, "usage", None))
             
             choice = response.choices[0]
             if not choice or not choice.message:
                 logger.error(f"API 返回的 choice 无效: {choice}")
-                return "抱歉，响应格式异常。"
+                return "抱歉，响应格式异常。", False
             
             assistant_message = choice.message.content
             if not assistant_message:
                 logger.error(f"API 返回的 content 为空")
-                return "抱歉，我暂时无话可说。"
+                return "抱歉，我暂时无话可说。", False
             
             # 清理括号内容（防止 AI 添加舞台指示或元评论）
             cleaned_message = remove_parenthetical_content(assistant_message)
@@ -346,25 +504,137 @@ class AIAgent:
             elif cleaned_message != assistant_message:
                 logger.info(f"已清理括号内容: {assistant_message[:100]}... -> {cleaned_message[:100]}...")
             
-            # 添加助手回复到历史（使用清理后的消息）
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": cleaned_message
-            })
-            
-            # 更新状态文件
-            self._update_status_file()
+            return cleaned_message, True
             
+        except Exception as e:
+            logger.error(f"调用 OpenAI API 失败: {e}", exc_info=True)
+            return f"抱歉，我遇到了一些问题: {str(e)}", False
+    
+    def generate_response(self, channel: str, sender: str, message: str,
+                          cancelled: Callable[[], bool] | None = None) -> str | None:
+        """
+        生成对消息的回复
+        
+        Args:
+            cancelled: 生成完成后检查，返回 True 表示对话已经继续、回复已过时
+        
+        Returns:
+            回复文本；回复已过时返回 None（不写入历史）
+        """
+        messages_with_time = self._prepare_messages(channel, sender, message)
+        cleaned_message, ok = self._complete(messages_with_time)
+        if cancelled is not None and cancelled():
+            logger.info(f"丢弃过时的回复: {cleaned_message[:50]}...")
+            return None
+        if ok:
+            # 添加助手回复到历史（使用清理后的消息）
+            self._record_reply(cleaned_message)
             logger.info(f"生成回复: {cleaned_message}")
-            return cleaned_message
+        return cleaned_message
+    
+    def draft_response(self, channel: str, sender: str, message: str) -> tuple[str, bool]:
+        """
+        投机生成：在不修改对话历史的前提下生成回复草稿
+        
+        与 should_respond 并行执行；判断通过后用 commit_response 写入历史，否则直接丢弃。
+        """
+        return self._complete(self._prepare_messages(channel, sender, message, commit=False))
+    
+    def commit_response(self, channel: str, sender: str, message: str, reply: str):
+        """把投机生成的草稿连同对应的用户消息写入对话历史"""
+        self._prepare_messages(channel, sender, message)
+        self._record_reply(reply)
+        logger.info(f"生成回复（投机）: {reply}")
+    
+    def generate_response_stream(self, channel: str, sender: str, message: str,
+                                 cancelled: Callable[[], bool] | None = None) -> Iterator[str]:
+        """
+        流式生成回复：边接收 token 边按句子产出清理后的文本
+        
+        调用方拿到一句就可以立即发送，不必等待整段回复生成完毕。
+        全部产出后，完整回复写入对话历史。
+        
+        Args:
+            cancelled: 每收到一段增量时检查，返回 True 时立即中断请求；
+                       已经产出的句子照常写入历史，未产出的部分丢弃
+        """
+        messages_with_time = self._prepare_messages(channel, sender, message)
+        stripper = StreamingParenStripper()
+        raw_parts: list[str] = []
+        sentences: list[str] = []
+        
+        try:
+            extra = {"stream_options": {"include_usage": True}} if self.openai_config.stream_usage else {}
+            stream = self.client.chat.completions.create(
+                model=self.openai_config.model,
+                messages=messages_with_time,
+                max_tokens=self.openai_config.max_tokens,
+                temperature=self.openai_config.temperature,
+                stream=True,
+                **extra
+            )
+            # 中途取消、出错或调用方提前停止迭代时都要关闭流，及时归还连接和并发名额
+            try:
+                for chunk in stream:
+                    if cancelled is not None and cancelled():
+                        self._record_partial_reply(sentences)
+                        return
+                    # 最后一个 chunk 只带 usage，没有 choices
+                    if getattr(chunk, "usage", None):
+                        self.prompt_cache_stats.record(chunk.usage)
+                    if not chunk.choices or not chunk.choices[0].delta:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    raw_parts.append(delta)
+                    for sentence in stripper.feed(delta):
+                        sentences.append(sentence)
+                        yield sentence
+            finally:
+                stream.close()
             
+            tail = stripper.flush()
+            if tail:
+                sentences.append(tail)
+                yield tail
+                
         except Exception as e:
             logger.error(f"调用 OpenAI API 失败: {e}", exc_info=True)
-            return f"抱歉，我遇到了一些问题: {str(e)}"
+            if not sentences:
+                yield f"抱歉，我遇到了一些问题: {str(e)}"
+                return
+        
+        if not sentences:
+            assistant_message = "".join(raw_parts).strip()
+            if not assistant_message:
+                logger.error(f"API 流式返回的 content 为空")
+                yield "抱歉，我暂时无话可说。"
+                return
+            # 清理括号后为空，使用原消息（与非流式行为一致）
+            logger.warning(f"清理括号后消息为空，使用原消息: {assistant_message}")
+            sentences.append(assistant_message)
+            yield assistant_message
+        
+        # 历史中记录整段清理后的文本（与非流式一致）
+        cleaned_message = remove_parenthetical_content("".join(raw_parts)) or " ".join(sentences)
+        self._record_reply(cleaned_message)
+        logger.info(f"生成回复（流式）: {cleaned_message}")
+    
+    def _record_partial_reply(self, sentences: list[str]):
+        """流式回复被中断：只把已经发出的句子写入历史"""
+        if not sentences:
+            logger.info("回复已过时，中断生成")
+            return
+        partial = "".join(sentences)
+        self._record_reply(partial)
+        logger.info(f"回复已过时，中断生成（已发送部分）: {partial}")
     
     def reset_conversation(self):
         """重置对话历史"""
-        self.conversation_history = [
-            {"role": "system", "content": self.agent_config.system_prompt}
-        ]
+        with self._history_lock:
+            self.conversation_history.reset()
+            self._emit_status(RESET)
+        if self.summarizer:
+            self.summarizer.clear()
         logger.info("对话历史已重置")
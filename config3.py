@@ -18,6 +18,13 @@ class IRCConfig:
     # SASL 认证（如果需要）
     sasl_username: str = os.getenv("IRC_SASL_USERNAME", "")
     sasl_password: str = os.getenv("IRC_SASL_PASSWORD", "")
+    # 传输模式：miniirc（线程模型）或 asyncio（读写任务 + 有界分发队列）
+    transport: str = os.getenv("IRC_TRANSPORT", "miniirc")
+    dispatch_queue_size: int = int(os.getenv("IRC_DISPATCH_QUEUE_SIZE", "100"))
+    dispatch_workers: int = int(os.getenv("IRC_DISPATCH_WORKERS", "4"))
+    # 出站限速（令牌桶）：每秒发送行数与突发上限
+    send_rate: float = float(os.getenv("IRC_SEND_RATE", "0.5"))
+    send_burst: int = int(os.getenv("IRC_SEND_BURST", "4"))
 
 
 @dataclass
@@ -28,6 +35,12 @@ class OpenAIConfig:
     model: str = os.getenv("LING_MODEL", "Ling-1T")
     max_tokens: int = 500
     temperature: float = 0.6  # 更沉稳理性
+    # 流式回复：边生成边按句子发送，缩短首句出现时间
+    stream: bool = os.getenv("LING_STREAM", "false").lower() == "true"
+    # 流式回复时请求返回 usage（用于统计前缀缓存命中），服务端不支持 stream_options 时关闭
+    stream_usage: bool = os.getenv("LING_STREAM_USAGE", "false").lower() == "true"
+    # 对话历史的 token 预算（含系统提示），超出时淘汰最旧的消息
+    history_token_budget: int = int(os.getenv("LING_HISTORY_TOKEN_BUDGET", "6000"))
 
 
 @dataclass
@@ -38,6 +51,21 @@ class AgentConfig:
     # 触发关键词
     trigger_on_mention: bool = True
     trigger_keywords: list[str] = None
+    # 投机生成：需要 LLM 判断时同时开始生成回复，判断不通过则丢弃
+    speculative_generation: bool = os.getenv("SPECULATIVE_GENERATION", "false").lower() == "true"
+    # 每小时最多丢弃多少次投机生成（超出后退回串行模式）
+    speculative_waste_per_hour: int = int(os.getenv("SPECULATIVE_WASTE_PER_HOUR", "30"))
+    # 滚动摘要：被淘汰或重置的旧对话在后台折叠成摘要，放在系统提示之后（会额外调用 LLM）
+    # 注意：开启后 30 分钟无消息的自动重置只清空原始消息，摘要会保留下来
+    summarize_history: bool = os.getenv("SUMMARIZE_HISTORY", "false").lower() == "true"
+    # 本地预判：用历史判断记录训练的轻量模型先判断，拿不准才调用 LLM
+    relevance_filter: bool = os.getenv("RELEVANCE_FILTER", "false").lower() == "true"
+    # LLM 判断结果的缓存有效期（秒），0 表示不缓存
+    judge_cache_ttl: int = int(os.getenv("JUDGE_CACHE_TTL", "600"))
+    # 同一个人在多少秒内连续发送的消息合并成一轮处理，0 表示逐条处理
+    coalesce_window: float = float(os.getenv("COALESCE_WINDOW", "0"))
+    # 生成期间频道里又来了多少条新消息就放弃这条回复，0 表示只在人类点名其他 bot 时放弃
+    stale_reply_after: int = int(os.getenv("STALE_REPLY_AFTER", "3"))
     # 系统提示 - 第三个 bot 的性格：历史学家视角（赫拉利风格）
     system_prompt: str = """你是 IRC 聊天室的参与者志远（zhiyuan），喜欢用历史和社会学的视角看问题。你的说话风格受到尤瓦尔·赫拉利的启发——善用宏观叙事和日常类比。你现在在上海。
 
@@ -0,0 +1,90 @@
+"""上下文快照 - 时间、天气、新闻注入信息的缓存
+
+同一分钟内、同一城市的注入文本只构建一次，所有调用方（判断、生成、状态文件）拿到的是同一个字符串：
+- 时间：按分钟取整（注入文本本身只精确到分钟）
+- 天气：只读天气缓存，缺失或过期时在后台刷新，绝不在回复路径上同步访问网络
+- 新闻：由 format_news_for_injection 按 latest_news.json 的版本缓存，文件不变就不重新读取和解析
+"""
+import logging
+import threading
+from datetime import datetime
+from typing import Optional
+from news_fetcher import format_news_for_injection
+from weather_service import peek_city_weather
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ["星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日"]
+
+
+def format_context(now: datetime, location: Optional[str], weather: Optional[str], news_info: str) -> str:
+    """
+    拼接注入文本，如：2025年10月13日 星期二 22点45分，北京☀️晴朗，气温12°C
+
+    Args:
+        now: 当前时间
+        location: 城市名称，None 表示不显示天气
+        weather: 天气描述，None 表示暂时无法获取
+        news_info: 今日要闻（空字符串表示没有）
+    """
+    time_str = (f"{now.year}年{now.month}月{now.day}日 "
+                f"{WEEKDAYS[now.weekday()]} {now.hour}点{now.minute}分")
+
+    if location:
+        time_str += f"，{location}{weather or '天气信息暂时无法获取'}"
+
+    if news_info:
+        time_str += f"\n[今日要闻：{news_info}]"
+
+    return time_str
+
+
+class ContextSnapshotProvider:
+    """按分钟缓存的上下文快照"""
+
+    def __init__(self):
+        self._snapshots: dict[tuple[Optional[str], bool], tuple[tuple, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, location: Optional[str] = None, include_news: bool = True) -> str:
+        """获取当前的注入文本（同一分钟内天气和新闻不变时返回同一个字符串）"""
+        now = datetime.now()
+        weather = peek_city_weather(location) if location else None
+
+        news_info = ""
+        if include_news:
+            try:
+                news_info = format_news_for_injection()
+            except Exception as e:
+                logger.warning(f"获取新闻信息失败: {e}")
+
+        with self._lock:
+            version = (now.strftime("%Y%m%d%H%M"), weather, news_info)
+
+            cached = self._snapshots.get((location, include_news))
+            if cached and cached[0] == version:
+                return cached[1]
+
+            text = format_context(now, location, weather, news_info)
+            self._snapshots[(location, include_news)] = (version, text)
+            return text
+
+
+# 全局单例
+_provider = ContextSnapshotProvider()
+
+
+def get_context_snapshot(location: Optional[str] = None, include_news: bool = True) -> str:
+    """便捷函数：获取当前的时间/天气/新闻注入文本"""
+    return _provider.get(location, include_news)
+
+
+def prefetch_context(location: Optional[str] = None):
+    """
+    预热天气缓存（Agent 启动时调用）
+
+    尽力而为：只在后台启动一次刷新，立即返回，不保证在首条回复前完成；
+    刷新未完成时首条回复的上下文里暂时没有天气。
+    """
+    if location:
+        peek_city_weather(location)
@@ -0,0 +1,131 @@
+"""对话历史管理 - 按 token 预算保留最近的对话
+
+每条消息在写入时估算一次 token 数并累加到总数，超出预算时从最旧的一端淘汰，
+发给模型的提示长度因此可预测，不会被几条长消息撑爆，短闲聊也能保留更多上下文。
+每条记录同时带上发送者和是否为 bot，连续 bot 轮数在写入时增量维护，不必回扫历史。
+"""
+import logging
+from collections import deque
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# 每条消息的格式开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 token 数（不依赖分词器）
+
+    中日韩字符约 1 字 1 token，其余字符约 4 个 1 token。
+    """
+    wide = sum(1 for ch in text if ch >= "\u2e80")  # U+2E80 起为中日韩字符及全角符号
+    return wide + (len(text) - wide + 3) // 4
+
+
+class HistoryEntry:
+    """一条历史记录"""
+    __slots__ = ("message", "tokens", "sender", "is_bot")
+
+    def __init__(self, message: dict, tokens: int, sender: Optional[str], is_bot: bool):
+        self.message = message
+        self.tokens = tokens
+        self.sender = sender
+        self.is_bot = is_bot
+
+
+class ConversationHistory:
+    """
+    带 token 预算的对话历史
+
+    第一条永远是系统提示（不参与淘汰），之后是按时间顺序的对话消息。
+    """
+
+    def __init__(self, system_prompt: str, token_budget: int, evict_ratio: float = 0.75):
+        """
+        Args:
+            system_prompt: 系统提示
+            token_budget: 历史（含系统提示）的 token 上限；最新一条消息总是保留
+            evict_ratio: 超出预算时一次淘汰到预算的多少比例。按批淘汰让历史开头
+                         在多轮对话间保持不变，服务端的前缀缓存才能命中
+        """
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.token_budget = token_budget
+        self.evict_ratio = evict_ratio
+        self._system_tokens = estimate_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+        self._entries: deque[HistoryEntry] = deque()
+        self.total_tokens = self._system_tokens
+        # 最近一次人类发言之后的助手回复数（连续 bot 对话轮数）
+        self.bot_streak = 0
+
+    def append(self, message: dict, sender: Optional[str] = None, is_bot: bool = False) -> list[dict]:
+        """
+        追加一条消息，超出预算时淘汰最旧的消息
+
+        Args:
+            message: {"role": ..., "content": ...}
+            sender: 发送者昵称（助手消息为自己的昵称）
+            is_bot: 发送者是否为 bot；人类的用户消息会把连续轮数清零
+
+        Returns:
+            被淘汰的消息（按时间顺序）
+        """
+        if message["role"] == "assistant":
+            is_bot = True
+            self.bot_streak += 1
+        elif not is_bot:
+            self.bot_streak = 0
+
+        tokens = estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+        self._entries.append(HistoryEntry(message, tokens, sender, is_bot))
+        self.total_tokens += tokens
+
+        evicted = []
+        if self.total_tokens <= self.token_budget:
+            return evicted
+        target = self.token_budget * self.evict_ratio
+        while self.total_tokens > target and len(self._entries) > 1:
+            entry = self._entries.popleft()
+            self.total_tokens -= entry.tokens
+            evicted.append(entry.message)
+        if evicted:
+            logger.debug(f"历史超出 {self.token_budget} tokens，淘汰 {len(evicted)} 条旧消息")
+        return evicted
+
+    def reset(self) -> list[dict]:
+        """
+        清空对话（保留系统提示）
+
+        Returns:
+            被清空的消息（按时间顺序）
+        """
+        evicted = [entry.message for entry in self._entries]
+        self._entries.clear()
+        self.total_tokens = self._system_tokens
+        self.bot_streak = 0
+        return evicted
+
+    def copy(self) -> "ConversationHistory":
+        """浅拷贝（消息字典共享，容器独立）"""
+        clone = ConversationHistory.__new__(ConversationHistory)
+        clone.system_message = self.system_message
+        clone.token_budget = self.token_budget
+        clone.evict_ratio = self.evict_ratio
+        clone._system_tokens = self._system_tokens
+        clone._entries = self._entries.copy()
+        clone.total_tokens = self.total_tokens
+        clone.bot_streak = self.bot_streak
+        return clone
+
+    def messages(self) -> list[dict]:
+        """系统提示 + 对话消息"""
+        return [self.system_message] + [entry.message for entry in self._entries]
+
+    def __iter__(self) -> Iterator[dict]:
+        yield self.system_message
+        for entry in self._entries:
+            yield entry.message
+
+    def __len__(self) -> int:
+        return 1 + len(self._entries)
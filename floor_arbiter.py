@@ -0,0 +1,189 @@
+"""发言权仲裁器 - 单进程多 Agent 时，每条频道消息只做一次 LLM 判断
+
+每个 bot 的 IRC 连接都会收到同一条消息。仲裁器只处理第一份：
+每个连接给收到的行按 (频道, 发送者, 内容) 记出现次数，同一行在各连接上的次数相同，
+仲裁器按 (频道, 发送者, 内容, 次数) 认领，所以有人连发两次 "?" 时两条都会被处理。
+先用各 Agent 的本地规则（被提及、问候、连续轮数）筛选，
+剩下无法确定的 Agent 合并成一个批量判断提示，一次调用给所有人格打分，
+再把发言权交给得分最高的 Agent。
+"""
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+from stale_replies import ChannelActivity
+from ai_agent import AIAgent
+from agent_runtime import create_channel_activity, deliver_reply
+from context_snapshot import get_context_snapshot
+from trigger_matcher import MENTION
+from message_coalescer import MessageCoalescer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Participant:
+    """参与仲裁的 Agent"""
+    nickname: str
+    agent: AIAgent
+    irc_client: object
+    activity: ChannelActivity
+
+
+class FloorArbiter:
+    """发言权仲裁器"""
+
+    def __init__(self, client, model: str, max_speakers: int = 1,
+                 score_threshold: int = 6, dedup_window: float = 5.0, coalesce_window: float = 0):
+        """
+        Args:
+            client: 用于批量判断的 OpenAI 客户端
+            model: 判断使用的模型
+            max_speakers: LLM 判断时最多选出几个 Agent 发言
+            score_threshold: 得分（0-10）达到多少才发言
+            dedup_window: 去重记录的保留时间（秒），超过这段时间没再出现的行重新计数
+            coalesce_window: 同一个人连续消息的合并窗口（秒），0 表示逐条仲裁
+        """
+        self.client = client
+        self.model = model
+        self.max_speakers = max_speakers
+        self.score_threshold = score_threshold
+        self.dedup_window = dedup_window
+        self.participants: dict[str, Participant] = {}
+        self._claimed: dict[tuple[str, str, str], tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self._coalescer = None
+        if coalesce_window > 0:
+            known_bots = {name.lower() for name in AIAgent.KNOWN_BOTS}
+            self._coalescer = MessageCoalescer(self.arbitrate, coalesce_window,
+                                               passthrough=lambda sender: sender.lower() in known_bots)
+
+    def register(self, agent: AIAgent, irc_client, nickname: str):
+        """注册一个 Agent（频道进度在该 Agent 的连接收到消息时就计数）"""
+        activity = create_channel_activity(agent, nickname)
+        irc_client.on_receive(activity.received)
+        self.participants[nickname] = Participant(nickname, agent, irc_client, activity)
+
+    def create_handler(self) -> Callable[[str, str, str], None]:
+        """创建可注册到每个 IRC 连接上的消息处理器"""
+        seen: dict[tuple[str, str, str], tuple[int, float]] = {}  # 本连接收到每种行的次数
+
+        def handle_message(channel: str, sender: str, message: str):
+            now = time.monotonic()
+            key = (channel, sender, message)
+            count, last = seen.get(key, (0, now))
+            if now - last >= self.dedup_window:
+                count = 0
+            seen[key] = (count + 1, now)
+            if len(seen) > 1000:
+                for stale in [k for k, (_, t) in seen.items() if now - t >= self.dedup_window]:
+                    del seen[stale]
+            if not self._claim(key, count + 1, now):
+                return
+            if self._coalescer is not None:
+                self._coalescer.submit(channel, sender, message)
+            else:
+                self.arbitrate(channel, sender, message)
+        return handle_message
+
+    def _claim(self, key: tuple[str, str, str], occurrence: int, now: float) -> bool:
+        """同一行（内容相同时按第几次出现区分）只由第一个收到它的连接处理"""
+        with self._lock:
+            self._claimed = {k: v for k, v in self._claimed.items() if now - v[1] < self.dedup_window}
+            claimed, _ = self._claimed.get(key, (0, now))
+            if occurrence <= claimed:
+                return False
+            self._claimed[key] = (occurrence, now)
+            return True
+
+    def arbitrate(self, channel: str, sender: str, message: str):
+        """决定谁发言并派发"""
+        inflight = {nick: p.activity.claim(channel, sender, message) for nick, p in self.participants.items()}
+        speakers = []
+        undecided = []
+        for participant in self.participants.values():
+            decision = participant.agent.check_fast_path(message, sender, participant.nickname)
+            if decision is True:
+                speakers.append(participant)
+            elif decision is None:
+                undecided.append(participant)
+
+        # 点名优先于问候：被点名的 Agent 回复，其余保持安静
+        mentioned = [p for p in speakers if p.agent.classify_trigger(message, p.nickname) == MENTION]
+        if mentioned:
+            speakers = mentioned
+
+        # 有人被直接点名或问候时，其余 Agent 保持安静，也省掉判断调用
+        if not speakers:
+            # 本地模型有把握不回复的 Agent 不参与打分
+            undecided = [p for p in undecided if p.agent.check_local_model(message, sender) is not False]
+        if not speakers and undecided:
+            speakers = self._judge(undecided, sender, message)
+
+        if not speakers:
+            return
+
+        logger.info(f"仲裁结果: {[p.nickname for p in speakers]} 发言 <- {sender}: {message[:50]}")
+        for participant in speakers:
+            deliver_reply(participant.agent, participant.irc_client, channel, sender, message,
+                          inflight[participant.nickname])
+
+    def _judge(self, candidates: list[Participant], sender: str, message: str) -> list[Participant]:
+        """一次 LLM 调用为所有候选人格打分"""
+        personas = "\n".join(
+            f"- {p.nickname}：{p.agent.agent_config.system_prompt.strip().splitlines()[0]}"
+            for p in candidates
+        )
+        time_str = get_context_snapshot(candidates[0].agent.agent_config.location)
+        judge_prompt = f"""IRC 聊天室里有以下几位参与者：
+{personas}
+
+[当前时间：{time_str}]
+
+来自 {sender}: "{message}"
+
+请为每位参与者打分（0-10），表示他/她回应这条消息的合适程度：
+- 有人夸奖、感谢、评价聊天内容，或有提问、求助、需要意见 → 高分
+- 话题与其人格擅长的领域相关，能补充观点 → 高分
+- 纯粹的两人私聊、话题已经结束（如"好的"、"明白了"）→ 低分
+- 同一句话通常只需要一个人回应
+
+只输出 JSON，例如：{{"{candidates[0].nickname}": 7}}"""
+
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": judge_prompt}],
+                max_tokens=60,
+                temperature=0.3
+            )
+            if not response or not response.choices or not response.choices[0].message:
+                raise ValueError("Empty response from floor judge")
+            scores = self._parse_scores(response.choices[0].message.content or "")
+            if not scores:
+                raise ValueError("No scores in floor judge answer")
+        except Exception as e:
+            logger.error(f"批量判断失败: {e}，降级到关键词触发")
+            return [p for p in candidates if p.agent.matches_trigger_keywords(message)][:self.max_speakers]
+
+        logger.info(f"批量判断得分: {scores}")
+        ranked = sorted(
+            (p for p in candidates if scores.get(p.nickname.lower(), 0) >= self.score_threshold),
+            key=lambda p: scores.get(p.nickname.lower(), 0),
+            reverse=True
+        )
+        return ranked[:self.max_speakers]
+
+    @staticmethod
+    def _parse_scores(answer: str) -> dict[str, int]:
+        """解析 {"nick": score} 形式的回答，容忍多余文本"""
+        match = re.search(r'\{.*\}', answer, re.S)
+        if match:
+            try:
+                return {str(k).lower(): int(v) for k, v in json.loads(match.group(0)).items()}
+            except (ValueError, TypeError):
+                pass
+        return {k.lower(): int(v) for k, v in re.findall(r'"?(\w+)"?\s*[:：]\s*(\d+)', answer)}
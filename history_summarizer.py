@@ -0,0 +1,143 @@
+"""滚动摘要 - 把被淘汰的对话折叠进一段持续更新的摘要
+
+对话历史超出 token 预算或 30 分钟后重置时，旧消息不再直接丢弃，而是交给后台线程
+与已有摘要合并成新的摘要（增量更新，不在回复路径上调用 LLM）。
+摘要以一条系统消息的形式放在系统提示之后，原始窗口可以更小而 bot 不会忘记之前聊过什么。
+因此开启后，30 分钟的自动重置只清空原始消息，摘要会保留；AIAgent.reset_conversation 才会连摘要一起清空。
+"""
+import logging
+import threading
+from typing import Optional
+from conversation_history import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class HistorySummarizer:
+    """后台滚动摘要器（每个 Agent 一个）"""
+
+    def __init__(self, client, model: str, speaker: str = "我",
+                 max_summary_tokens: int = 200, min_batch_tokens: int = 300):
+        """
+        Args:
+            client: OpenAI 客户端
+            model: 生成摘要使用的模型
+            speaker: 摘要中助手消息的署名（bot 昵称）
+            max_summary_tokens: 摘要的最大 token 数
+            min_batch_tokens: 被淘汰消息累计到多少 token 才调用一次摘要（减少调用次数）
+        """
+        self.client = client
+        self.model = model
+        self.speaker = speaker
+        self.max_summary_tokens = max_summary_tokens
+        self.min_batch_tokens = min_batch_tokens
+        self.summary = ""
+        self._pending: list[dict] = []
+        self._pending_tokens = 0
+        self._generation = 0  # clear() 之后丢弃进行中的摘要结果
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._worker: Optional[threading.Thread] = None
+
+    def fold(self, messages: list[dict], force: bool = False):
+        """
+        提交被淘汰的消息
+
+        Args:
+            messages: 按时间顺序的消息
+            force: 立即摘要（如 30 分钟重置时），不等累计到 min_batch_tokens
+        """
+        if not messages:
+            return
+        with self._lock:
+            self._pending.extend(messages)
+            self._pending_tokens += sum(estimate_tokens(m["content"]) for m in messages)
+            if self._pending_tokens < self.min_batch_tokens and not force:
+                return
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"summarizer-{self.speaker}", daemon=True)
+                self._worker.start()
+            self._idle.clear()
+            self._wakeup.set()
+
+    def clear(self):
+        """清空摘要和待处理消息"""
+        with self._lock:
+            self.summary = ""
+            self._pending = []
+            self._pending_tokens = 0
+            self._generation += 1
+
+    def summary_message(self) -> Optional[dict]:
+        """注入到系统提示之后的摘要消息，尚无摘要时返回 None"""
+        summary = self.summary
+        if not summary:
+            return None
+        return {"role": "system", "content": f"[之前的对话摘要：{summary}]"}
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """等待后台摘要完成（测试和退出时使用）"""
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        """后台线程：每次唤醒把所有待处理消息与已有摘要合并一次"""
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                self._wakeup.clear()
+                batch, self._pending, self._pending_tokens = self._pending, [], 0
+                previous, generation = self.summary, self._generation
+
+            summary = self._summarize(previous, batch) if batch else None
+
+            with self._lock:
+                if generation == self._generation:
+                    if summary:
+                        self.summary = summary
+                    elif batch:
+                        # 摘要失败：放回队列等下次合并，只保留最近的部分避免无限增长
+                        self._pending = (batch + self._pending)[-40:]
+                        self._pending_tokens = sum(estimate_tokens(m["content"]) for m in self._pending)
+                if not self._wakeup.is_set():
+                    self._idle.set()
+
+    def _summarize(self, previous: str, batch: list[dict]) -> Optional[str]:
+        """调用 LLM 合并摘要，失败返回 None"""
+        lines = []
+        for msg in batch:
+            content = msg["content"]
+            if msg["role"] == "assistant":
+                content = f"[{self.speaker}]: {content}"
+            lines.append(content)
+        dialogue = "\n".join(lines)
+
+        prompt = f"""下面是 IRC 聊天室较早对话的摘要，以及随后的一段对话。
+请把它们合并成一段新的摘要（不超过150字）：保留谁聊了什么话题、各自的观点和尚未解决的问题，省略寒暄。
+
+[已有摘要]
+{previous or "（无）"}
+
+[新的对话]
+{dialogue}
+
+只输出摘要本身。"""
+
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=self.max_summary_tokens,
+                temperature=0.3
+            )
+            if not response or not response.choices or not response.choices[0].message:
+                raise ValueError("Empty response from summarizer")
+            summary = (response.choices[0].message.content or "").strip()
+            if not summary:
+                raise ValueError("Empty summary")
+            logger.info(f"对话摘要已更新（合并 {len(batch)} 条消息）: {summary[:80]}...")
+            return summary
+        except Exception as e:
+            logger.error(f"生成对话摘要失败: {e}")
+            return None
@@ -1,7 +1,13 @@
 """IRC 客户端封装"""
+import asyncio
+import base64
+import heapq
 import logging
 from typing import Callable
 import miniirc
+from irc_outbound import (
+    OutboundQueue, TokenBucket, PRIORITY_CHAT, PRIORITY_CONTROL, split_irc_message
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,7 +23,8 @@ class IRCClient:
         return channel
     
     def __init__(self, server: str, port: int, nickname: str, channels: list[str], 
-                 use_ssl: bool = False, sasl_username: str = "", sasl_password: str = ""):
+                 use_ssl: bool = False, sasl_username: str = "", sasl_password: str = "",
+                 send_rate: float = 0.5, send_burst: int = 4):
         self.server = server
         self.port = port
         self.nickname = nickname
@@ -28,6 +35,8 @@ class IRCClient:
         
         # 消息处理回调
         self.message_handlers: list[Callable] = []
+        # 收到消息时立即调用的钩子（在处理器之前，必须非阻塞）
+        self.receive_hooks: list[Callable] = []
         
         # 创建 IRC 连接，支持 SASL 认证
         connect_modes = None
@@ -45,6 +54,12 @@ class IRCClient:
             ns_identity=connect_modes  # SASL 认证
         )
         
+        # 出站队列：令牌桶限速，避免多行回复触发服务器 flood 保护
+        # （PONG 由 miniirc 在读取线程中直接回复，不经过此队列）
+        self.outbound = OutboundQueue(self.irc.quote, TokenBucket(send_rate, send_burst))
+        # 自身 "!user@host" 的字节数，加入频道后从服务器回显中获取
+        self._userhost_bytes: int | None = None
+        
         # 注册连接成功处理器
         @self.irc.Handler("001", colon=False)  # RPL_WELCOME
         def handle_welcome(irc, hostmask, args):
@@ -56,6 +71,7 @@ class IRCClient:
             channel = args[0]
             user = hostmask[0]
             if user == nickname:
+                self._userhost_bytes = len(f"!{hostmask[1]}@{hostmask[2]}".encode('utf-8'))
                 logger.info(f"✓ 成功加入频道: {channel}")
             else:
                 logger.info(f"用户 {user} 加入了 {channel}")
@@ -69,6 +85,7 @@ class IRCClient:
             sender = hostmask[0]  # 提取发送者昵称
             
             logger.info(f"[{channel}] <{sender}> {message}")
+            self._run_receive_hooks(channel, sender, message)
             
             # 调用所有注册的消息处理器
             for handler in self.message_handlers:
@@ -81,14 +98,22 @@ class IRCClient:
         """注册消息处理回调函数"""
         self.message_handlers.append(handler)
     
+    def on_receive(self, hook: Callable):
+        """注册收到消息时立即调用的钩子（在排队和处理之前执行，不能阻塞）"""
+        self.receive_hooks.append(hook)
+    
+    def _run_receive_hooks(self, channel: str, sender: str, message: str):
+        for hook in self.receive_hooks:
+            try:
+                hook(channel, sender, message)
+            except Exception as e:
+                logger.error(f"接收钩子错误: {e}", exc_info=True)
+    
     def send_message(self, channel: str, message: str):
-        """发送消息到频道"""
-        # IRC 消息通常需要分行，避免过长
-        lines = message.split('\n')
-        for line in lines:
-            if line.strip():
-                self.irc.msg(channel, line)
-                logger.info(f"[{channel}] <{self.nickname}> {line}")
+        """发送消息到频道（按字节切分后放入出站队列）"""
+        for line in split_irc_message(channel, message, self.nickname, self._userhost_bytes):
+            self.outbound.put(f"PRIVMSG {channel} :{line}", PRIORITY_CHAT)
+            logger.info(f"[{channel}] <{self.nickname}> {line}")
     
     def connect(self):
         """连接到 IRC 服务器（阻塞）"""
@@ -101,5 +126,333 @@ class IRCClient:
     
     def disconnect(self):
         """断开连接"""
+        self.outbound.close()
         self.irc.disconnect()
         logger.info("已断开连接")
+
+
+def parse_irc_line(line: str) -> tuple[tuple[str, str, str], str, list[str]]:
+    """
+    解析一行原始 IRC 消息（忽略 IRCv3 tags）
+    
+    Returns:
+        (hostmask, command, args)，hostmask 为 (nick, user, host)，与 miniirc 保持一致
+    """
+    if line.startswith('@'):
+        _, _, line = line.partition(' ')
+    
+    prefix = ''
+    if line.startswith(':'):
+        prefix, _, line = line[1:].partition(' ')
+    
+    if ' :' in line:
+        line, _, trailing = line.partition(' :')
+        args = line.split()
+        args.append(trailing)
+    else:
+        args = line.split()
+    
+    command = args.pop(0).upper() if args else ''
+    
+    nick, _, rest = prefix.partition('!')
+    user, _, host = rest.partition('@')
+    return (nick, user, host), command, args
+
+
+class AsyncIRCClient:
+    """
+    基于 asyncio 的 IRC 客户端
+    
+    读取任务只负责收包、应答 PING 并把 PRIVMSG 放入有界分发队列；
+    写入任务独立发送，聊天消息等待令牌时不出队，PONG 等控制命令可以随时插队；
+    若干分发 worker 在线程池中执行（同步的）消息处理器，按频道分片，
+    同一频道的消息由同一个 worker 依次处理，回复不会乱序。
+    这样 LLM 调用再慢也不会阻塞 socket，避免 ping timeout。
+    接口与 IRCClient 保持一致（on_message / send_message / connect / disconnect）。
+    """
+    
+    def __init__(self, server: str, port: int, nickname: str, channels: list[str],
+                 use_ssl: bool = False, sasl_username: str = "", sasl_password: str = "",
+                 send_rate: float = 0.5, send_burst: int = 4,
+                 dispatch_queue_size: int = 100, dispatch_workers: int = 4,
+                 ping_interval: float = 120.0, reconnect_delay: float = 5.0):
+        self.server = server
+        self.port = port
+        self.nickname = nickname
+        self.channels = [IRCClient.normalize_channel(ch) for ch in channels]
+        logger.info(f"规范化后的频道列表: {self.channels}")
+        self.use_ssl = use_ssl
+        self.sasl_username = sasl_username
+        self.sasl_password = sasl_password
+        self.dispatch_queue_size = dispatch_queue_size
+        self.dispatch_workers = dispatch_workers
+        self.ping_interval = ping_interval
+        self.reconnect_delay = reconnect_delay
+        
+        # 消息处理回调
+        self.message_handlers: list[Callable] = []
+        # 收到消息时在读取任务中立即调用的钩子（在分发队列之前，必须非阻塞）
+        self.receive_hooks: list[Callable] = []
+        
+        # 当前使用的昵称（昵称冲突时会追加下划线）
+        self.current_nick = nickname
+        # 自身 "!user@host" 的字节数，加入频道后从服务器回显中获取
+        self._userhost_bytes: int | None = None
+        self._bucket = TokenBucket(send_rate, send_burst)
+        self._seq = 0
+        
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._outbound: list[tuple[int, int, str]] | None = None  # (优先级, 序号, 行) 的堆
+        self._outbound_ready: asyncio.Event | None = None
+        self._dispatch: list[asyncio.Queue] = []
+        self._stopping = False
+        if sasl_username and sasl_password:
+            logger.info(f"使用 SASL 认证: {sasl_username}")
+    
+    def on_message(self, handler: Callable):
+        """注册消息处理回调函数（普通函数或 async 函数均可）"""
+        self.message_handlers.append(handler)
+    
+    def on_receive(self, hook: Callable):
+        """注册收到消息时立即调用的钩子（在读取任务中执行，排在分发队列之前，不能阻塞）"""
+        self.receive_hooks.append(hook)
+    
+    def _run_receive_hooks(self, channel: str, sender: str, message: str):
+        for hook in self.receive_hooks:
+            try:
+                hook(channel, sender, message)
+            except Exception as e:
+                logger.error(f"接收钩子错误: {e}", exc_info=True)
+    
+    def send_raw(self, line: str, priority: int = PRIORITY_CONTROL):
+        """发送一行原始 IRC 命令（线程安全）"""
+        loop = self._loop
+        if loop is None or loop.is_closed() or self._outbound is None:
+            logger.warning(f"尚未连接，丢弃消息: {line[:50]}")
+            return
+        loop.call_soon_threadsafe(self._put, line, priority)
+    
+    def send_message(self, channel: str, message: str):
+        """发送消息到频道（线程安全，按字节切分后以聊天优先级排队）"""
+        for line in split_irc_message(channel, message, self.current_nick, self._userhost_bytes):
+            self.send_raw(f"PRIVMSG {channel} :{line}", PRIORITY_CHAT)
+            logger.info(f"[{channel}] <{self.nickname}> {line}")
+    
+    def _put(self, line: str, priority: int = PRIORITY_CONTROL):
+        """放入出站队列（仅在事件循环线程中调用），同优先级保持先进先出"""
+        self._seq += 1
+        heapq.heappush(self._outbound, (priority, self._seq, line))
+        self._outbound_ready.set()
+    
+    def connect(self):
+        """连接到 IRC 服务器（阻塞，内部运行独立的事件循环）"""
+        logger.info(f"正在连接到 {self.server}:{self.port} 频道: {self.channels}")
+        try:
+            asyncio.run(self.run())
+        except KeyboardInterrupt:
+            logger.info("收到中断信号，断开连接...")
+            self.disconnect()
+    
+    def disconnect(self):
+        """断开连接（线程安全）"""
+        self._stopping = True
+        self.send_raw("QUIT :bye")
+        logger.info("已断开连接")
+    
+    async def run(self):
+        """在当前事件循环中运行客户端，断线后自动重连"""
+        self._loop = asyncio.get_running_loop()
+        self._outbound = []
+        self._outbound_ready = asyncio.Event()
+        # 每个 worker 一个分片队列，总容量约为 dispatch_queue_size
+        shards = max(self.dispatch_workers, 1)
+        self._dispatch = [asyncio.Queue(maxsize=max(self.dispatch_queue_size // shards, 1))
+                          for _ in range(shards)]
+        
+        workers = [
+            asyncio.create_task(self._dispatch_worker(queue), name=f"irc-dispatch-{i}")
+            for i, queue in enumerate(self._dispatch)
+        ]
+        try:
+            while not self._stopping:
+                try:
+                    await self._run_connection()
+                except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+                    if self._stopping:
+                        break
+                    logger.error(f"IRC 连接中断: {e}，{self.reconnect_delay} 秒后重连")
+                    await asyncio.sleep(self.reconnect_delay)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+    
+    async def _run_connection(self):
+        """建立一次连接并运行读写任务，直到连接断开"""
+        reader, writer = await asyncio.open_connection(
+            self.server, self.port, ssl=self.use_ssl or None
+        )
+        self._writer = writer
+        # 丢弃上一次连接残留的待发送命令
+        self._outbound.clear()
+        
+        self.current_nick = self.nickname
+        if self.sasl_username and self.sasl_password:
+            self._put("CAP REQ :sasl")
+        self._put(f"NICK {self.current_nick}")
+        self._put(f"USER {self.nickname} 0 * :{self.nickname}")
+        
+        writer_task = asyncio.create_task(self._writer_loop(writer), name="irc-writer")
+        reader_task = asyncio.create_task(self._reader_loop(reader), name="irc-reader")
+        try:
+            done, _ = await asyncio.wait(
+                {reader_task, writer_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                task.result()  # 传播异常以触发重连
+        finally:
+            reader_task.cancel()
+            writer_task.cancel()
+            await asyncio.gather(reader_task, writer_task, return_exceptions=True)
+            writer.close()
+            self._writer = None
+    
+    async def _writer_loop(self, writer: asyncio.StreamWriter):
+        """写入任务：控制命令立即发送，聊天消息按令牌桶节流"""
+        while True:
+            if not self._outbound:
+                self._outbound_ready.clear()
+                await self._outbound_ready.wait()
+                continue
+            # 只看队首：聊天消息没有令牌时留在队列里，等到有令牌或有新命令入队再重新检查
+            if self._outbound[0][0] > PRIORITY_CONTROL:
+                delay = self._bucket.delay()
+                if delay > 0:
+                    self._outbound_ready.clear()
+                    try:
+                        await asyncio.wait_for(self._outbound_ready.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+            _, _, line = heapq.heappop(self._outbound)
+            self._bucket.consume_now()
+            writer.write(line.encode('utf-8', errors='replace') + b'\r\n')
+            await writer.drain()
+            if line.startswith("QUIT"):
+                return
+    
+    async def _reader_loop(self, reader: asyncio.StreamReader):
+        """读取任务：解析服务器消息，协议消息就地处理，聊天消息放入分发队列"""
+        awaiting_pong = False
+        while True:
+            try:
+                raw = await asyncio.wait_for(reader.readline(), timeout=self.ping_interval)
+            except asyncio.TimeoutError:
+                if awaiting_pong:
+                    raise ConnectionError("ping timeout")
+                awaiting_pong = True
+                self._put(f"PING :{self.server}")
+                continue
+            
+            if not raw:
+                if self._stopping:
+                    return
+                raise ConnectionError("服务器关闭了连接")
+            awaiting_pong = False
+            
+            line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+            if line:
+                self._handle_line(line)
+    
+    def _handle_line(self, line: str):
+        """处理一行服务器消息（在读取任务中执行，必须保持非阻塞）"""
+        hostmask, command, args = parse_irc_line(line)
+        
+        if command == "PING":
+            self._put(f"PONG :{args[-1] if args else ''}")
+        elif command == "CAP" and len(args) >= 3 and args[1] == "ACK":
+            self._put("AUTHENTICATE PLAIN")
+        elif command == "CAP" and len(args) >= 2 and args[1] == "NAK":
+            logger.warning("服务器不支持 SASL，跳过认证")
+            self._put("CAP END")
+        elif command == "AUTHENTICATE" and args and args[0] == "+":
+            credentials = f"{self.sasl_username}\0{self.sasl_username}\0{self.sasl_password}"
+            self._put(
+                "AUTHENTICATE " + base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+            )
+        elif command in ("903", "904", "905", "906", "907"):
+            if command != "903":
+                logger.warning(f"SASL 认证失败: {args[-1] if args else command}")
+            self._put("CAP END")
+        elif command == "433":  # ERR_NICKNAMEINUSE
+            self.current_nick += "_"
+            logger.warning(f"昵称已被占用，改用: {self.current_nick}")
+            self._put(f"NICK {self.current_nick}")
+        elif command == "001":  # RPL_WELCOME
+            logger.info(f"✓ 成功连接到 IRC 服务器！")
+            for channel in self.channels:
+                self._put(f"JOIN {channel}")
+        elif command == "JOIN" and args:
+            if hostmask[0] == self.current_nick:
+                self._userhost_bytes = len(f"!{hostmask[1]}@{hostmask[2]}".encode('utf-8'))
+                logger.info(f"✓ 成功加入频道: {args[0]}")
+            else:
+                logger.info(f"用户 {hostmask[0]} 加入了 {args[0]}")
+        elif command == "PRIVMSG" and len(args) >= 2:
+            channel, message, sender = args[0], args[1], hostmask[0]
+            logger.info(f"[{channel}] <{sender}> {message}")
+            self._run_receive_hooks(channel, sender, message)
+            self._enqueue_dispatch((channel, sender, message))
+        elif command == "ERROR":
+            raise ConnectionError(args[-1] if args else "ERROR")
+    
+    def _enqueue_dispatch(self, item: tuple[str, str, str]):
+        """放入频道对应的分发队列；队列满时丢弃最旧的一条，保证读取任务永不阻塞"""
+        queue = self._dispatch[hash(item[0]) % len(self._dispatch)]
+        try:
+            queue.put_nowait(item)
+        except asyncio.QueueFull:
+            dropped = queue.get_nowait()
+            queue.task_done()
+            logger.warning(f"分发队列已满，丢弃最旧消息: <{dropped[1]}> {dropped[2][:50]}")
+            queue.put_nowait(item)
+    
+    async def _dispatch_worker(self, queue: asyncio.Queue):
+        """分发 worker：按顺序处理本分片的消息，同步处理器在线程池中执行，async 处理器直接 await"""
+        while True:
+            channel, sender, message = await queue.get()
+            try:
+                for handler in self.message_handlers:
+                    try:
+                        if asyncio.iscoroutinefunction(handler):
+                            await handler(channel, sender, message)
+                        else:
+                            await asyncio.to_thread(handler, channel, sender, message)
+                    except Exception as e:
+                        logger.error(f"消息处理器错误: {e}", exc_info=True)
+            finally:
+                queue.task_done()
+
+
+def create_irc_client(irc_config) -> IRCClient | AsyncIRCClient:
+    """根据 IRCConfig.transport 创建对应的 IRC 客户端"""
+    common = dict(
+        server=irc_config.server,
+        port=irc_config.port,
+        nickname=irc_config.nickname,
+        channels=[irc_config.channel],
+        use_ssl=irc_config.use_ssl,
+        sasl_username=irc_config.sasl_username,
+        sasl_password=irc_config.sasl_password,
+        send_rate=irc_config.send_rate,
+        send_burst=irc_config.send_burst
+    )
+    if irc_config.transport == "asyncio":
+        logger.info("使用 asyncio 传输模式")
+        return AsyncIRCClient(
+            dispatch_queue_size=irc_config.dispatch_queue_size,
+            dispatch_workers=irc_config.dispatch_workers,
+            **common
+        )
+    return IRCClient(**common)
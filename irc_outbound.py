@@ -0,0 +1,191 @@
+"""IRC 出站发送：按字节切分消息 + 令牌桶限速 + 优先级通道"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# RFC 1459：一行（含结尾 \r\n）最多 512 字节
+IRC_MAX_LINE_BYTES = 512
+
+# 未知自身 hostmask 时按保守值估算 "!user@host" 的长度（user 10 字节，host 63 字节）
+DEFAULT_USERHOST_BYTES = 1 + 10 + 1 + 63
+
+# 优先切分位置：先找句末标点，找不到再退而求其次找逗号和空白
+_SENTENCE_BREAKS = "。！？!?…"
+_SOFT_BREAKS = "，；、,;. \t"
+
+# 优先级通道：数值越小越先发送
+PRIORITY_CONTROL = 0  # PONG / PING / NICK / JOIN / CAP 等协议命令
+PRIORITY_CHAT = 1     # 聊天消息
+
+
+def privmsg_payload_budget(target: str, nickname: str, userhost_bytes: int | None = None) -> int:
+    """
+    计算一条 PRIVMSG 正文可用的字节数
+
+    服务器转发给其他人时会加上 ":nick!user@host " 前缀，512 字节的上限也包含这部分，
+    所以必须按转发后的长度来计算。
+    """
+    if userhost_bytes is None:
+        userhost_bytes = DEFAULT_USERHOST_BYTES
+    prefix = f":{nickname} PRIVMSG {target} :".encode('utf-8')
+    return IRC_MAX_LINE_BYTES - 2 - len(prefix) - userhost_bytes
+
+
+def _fit_chars(text: str, budget: int) -> int:
+    """返回在 budget 字节内能容纳的最大字符数（不会切断 UTF-8 多字节字符）"""
+    size = 0
+    for i, ch in enumerate(text):
+        size += len(ch.encode('utf-8'))
+        if size > budget:
+            return i
+    return len(text)
+
+
+def split_line_by_bytes(line: str, budget: int) -> list[str]:
+    """把单行文本切成若干段，每段 UTF-8 编码后不超过 budget 字节，尽量在标点或空白处断开"""
+    chunks = []
+    while len(line.encode('utf-8')) > budget:
+        cut = max(_fit_chars(line, budget), 1)
+        # 在后半段寻找最近的断句位置，避免把一句话切得太碎
+        brk = max(line.rfind(c, cut // 2, cut) for c in _SENTENCE_BREAKS)
+        if brk <= 0:
+            brk = max(line.rfind(c, cut // 2, cut) for c in _SOFT_BREAKS)
+        if brk > 0:
+            cut = brk + 1
+        chunk = line[:cut].rstrip()
+        if chunk:
+            chunks.append(chunk)
+        line = line[cut:].lstrip()
+    if line:
+        chunks.append(line)
+    return chunks
+
+
+def split_irc_message(target: str, message: str, nickname: str,
+                      userhost_bytes: int | None = None) -> list[str]:
+    """
+    把任意长度的消息切成可以安全发送的 PRIVMSG 正文列表
+
+    Args:
+        target: 频道或昵称
+        message: 原始消息，可包含换行
+        nickname: 自己的昵称（计算转发前缀长度）
+        userhost_bytes: 自身 "!user@host" 的字节数，未知时使用保守估计
+
+    Returns:
+        正文列表（不含 "PRIVMSG target :" 前缀），空行会被跳过
+    """
+    budget = privmsg_payload_budget(target, nickname, userhost_bytes)
+    lines = []
+    for line in message.split('\n'):
+        line = line.rstrip('\r')
+        if line.strip():
+            lines.extend(split_line_by_bytes(line, budget))
+    return lines
+
+
+class TokenBucket:
+    """线程安全的令牌桶：rate 为每秒补充的令牌数，capacity 为突发上限"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        预约一个令牌，返回需要等待的秒数（0 表示可以立即发送）
+
+        令牌可以透支，调用方按返回值等待即可，多个发送者按预约顺序排队。
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            if self._tokens >= 0 or self.rate <= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def delay(self) -> float:
+        """距离有可用令牌还需等待的秒数（只查看，不消耗）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1 or self.rate <= 0:
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def consume_now(self):
+        """立即消耗一个令牌（可以透支：控制命令不等待，但仍计入服务器的流量统计）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+
+
+class OutboundQueue:
+    """
+    线程版出站队列（miniirc 传输使用）
+
+    单独的发送线程按优先级取出命令：控制命令立即发送，聊天消息按令牌桶节流，
+    避免多行回复或多个 bot 同时发言时触发服务器的 flood 保护。
+    聊天消息等待令牌时仍留在队列里，期间到达的 PONG 等控制命令可以插队先发。
+    """
+
+    def __init__(self, send: Callable[[str], None], bucket: TokenBucket, name: str = "irc-outbound"):
+        self._send = send
+        self._bucket = bucket
+        self._heap: list[tuple[int, int, str]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, line: str, priority: int = PRIORITY_CHAT):
+        """放入一行原始 IRC 命令"""
+        with self._cond:
+            heapq.heappush(self._heap, (priority, next(self._seq), line))
+            self._cond.notify()
+
+    def pending(self) -> int:
+        """待发送的行数"""
+        with self._cond:
+            return len(self._heap)
+
+    def close(self):
+        """停止发送线程（已排队的消息会被丢弃）"""
+        with self._cond:
+            self._closed = True
+            self._heap.clear()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                # 只看队首：聊天消息没有令牌时留在队列里，等到有令牌或有新命令入队再重新检查
+                if self._heap[0][0] > PRIORITY_CONTROL:
+                    delay = self._bucket.delay()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+                _, _, line = heapq.heappop(self._heap)
+            self._bucket.consume_now()
+
+            try:
+                self._send(line)
+            except Exception as e:
+                logger.error(f"发送消息失败: {e}")
@@ -0,0 +1,73 @@
+"""判断结果缓存 - 重复的闲聊（"哈哈"、"好的"、"有意思"）不再每次调用 LLM 判断
+
+键由归一化后的消息指纹和一小段上下文状态组成，LRU 淘汰并带过期时间。
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+# 归一化时去掉的标点、空白和表情符号
+_NOISE = re.compile(r"[\s\W_]+", re.UNICODE)
+# 连续重复的字符压缩为两个（"哈哈哈哈" 与 "哈哈" 视为同一句）
+_REPEATS = re.compile(r"(.)\1{2,}")
+
+
+def fingerprint(message: str) -> str:
+    """消息指纹：小写、去标点空白、压缩重复字符后取哈希"""
+    text = message.lower()
+    # 纯标点或表情（如 "？？？"、"😂"）保留原样，避免全部归为同一个指纹
+    normalized = _REPEATS.sub(r"\1\1", _NOISE.sub("", text) or text.strip())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class JudgeCache:
+    """LRU + TTL 的判断结果缓存（线程安全）"""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 600):
+        """
+        Args:
+            max_entries: 最多缓存多少条
+            ttl: 缓存有效期（秒）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, bool]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bool]:
+        """命中返回缓存的判断结果，未命中或已过期返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, decision: bool):
+        """写入判断结果，超出容量时淘汰最久未使用的"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), decision)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "size": len(self._entries)
+            }
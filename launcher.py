@@ -0,0 +1,157 @@
+"""单进程多 Agent 启动器
+
+所有 Agent 共用一个 asyncio 事件循环、同一组 OpenAI 连接池以及进程内的天气/新闻缓存，
+替代分别运行 main.py / main2.py / main3.py 三个进程。
+
+用法：
+    python launcher.py                     # 默认加载 config、config2、config3
+    python launcher.py config config3      # 只运行指定的 Agent
+    AGENT_CONFIGS=config,config2 python launcher.py
+    FLOOR_ARBITER=true python launcher.py  # 启用发言权仲裁，每条消息只做一次 LLM 判断
+"""
+import asyncio
+import importlib
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from typing import Any
+from ai_agent import AIAgent
+from agent_runtime import create_message_handler
+from floor_arbiter import FloorArbiter
+from irc_client import AsyncIRCClient
+from openai_clients import get_openai_client
+
+# 配置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGENT_CONFIGS = ["config", "config2", "config3"]
+
+
+@dataclass
+class AgentSpec:
+    """一个 Agent 的完整配置（来自某个 configX.py 模块）"""
+    module: str
+    irc_config: Any
+    openai_config: Any
+    agent_config: Any
+
+
+def load_agent_spec(module_name: str) -> AgentSpec:
+    """从配置模块（如 "config2"）加载 Agent 配置"""
+    module = importlib.import_module(module_name)
+    return AgentSpec(
+        module=module_name,
+        irc_config=module.IRCConfig(),
+        openai_config=module.OpenAIConfig(),
+        agent_config=module.AgentConfig()
+    )
+
+
+def load_agent_specs(module_names: list[str]) -> list[AgentSpec]:
+    """批量加载 Agent 配置"""
+    return [load_agent_spec(name) for name in module_names]
+
+
+def build_agent(spec: AgentSpec) -> tuple[AIAgent, AsyncIRCClient]:
+    """根据配置创建 Agent 和对应的 IRC 连接（每个昵称一条连接，HTTP 连接池共享）"""
+    irc_config = spec.irc_config
+    openai_config = spec.openai_config
+
+    agent = AIAgent(
+        openai_config,
+        spec.agent_config,
+        irc_config.nickname,
+        client=get_openai_client(openai_config.api_key, openai_config.base_url)
+    )
+    irc_client = AsyncIRCClient(
+        server=irc_config.server,
+        port=irc_config.port,
+        nickname=irc_config.nickname,
+        channels=[irc_config.channel],
+        use_ssl=irc_config.use_ssl,
+        sasl_username=irc_config.sasl_username,
+        sasl_password=irc_config.sasl_password,
+        send_rate=irc_config.send_rate,
+        send_burst=irc_config.send_burst,
+        dispatch_queue_size=irc_config.dispatch_queue_size,
+        dispatch_workers=irc_config.dispatch_workers
+    )
+    return agent, irc_client
+
+
+def create_arbiter(specs: list[AgentSpec]) -> FloorArbiter:
+    """创建发言权仲裁器（使用第一个 Agent 的模型做批量判断）"""
+    openai_config = specs[0].openai_config
+    return FloorArbiter(
+        client=get_openai_client(openai_config.api_key, openai_config.base_url),
+        model=openai_config.model,
+        max_speakers=int(os.getenv("FLOOR_MAX_SPEAKERS", "1")),
+        score_threshold=int(os.getenv("FLOOR_SCORE_THRESHOLD", "6")),
+        coalesce_window=specs[0].agent_config.coalesce_window
+    )
+
+
+async def run_agents(specs: list[AgentSpec], use_arbiter: bool = False):
+    """在当前事件循环中运行所有 Agent"""
+    runnable = []
+    for spec in specs:
+        if spec.openai_config.api_key:
+            runnable.append(spec)
+        else:
+            logger.error(f"{spec.module}: 未设置 API Key，跳过 {spec.irc_config.nickname}")
+    specs = runnable
+    if not specs:
+        logger.error("没有可运行的 Agent")
+        return
+
+    arbiter = create_arbiter(specs) if use_arbiter else None
+    if arbiter:
+        logger.info(f"已启用发言权仲裁，判断模型: {arbiter.model}")
+
+    clients = []
+    for spec in specs:
+        logger.info(f"加载 Agent: {spec.irc_config.nickname} ({spec.module}) "
+                    f"模型: {spec.openai_config.model} @ {spec.openai_config.base_url}")
+        agent, irc_client = build_agent(spec)
+        nickname = spec.irc_config.nickname
+        if arbiter:
+            arbiter.register(agent, irc_client, nickname)
+            irc_client.on_message(arbiter.create_handler())
+        else:
+            irc_client.on_message(create_message_handler(agent, irc_client, nickname))
+        clients.append(irc_client)
+
+    try:
+        await asyncio.gather(*(client.run() for client in clients))
+    finally:
+        for client in clients:
+            client.disconnect()
+
+
+def main():
+    """主函数"""
+    module_names = sys.argv[1:] or [
+        name.strip() for name in os.getenv("AGENT_CONFIGS", "").split(",") if name.strip()
+    ] or DEFAULT_AGENT_CONFIGS
+
+    logger.info("=== IRC AI Agent 单进程启动器 ===")
+    logger.info(f"配置模块: {module_names}")
+    specs = load_agent_specs(module_names)
+    use_arbiter = os.getenv("FLOOR_ARBITER", "false").lower() == "true"
+
+    logger.info("Bot 运行中，按 Ctrl+C 退出...")
+    try:
+        asyncio.run(run_agents(specs, use_arbiter))
+    except KeyboardInterrupt:
+        logger.info("\n\n收到中断信号，正在退出...")
+    finally:
+        os._exit(0)  # 强制退出，确保线程池中的处理器线程不阻塞退出
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,9 @@ import logging
 import threading
 import time
 from config import IRCConfig, OpenAIConfig, AgentConfig
-from irc_client import IRCClient
+from irc_client import create_irc_client
 from ai_agent import AIAgent
+from agent_runtime import create_message_handler
 
 # 配置日志
 logging.basicConfig(
@@ -37,30 +38,10 @@ def main():
     agent = AIAgent(openai_config, agent_config, irc_config.nickname)
     
     # 创建 IRC 客户端
-    irc_client = IRCClient(
-        server=irc_config.server,
-        port=irc_config.port,
-        nickname=irc_config.nickname,
-        channels=[irc_config.channel],
-        use_ssl=irc_config.use_ssl,
-        sasl_username=irc_config.sasl_username,
-        sasl_password=irc_config.sasl_password
-    )
+    irc_client = create_irc_client(irc_config)
     
     # 注册消息处理器
-    def handle_message(channel: str, sender: str, message: str):
-        """处理 IRC 消息"""
-        # 判断是否需要回复
-        if agent.should_respond(message, sender, irc_config.nickname):
-            logger.info(f"触发回复条件: {sender}: {message}")
-            
-            # 生成回复
-            response = agent.generate_response(channel, sender, message)
-            
-            # 发送回复（不添加前缀，让 AI 自己决定如何回复）
-            irc_client.send_message(channel, response)
-    
-    irc_client.on_message(handle_message)
+    irc_client.on_message(create_message_handler(agent, irc_client, irc_config.nickname))
     
     # 在单独的线程中运行 IRC 连接
     def run_irc():
@@ -14,9 +14,9 @@ import os
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from dataclasses import dataclass, asdict
-from openai import AsyncOpenAI
 import chromadb
 from chromadb.utils import embedding_functions
+from openai_clients import get_async_openai_client
 
 # ============= 配置 =============
 MEMORY_SCORE_THRESHOLD = 7  # 只有评分 >= 7 的消息才存入长期记忆
@@ -55,7 +55,7 @@ class MemorySystem:
         db_path: str = "./chroma_db",
         collection_name: str = "irc_memories"
     ):
-        self.client = AsyncOpenAI(api_key=openai_api_key, base_url=openai_base_url)
+        self.client = get_async_openai_client(openai_api_key, openai_base_url)
         
         # 初始化 ChromaDB
         self.chroma_client = chromadb.PersistentClient(path=db_path)
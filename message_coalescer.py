@@ -0,0 +1,136 @@
+"""消息合并 - 同一个人连续快速发送的几行合并成一轮对话
+
+人类常常把一句话拆成几行发："等等" "我想问一下" "量子计算现在到哪一步了？"。
+逐行处理会触发多次判断和生成，产生好几条互相重叠的回复。
+合并器按频道缓冲消息：同一发送者在 window 秒内的后续消息并入同一轮（每来一行重新计时，
+最长不超过 max_wait），窗口结束后把几行拼成一条交给处理函数；
+频道里换了人说话时，先把上一个人的缓冲立即交出，保证顺序不乱。
+bot 的消息不会拆行发送，由 passthrough 判断后直接交出，不等待窗口。
+
+交出的消息由固定数量的 worker 线程处理（按频道分片，同一频道内保持顺序），
+每个 worker 的队列有上限，满时丢弃最旧的一条，与 IRC 分发队列的策略一致。
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _Burst:
+    """一个频道中正在缓冲的连续消息"""
+    __slots__ = ("sender", "lines", "started", "deadline")
+
+    def __init__(self, sender: str, started: float):
+        self.sender = sender
+        self.lines: list[str] = []
+        self.started = started
+        self.deadline = started
+
+
+class MessageCoalescer:
+    """按频道、按发送者合并连续消息"""
+
+    def __init__(self, handler: Callable[[str, str, str], None], window: float = 1.5,
+                 max_wait: Optional[float] = None, passthrough: Optional[Callable[[str], bool]] = None,
+                 workers: int = 4, queue_size: int = 100):
+        """
+        Args:
+            handler: 合并后的处理函数 (channel, sender, message)
+            window: 合并窗口（秒），窗口内没有新消息就交出
+            max_wait: 从第一行开始最多等待多久（默认 window 的 3 倍）
+            passthrough: 判断发送者的消息是否跳过合并（如已知 bot），返回 True 时立即交出
+            workers: 处理线程数（按频道分片）
+            queue_size: 每个处理线程的队列上限
+        """
+        self.handler = handler
+        self.window = window
+        self.max_wait = max_wait if max_wait is not None else window * 3
+        self.passthrough = passthrough
+        self._bursts: dict[str, _Burst] = {}
+        self._cond = threading.Condition()
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(max(workers, 1))]
+        self._started = False
+
+    def submit(self, channel: str, sender: str, message: str):
+        """收到一条消息（可直接注册为 on_message 处理函数，立即返回）"""
+        now = time.monotonic()
+        bypass = self.passthrough is not None and self.passthrough(sender)
+        with self._cond:
+            self._start()
+            burst = self._bursts.get(channel)
+            if burst is not None and (burst.sender != sender or bypass):
+                # 换人说话：上一个人的消息立即交出
+                self._enqueue(channel, self._bursts.pop(channel))
+                burst = None
+
+            if bypass:
+                burst = _Burst(sender, now)
+                burst.lines.append(message)
+                self._enqueue(channel, burst)
+                return
+
+            if burst is None:
+                burst = _Burst(sender, now)
+                self._bursts[channel] = burst
+            burst.lines.append(message)
+            burst.deadline = min(now + self.window, burst.started + self.max_wait)
+            self._cond.notify()
+
+    def join(self):
+        """等待已交出的消息全部处理完（测试使用）"""
+        for work_queue in self._queues:
+            work_queue.join()
+
+    def _start(self):
+        """首次收到消息时启动调度线程和处理线程（调用方持有 _cond）"""
+        if self._started:
+            return
+        self._started = True
+        threading.Thread(target=self._schedule_loop, name="coalescer-timer", daemon=True).start()
+        for i, work_queue in enumerate(self._queues):
+            threading.Thread(target=self._work_loop, args=(work_queue,),
+                             name=f"coalescer-{i}", daemon=True).start()
+
+    def _enqueue(self, channel: str, burst: _Burst):
+        """交给频道对应的处理线程；队列满时丢弃最旧的一条（调用方持有 _cond）"""
+        work_queue = self._queues[hash(channel) % len(self._queues)]
+        try:
+            work_queue.put_nowait((channel, burst))
+        except queue.Full:
+            _, dropped = work_queue.get_nowait()
+            work_queue.task_done()
+            logger.warning(f"合并消息队列已满，丢弃最旧消息: <{dropped.sender}> {dropped.lines[0][:50]}")
+            work_queue.put_nowait((channel, burst))
+
+    def _schedule_loop(self):
+        """调度线程：窗口到期的缓冲交给处理线程"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                for channel, burst in list(self._bursts.items()):
+                    if burst.deadline <= now:
+                        del self._bursts[channel]
+                        self._enqueue(channel, burst)
+                deadlines = [burst.deadline for burst in self._bursts.values()]
+                self._cond.wait(max(min(deadlines) - now, 0) if deadlines else None)
+
+    def _work_loop(self, work_queue: queue.Queue):
+        """处理线程：按顺序处理本分片的消息"""
+        while True:
+            channel, burst = work_queue.get()
+            try:
+                self._dispatch(channel, burst)
+            finally:
+                work_queue.task_done()
+
+    def _dispatch(self, channel: str, burst: _Burst):
+        message = "\n".join(burst.lines)
+        if len(burst.lines) > 1:
+            logger.info(f"合并 {burst.sender} 的 {len(burst.lines)} 条连续消息: {message[:50]}...")
+        try:
+            self.handler(channel, burst.sender, message)
+        except Exception as e:
+            logger.error(f"处理合并消息失败: {e}", exc_info=True)
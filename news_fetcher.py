@@ -4,15 +4,17 @@
 """
 import json
 import logging
+import sqlite3
 import xml.etree.ElementTree as ET
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Dict, List
 
 import httpx
-from openai import OpenAI
 from dotenv import load_dotenv
 import os
+from openai_clients import get_default_openai_client
+from shared_cache import get_shared_cache
 
 # 加载环境变量
 load_dotenv()
@@ -40,10 +42,7 @@ class NewsFetcher:
     
     def __init__(self):
         """初始化"""
-        self.client = OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-        )
+        self.client = get_default_openai_client()
         self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
         
     def fetch_rss(self, url: str) -> List[Dict[str, str]]:
@@ -260,15 +259,42 @@ def load_latest_news() -> Optional[Dict]:
         return None
 
 
+# 进程内缓存：(文件版本, 格式化后的新闻)
+_formatted_news: Optional[tuple[str, str]] = None
+
+
 def format_news_for_injection() -> str:
     """
     格式化新闻用于注入到 AI 上下文
     
+    按文件版本（mtime + 大小）缓存格式化后的字符串：文件没变时只需一次 stat，
+    先查进程内缓存，再查跨进程共享缓存，都没有才读取和解析文件。
+    
     Returns:
         格式化的新闻字符串，如："🌍世界: xxx  🌏亚太: xxx"
     """
-    news_data = load_latest_news()
+    global _formatted_news
+    try:
+        stat = LATEST_NEWS_FILE.stat()
+    except OSError:
+        return ""
     
+    version = f"{stat.st_mtime_ns}:{stat.st_size}"
+    cached = _formatted_news
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    
+    shared = get_shared_cache()
+    if shared is not None:
+        try:
+            entry = shared.get("news", str(LATEST_NEWS_FILE))
+            if entry and entry[0].get("version") == version and "text" in entry[0]:
+                _formatted_news = (version, entry[0]["text"])
+                return entry[0]["text"]
+        except sqlite3.Error as e:
+            logger.warning(f"读取共享新闻缓存失败: {e}")
+    
+    news_data = load_latest_news()
     if not news_data or 'news' not in news_data:
         return ""
     
@@ -280,7 +306,14 @@ def format_news_for_injection() -> str:
     if 'asia' in news:
         parts.append(f"🌏{news['asia']}")
     
-    return "  ".join(parts) if parts else ""
+    text = "  ".join(parts) if parts else ""
+    _formatted_news = (version, text)
+    if shared is not None:
+        try:
+            shared.set("news", str(LATEST_NEWS_FILE), {"version": version, "text": text})
+        except sqlite3.Error as e:
+            logger.warning(f"写入共享新闻缓存失败: {e}")
+    return text
 
 
 if __name__ == "__main__":
@@ -0,0 +1,211 @@
+"""OpenAI 客户端工厂：同一进程内按 (api_key, base_url) 共享客户端和连接池
+
+- 连接池保持长连接（keep-alive 120 秒），短小的判断调用不必每次重新做 TCP/TLS 握手
+- 并发限制：全局一个信号量，每个服务商（base_url 的主机名）一个信号量，
+  超出时请求排队等待，不会同时打出大量请求触发服务端限流
+- 同步客户端供 IRC 处理线程使用；异步客户端（AsyncOpenAI）供 asyncio 代码使用，
+  按事件循环分别缓存（httpx 的异步连接池不能跨事件循环使用）
+"""
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Optional
+from urllib.parse import urlparse
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+logger = logging.getLogger(__name__)
+
+# 并发上限（全局 / 每个服务商）
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+MAX_CONCURRENCY_PER_PROVIDER = int(os.getenv("OPENAI_MAX_CONCURRENCY_PER_PROVIDER", "8"))
+
+# 连接池参数
+POOL_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=120)
+# 与 OpenAI SDK 的默认超时一致
+TIMEOUT = httpx.Timeout(600.0, connect=5.0)
+
+_clients: dict[tuple[str, str], OpenAI] = {}
+# 事件循环 -> {(api_key, base_url): 客户端}；事件循环结束后自动清理
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+_global_semaphore = threading.BoundedSemaphore(MAX_CONCURRENCY)
+_provider_semaphores: dict[str, threading.BoundedSemaphore] = {}
+_async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+def _provider(base_url: str) -> str:
+    """服务商标识（base_url 的主机名）"""
+    return urlparse(base_url).hostname or base_url
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """响应体读完或关闭时释放并发名额（流式响应要等整个流结束）"""
+
+    def __init__(self, stream: httpx.SyncByteStream, release):
+        self._stream = stream
+        # 调用方既没读完也没关闭就丢弃响应时，由垃圾回收兜底释放，名额不会永久泄漏
+        self._release = weakref.finalize(self, release)
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+def _release_on_loop(loop: asyncio.AbstractEventLoop, release):
+    """在事件循环线程中释放 asyncio 信号量（垃圾回收可能发生在任意线程）"""
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(release)
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+        self._finalizer = weakref.finalize(self, _release_on_loop, asyncio.get_running_loop(), release)
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        self._finalizer.detach()
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+def _once(fn):
+    """保证释放函数只执行一次"""
+    done = threading.Lock()
+
+    def wrapper():
+        if done.acquire(blocking=False):
+            fn()
+    return wrapper
+
+
+class _LimitedTransport(httpx.HTTPTransport):
+    """带并发限制的同步传输层"""
+
+    def __init__(self, semaphores: list[threading.BoundedSemaphore], **kwargs):
+        super().__init__(**kwargs)
+        self._semaphores = semaphores
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        for semaphore in self._semaphores:
+            semaphore.acquire()
+        release = _once(lambda: [s.release() for s in reversed(self._semaphores)])
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+
+class _AsyncLimitedTransport(httpx.AsyncHTTPTransport):
+    """带并发限制的异步传输层"""
+
+    def __init__(self, semaphores: list[asyncio.Semaphore], **kwargs):
+        super().__init__(**kwargs)
+        self._semaphores = semaphores
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        acquired = []
+        try:
+            for semaphore in self._semaphores:
+                await semaphore.acquire()
+                acquired.append(semaphore)
+        except BaseException:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+            raise
+        release = _once(lambda: [s.release() for s in reversed(acquired)])
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _AsyncReleasingStream(response.stream, release)
+        return response
+
+
+def get_openai_client(api_key: str, base_url: str) -> OpenAI:
+    """
+    获取共享的同步 OpenAI 客户端
+
+    同一个 API 端点的多个 agent 共用一个客户端，从而共用底层 httpx 连接池，
+    省去重复的 TCP/TLS 握手。
+    """
+    key = (api_key, base_url)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            provider = _provider(base_url)
+            semaphore = _provider_semaphores.get(provider)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(MAX_CONCURRENCY_PER_PROVIDER)
+                _provider_semaphores[provider] = semaphore
+            transport = _LimitedTransport([_global_semaphore, semaphore], limits=POOL_LIMITS)
+            client = OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=httpx.Client(transport=transport, timeout=TIMEOUT, follow_redirects=True)
+            )
+            _clients[key] = client
+            logger.info(f"创建共享 OpenAI 客户端: {base_url}")
+        return client
+
+
+def get_async_openai_client(api_key: str, base_url: str) -> AsyncOpenAI:
+    """
+    获取共享的异步 OpenAI 客户端
+
+    在事件循环中调用时，同一事件循环内按 API 端点共享；全局和每个服务商的并发上限
+    与同步客户端相同，但在每个事件循环内分别计数。
+    在事件循环外调用（如在同步的 __init__ 中）时返回一个独立客户端，首次使用时绑定事件循环。
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    with _lock:
+        clients = _async_clients.setdefault(loop, {}) if loop else {}
+        client = clients.get((api_key, base_url))
+        if client is None:
+            provider = _provider(base_url)
+            semaphores = _async_semaphores.setdefault(loop, {}) if loop else {}
+            for name, limit in (("", MAX_CONCURRENCY), (provider, MAX_CONCURRENCY_PER_PROVIDER)):
+                if name not in semaphores:
+                    semaphores[name] = asyncio.Semaphore(limit)
+            transport = _AsyncLimitedTransport([semaphores[""], semaphores[provider]], limits=POOL_LIMITS)
+            client = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=httpx.AsyncClient(transport=transport, timeout=TIMEOUT, follow_redirects=True)
+            )
+            clients[(api_key, base_url)] = client
+            logger.info(f"创建共享 AsyncOpenAI 客户端: {base_url}")
+        return client
+
+
+def get_default_openai_client(async_client: bool = False, api_key: Optional[str] = None,
+                              base_url: Optional[str] = None):
+    """按 OPENAI_API_KEY / OPENAI_BASE_URL 环境变量获取共享客户端（新闻、记忆等辅助脚本使用）"""
+    api_key = api_key or os.getenv("OPENAI_API_KEY", "")
+    base_url = base_url or os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    if async_client:
+        return get_async_openai_client(api_key, base_url)
+    return get_openai_client(api_key, base_url)
@@ -0,0 +1,68 @@
+"""提示组装 - 保持请求前缀稳定，便于服务端的前缀缓存（prompt caching）
+
+服务端按请求开头的字节缓存已处理过的提示，前缀只要变一个字，后面的缓存就全部失效。
+因此消息按"越稳定越靠前"排列：
+1. 系统提示（人格，永不变化）
+2. 对话摘要（只在淘汰旧消息时更新）
+3. 对话历史（只追加；按批淘汰，见 ConversationHistory.evict_ratio）
+4. 易变的上下文（时间、天气、新闻、连续轮数提示）只附加在最后一条用户消息的副本上，不写入历史
+"""
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def build_messages(history_messages: list[dict], summary_message: Optional[dict],
+                   volatile_context: str) -> list[dict]:
+    """
+    组装发给模型的消息列表
+
+    Args:
+        history_messages: 系统提示 + 对话历史（ConversationHistory.messages()）
+        summary_message: 对话摘要消息，没有则为 None
+        volatile_context: 每次请求都会变化的上下文，附加在最后一条消息末尾
+    """
+    messages = list(history_messages)
+    if summary_message:
+        messages.insert(1, summary_message)
+    if volatile_context and len(messages) > 1:
+        last = messages[-1]
+        messages[-1] = {"role": last["role"], "content": f"{last['content']}\n\n{volatile_context}"}
+    return messages
+
+
+class PromptCacheStats:
+    """从 API 返回的 usage 统计前缀缓存命中情况"""
+
+    def __init__(self, log_every: int = 20):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.log_every = log_every
+        self._lock = threading.Lock()
+
+    def record(self, usage) -> None:
+        """记录一次请求的 usage（没有 usage 或字段缺失时忽略）"""
+        if usage is None or not getattr(usage, "prompt_tokens", None):
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += usage.prompt_tokens
+            self.cached_tokens += cached
+            should_log = self.requests % self.log_every == 0
+        if should_log:
+            stats = self.stats()
+            logger.info(f"前缀缓存: {stats['requests']} 次请求，缓存命中 {stats['cached_ratio']:.0%} 的提示 token")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0
+            }
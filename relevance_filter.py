@@ -0,0 +1,257 @@
+"""本地相关性预判 - 在 LLM 判断之前用轻量模型挡掉显而易见的情况
+
+每次 LLM 判断的结果都会记录到 judge_decisions.jsonl，并在线更新一个
+字符 n-gram 哈希特征的逻辑回归模型（每个 Agent 一个，纯 CPU，微秒级）。
+模型足够有把握时（概率低于 low 或高于 high）直接给出结论，
+拿不准的消息才交给 LLM 判断。
+
+模型只能从交给 LLM 的消息中学习，本地判错的消息永远得不到纠正；
+因此有把握的结论也按 explore_rate 随机抽一小部分交给 LLM，作为持续的标注样本。
+
+判断记录和模型文件放在 RELEVANCE_DATA_DIR（默认系统临时目录下的 irc_agent_relevance），不写入源码目录。
+
+重新训练：uv run python relevance_filter.py
+"""
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(os.getenv("RELEVANCE_DATA_DIR", os.path.join(tempfile.gettempdir(), "irc_agent_relevance")))
+JUDGE_LOG_FILE = DATA_DIR / "judge_decisions.jsonl"
+MODEL_DIR = DATA_DIR
+
+# 哈希特征空间大小
+NUM_BUCKETS = 1 << 18
+
+
+def extract_features(message: str, is_bot: bool) -> list[int]:
+    """消息的字符 1~3-gram 哈希特征（去重），外加发送者是否为 bot"""
+    text = " ".join(message.lower().split())
+    grams = {"__bot__" if is_bot else "__human__"}
+    for n in (1, 2, 3):
+        for i in range(len(text) - n + 1):
+            grams.add(text[i:i + n])
+    return sorted({zlib.crc32(gram.encode("utf-8")) % NUM_BUCKETS for gram in grams})
+
+
+class RelevanceModel:
+    """哈希特征的逻辑回归（稀疏权重，在线 SGD 更新）"""
+
+    def __init__(self, learning_rate: float = 1.0, l2: float = 1e-4):
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.weights: dict[int, float] = {}
+        self.bias = 0.0
+        self.samples = 0  # 已学习的样本数
+
+    def _score(self, features: list[int]) -> float:
+        scale = 1 / math.sqrt(len(features))
+        z = self.bias + scale * sum(self.weights.get(f, 0.0) for f in features)
+        return 1 / (1 + math.exp(-max(min(z, 30), -30)))
+
+    def predict(self, message: str, is_bot: bool) -> float:
+        """回复概率（0~1）"""
+        return self._score(extract_features(message, is_bot))
+
+    def update(self, message: str, is_bot: bool, label: bool):
+        """用一条判断结果更新模型"""
+        features = extract_features(message, is_bot)
+        scale = 1 / math.sqrt(len(features))
+        gradient = (1.0 if label else 0.0) - self._score(features)
+        for f in features:
+            w = self.weights.get(f, 0.0)
+            self.weights[f] = w + self.learning_rate * (gradient * scale - self.l2 * w)
+        self.bias += self.learning_rate * gradient
+        self.samples += 1
+
+    def fit(self, samples: list[tuple[str, bool, bool]], epochs: int = 5, seed: int = 42):
+        """批量训练：samples 为 (消息, 是否 bot, 是否回复)"""
+        rng = random.Random(seed)
+        samples = list(samples)
+        for _ in range(epochs):
+            rng.shuffle(samples)
+            for message, is_bot, label in samples:
+                self.update(message, is_bot, label)
+        self.samples = len(samples)
+
+    def save(self, path: Path):
+        data = {"bias": self.bias, "samples": self.samples,
+                "weights": {str(k): round(v, 6) for k, v in self.weights.items() if abs(v) > 1e-6}}
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["RelevanceModel"]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        model = cls()
+        model.bias = data.get("bias", 0.0)
+        model.samples = data.get("samples", 0)
+        model.weights = {int(k): v for k, v in data.get("weights", {}).items()}
+        return model
+
+
+def load_judge_log(nickname: str, log_path: Path = JUDGE_LOG_FILE) -> list[tuple[str, bool, bool]]:
+    """读取某个 Agent 的历史判断记录"""
+    samples = []
+    try:
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("agent") == nickname:
+                    samples.append((record["message"], record.get("is_bot", False), record["decision"]))
+    except OSError:
+        pass
+    return samples
+
+
+class RelevanceFilter:
+    """单个 Agent 的本地预判"""
+
+    def __init__(self, nickname: str, low: float = 0.1, high: float = 0.9,
+                 min_samples: int = 200, save_every: int = 20, explore_rate: float = 0.05,
+                 log_path: Path = JUDGE_LOG_FILE, model_dir: Path = MODEL_DIR):
+        """
+        Args:
+            nickname: Agent 昵称（每个人格的判断标准不同，分别建模）
+            low: 回复概率低于此值时直接判定不回复
+            high: 回复概率高于此值时直接判定回复
+            min_samples: 学习的样本数达到多少才开始给出结论
+            save_every: 每学习多少条保存一次模型
+            explore_rate: 有把握的结论中随机交给 LLM 复核的比例（为模型提供纠错样本）
+        """
+        self.nickname = nickname
+        self.low = low
+        self.high = high
+        self.min_samples = min_samples
+        self.save_every = save_every
+        self.explore_rate = explore_rate
+        self.log_path = log_path
+        self.model_path = model_dir / f"relevance_model_{nickname}.json"
+        self.stats = {"local_yes": 0, "local_no": 0, "escalated": 0, "explored": 0}
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self._unsaved = 0
+
+        try:
+            model_dir.mkdir(parents=True, exist_ok=True)
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"创建本地预判数据目录失败: {e}")
+
+        self.model = RelevanceModel.load(self.model_path)
+        if self.model is None:
+            self.model = RelevanceModel()
+            samples = load_judge_log(nickname, log_path)
+            if samples:
+                self.model.fit(samples)
+                logger.info(f"本地预判模型已从 {len(samples)} 条判断记录训练: {nickname}")
+
+    def decide(self, message: str, is_bot: bool) -> Optional[bool]:
+        """
+        本地预判
+
+        Returns:
+            True/False 有把握的结论，None 表示拿不准（或样本不足、被抽中复核），需要 LLM 判断
+        """
+        with self._lock:
+            if self.model.samples < self.min_samples:
+                return None
+            probability = self.model.predict(message, is_bot)
+            if (probability >= self.high or probability <= self.low) and self._rng.random() < self.explore_rate:
+                self.stats["explored"] += 1
+                return None
+            if probability >= self.high:
+                self.stats["local_yes"] += 1
+                return True
+            if probability <= self.low:
+                self.stats["local_no"] += 1
+                return False
+            self.stats["escalated"] += 1
+            return None
+
+    def record(self, message: str, is_bot: bool, decision: bool):
+        """记录一次 LLM 判断结果：写入日志并在线更新模型"""
+        record = {
+            "time": datetime.now().isoformat(),
+            "agent": self.nickname,
+            "message": message,
+            "is_bot": is_bot,
+            "decision": decision
+        }
+        with self._lock:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.warning(f"写入判断记录失败: {e}")
+
+            self.model.update(message, is_bot, decision)
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._unsaved = 0
+                try:
+                    self.model.save(self.model_path)
+                except OSError as e:
+                    logger.warning(f"保存本地预判模型失败: {e}")
+
+
+def main():
+    """从判断记录重新训练所有 Agent 的模型，并报告留出集上的覆盖率和准确率"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    agents = set()
+    try:
+        with open(JUDGE_LOG_FILE, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    agents.add(json.loads(line)["agent"])
+                except (ValueError, KeyError):
+                    continue
+    except OSError:
+        print(f"没有找到判断记录: {JUDGE_LOG_FILE}")
+        return
+
+    for nickname in sorted(agents):
+        samples = load_judge_log(nickname)
+        random.Random(0).shuffle(samples)
+        split = int(len(samples) * 0.8)
+        model = RelevanceModel()
+        model.fit(samples[:split])
+
+        held_out = samples[split:]
+        decided = correct = 0
+        for message, is_bot, label in held_out:
+            probability = model.predict(message, is_bot)
+            if probability >= 0.9 or probability <= 0.1:
+                decided += 1
+                correct += (probability >= 0.9) == label
+        coverage = decided / len(held_out) if held_out else 0
+        accuracy = correct / decided if decided else 0
+        print(f"{nickname}: {len(samples)} 条记录，留出集本地决定 {coverage:.0%}，准确率 {accuracy:.0%}")
+
+        model = RelevanceModel()
+        model.fit(samples)
+        model.save(MODEL_DIR / f"relevance_model_{nickname}.json")
+
+
+if __name__ == "__main__":
+    main()
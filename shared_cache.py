@@ -0,0 +1,108 @@
+"""跨进程共享缓存 - 基于 SQLite 的持久化键值存储
+
+多个 bot 进程（以及重启后的进程）共用同一个缓存文件：
+天气结果、格式化后的新闻上下文都存放在这里，任何进程写入后其他进程立即可读。
+SQLite 自带文件锁，WAL 模式下读写互不阻塞。
+"""
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "IRC_AGENT_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "irc_agent_cache.sqlite3")
+)
+
+
+class SharedCache:
+    """SQLite 持久化缓存（线程安全，多进程共享）"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " name TEXT PRIMARY KEY, owner INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def get(self, namespace: str, key: str) -> Optional[tuple[Any, float]]:
+        """
+        读取缓存
+
+        Returns:
+            (值, 写入时间戳)，不存在时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at FROM cache WHERE namespace = ? AND key = ?",
+                (namespace, key)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, namespace: str, key: str, value: Any, stored_at: Optional[float] = None):
+        """写入缓存（值必须可 JSON 序列化）"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, stored_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), stored_at or time.time())
+            )
+
+    def try_lease(self, name: str, seconds: float) -> bool:
+        """
+        尝试获得一个跨进程租约（例如"由谁来刷新北京的天气"）
+
+        租约未过期且属于其他进程时返回 False；本进程已持有时续期并返回 True。
+        """
+        now = time.time()
+        pid = os.getpid()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at < ? OR leases.owner = ?",
+                (name, pid, now + seconds, now, pid)
+            )
+            return cursor.rowcount > 0
+
+    def release_lease(self, name: str):
+        """释放本进程持有的租约（其他进程持有的不受影响）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, os.getpid()))
+
+
+# 全局单例（打开失败时为 None，调用方退化为纯内存缓存）
+_shared_cache: Optional[SharedCache] = None
+_init_lock = threading.Lock()
+_init_failed = False
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """获取共享缓存单例；缓存文件不可用时返回 None"""
+    global _shared_cache, _init_failed
+    if _shared_cache is None and not _init_failed:
+        with _init_lock:
+            if _shared_cache is None and not _init_failed:
+                try:
+                    _shared_cache = SharedCache()
+                    logger.info(f"共享缓存: {_shared_cache.path}")
+                except sqlite3.Error as e:
+                    _init_failed = True
+                    logger.warning(f"共享缓存不可用，仅使用进程内缓存: {e}")
+    return _shared_cache
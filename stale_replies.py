@@ -0,0 +1,109 @@
+"""过时回复检测 - 对话已经继续时，放弃还在生成中的回复
+
+消息在 IRC 读取路径上收到时就计数（received），此时还没有排进分发队列或合并器；
+真正处理时用 claim 取回收到时的标记。这样前一条消息的 LLM 调用还没结束时，
+排在后面等待处理的消息也已经计入进度。
+
+每条进入处理流程的消息都会拿到一个 InFlightReply 标记。生成期间如果：
+- 频道里又来了 stale_after 条（及以上）新消息，或者
+- 有人类点名了另一个 bot（而没有点名自己），
+这条回复就过时了：流式生成会立即中断请求，非流式生成的结果不再发送，也不写入历史。
+"""
+import logging
+import threading
+from collections import deque
+from trigger_matcher import KEYWORD, MENTION, TriggerMatcher
+
+logger = logging.getLogger(__name__)
+
+
+class InFlightReply:
+    """一条正在处理的消息"""
+    __slots__ = ("activity", "channel", "seq")
+
+    def __init__(self, activity: "ChannelActivity", channel: str, seq: int):
+        self.activity = activity
+        self.channel = channel
+        self.seq = seq
+
+    def is_stale(self) -> bool:
+        """对话是否已经越过了这条消息"""
+        return self.activity.is_stale(self.channel, self.seq)
+
+
+class ChannelActivity:
+    """一个 Agent 视角下各频道的消息进度"""
+
+    def __init__(self, nickname: str, known_bots: list[str], stale_after: int = 3):
+        """
+        Args:
+            nickname: 自己的昵称（自己发出的消息不计数）
+            known_bots: 已知 bot 昵称（用于判断人类是否点名了别的 bot）
+            stale_after: 来了多少条新消息后放弃回复，0 表示只在人类点名其他 bot 时放弃
+        """
+        self.nickname = nickname
+        self.stale_after = stale_after
+        self._known_bots = {name.lower() for name in known_bots}
+        others = [name for name in known_bots if name.lower() != nickname.lower()]
+        self._matcher = TriggerMatcher(nickname, others, greetings=[])
+        self._seq: dict[str, int] = {}
+        self._redirected: dict[str, int] = {}  # 频道 -> 人类最近一次点名其他 bot 的序号
+        self._received: dict[str, deque] = {}  # 频道 -> 已收到、尚未处理的 (发送者, 消息, 标记)
+        self._lock = threading.Lock()
+
+    def observe(self, channel: str, sender: str, message: str) -> InFlightReply:
+        """记录一条新消息，返回这条消息的标记"""
+        counted = sender.lower() != self.nickname.lower()
+        redirected = False
+        if counted and sender.lower() not in self._known_bots:
+            found = self._matcher.scan(message)
+            redirected = KEYWORD in found and MENTION not in found
+
+        with self._lock:
+            seq = self._seq.get(channel, 0) + (1 if counted else 0)
+            self._seq[channel] = seq
+            if redirected:
+                self._redirected[channel] = seq
+        return InFlightReply(self, channel, seq)
+
+    def received(self, channel: str, sender: str, message: str):
+        """收到一行时立即调用（注册为 IRC 客户端的 on_receive 钩子）：计数并登记，处理时由 claim 取回"""
+        inflight = self.observe(channel, sender, message)
+        with self._lock:
+            pending = self._received.get(channel)
+            if pending is None:
+                pending = self._received[channel] = deque(maxlen=200)
+            pending.append((sender, message, inflight))
+
+    def claim(self, channel: str, sender: str, message: str) -> InFlightReply:
+        """
+        开始处理一条消息时取回它收到时的标记
+
+        合并后的多行消息取最后一行的标记；排在它前面、没有被处理的行（分发队列丢弃的）一并清掉。
+        没有登记过（客户端未注册接收钩子）时现在计数。
+        """
+        found = None
+        with self._lock:
+            pending = self._received.get(channel)
+            for line in message.split("\n"):
+                if not pending:
+                    break
+                for i, (s, m, inflight) in enumerate(pending):
+                    if s == sender and m == line:
+                        for _ in range(i + 1):
+                            pending.popleft()
+                        found = inflight
+                        break
+        return found if found is not None else self.observe(channel, sender, message)
+
+    def is_stale(self, channel: str, seq: int) -> bool:
+        with self._lock:
+            newer = self._seq.get(channel, 0) - seq
+            redirected = self._redirected.get(channel, 0) > seq
+        if redirected:
+            logger.info(f"{channel} 有人点名了其他 bot，放弃回复")
+            return True
+        if self.stale_after and newer >= self.stale_after:
+            logger.info(f"{channel} 已有 {newer} 条新消息，放弃过时的回复")
+            return True
+        return False
@@ -0,0 +1,225 @@
+"""状态发布器 - 在后台线程把 agent 状态写入监控用的文件
+
+状态由两部分组成：
+- 快照 irc_agent_<nick>.json：完整状态，附带已包含的最后一个事件序号 seq
+- 事件日志 irc_agent_<nick>.events.jsonl：快照之后的增量事件，每行一个，只追加
+
+每次回复只追加几条小事件（新增消息、淘汰、重置、元数据变化），写入量与历史长度无关；
+日志累计到 compact_every 条时重新生成快照并清空日志。读取方用 load_status 从快照 + 日志重建状态。
+重启后序号从头开始，上一次运行留下的日志在启动时清空，避免读取方把旧事件接到新快照上。
+
+回复路径上只登记事件，真正的写文件由后台线程完成：
+- 去抖：debounce 秒内的多次更新合并成一次写入
+- 快照原子写入：先写临时文件再 os.replace，Web 监控不会读到写了一半的文件
+- 元数据没有变化（忽略 last_update 等字段）时不写事件
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 事件类型
+APPEND = "append"  # {"message": {...}} 追加一条消息
+EVICT = "evict"    # {"count": n} 从最旧处淘汰 n 条消息（系统提示除外）
+RESET = "reset"    # 清空对话（保留系统提示）
+META = "meta"      # 其余字段覆盖到状态上
+
+
+def events_path_for(path: str) -> str:
+    """快照路径对应的事件日志路径"""
+    base, _ = os.path.splitext(path)
+    return f"{base}.events.jsonl"
+
+
+def write_json_atomic(path: str, data) -> None:
+    """原子地写入 JSON 文件（临时文件 + 重命名）"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def apply_event(status: dict, event: dict) -> None:
+    """把一个事件应用到状态上"""
+    history = status.setdefault('conversation_history', [])
+    kind = event.get('type')
+    if kind == APPEND:
+        history.append(event['message'])
+    elif kind == EVICT:
+        del history[1:1 + event['count']]
+    elif kind == RESET:
+        del history[1:]
+    elif kind == META:
+        status.update({k: v for k, v in event.items() if k not in ('type', 'seq')})
+    status['history_length'] = len(history)
+    status['seq'] = event['seq']
+
+
+def load_status(path: str, retries: int = 3) -> Optional[dict]:
+    """
+    从快照 + 事件日志重建状态
+
+    读取快照和日志之间恰好发生压缩时（快照已被替换，或日志里的事件接不上快照的 seq），重新读取。
+
+    Returns:
+        状态字典；快照不存在时返回 None
+    """
+    for _ in range(retries):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                status = json.load(f)
+        except FileNotFoundError:
+            return None
+
+        events = []
+        try:
+            with open(events_path_for(path), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        events.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # 最后一行可能还没写完
+        except FileNotFoundError:
+            pass
+
+        try:
+            if os.stat(path).st_ino != inode:
+                continue
+        except FileNotFoundError:
+            pass
+        seq = status.get('seq', 0)
+        events = [e for e in events if e.get('seq', 0) > seq]
+        if events and events[0]['seq'] != seq + 1:
+            continue
+        for event in events:
+            apply_event(status, event)
+        return status
+    return status
+
+
+class StatusPublisher:
+    """后台状态发布器（每个 Agent 一个）"""
+
+    def __init__(self, path: str, build: Callable[[bool], dict], debounce: float = 0.5,
+                 compact_every: int = 200, ignore_keys: tuple = ("last_update",)):
+        """
+        Args:
+            path: 快照文件路径（事件日志放在同目录，见 events_path_for）
+            build: 生成状态字典的回调，参数为是否包含对话历史（在后台线程中调用）。
+                   包含历史时必须在持有与 emit 相同的锁的情况下读取 current_seq()
+            debounce: 合并更新的等待时间（秒）
+            compact_every: 日志累计多少条事件后重新生成快照
+            ignore_keys: 判断元数据是否变化时忽略的字段
+        """
+        self.path = path
+        self.events_path = events_path_for(path)
+        self.build = build
+        self.debounce = debounce
+        self.compact_every = compact_every
+        self.ignore_keys = ignore_keys
+        self.writes = 0
+        self.skipped = 0
+        self.compactions = 0
+        self._seq = 0
+        self._logged = compact_every  # 首次写入时先生成快照
+        self._last_meta: dict = {}
+        self._pending: list[dict] = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._worker: Optional[threading.Thread] = None
+        self._truncate_events()
+
+    def _truncate_events(self):
+        """清空事件日志（在写入新快照之前，读取方不会读到新快照配旧日志）"""
+        try:
+            with open(self.events_path, 'w', encoding='utf-8'):
+                pass
+        except OSError as e:
+            logger.warning(f"清空状态事件日志失败: {e}")
+
+    def current_seq(self) -> int:
+        """最后一个已登记事件的序号"""
+        with self._lock:
+            return self._seq
+
+    def emit(self, kind: str, **fields):
+        """登记一个事件（立即返回，稍后由后台线程写入）"""
+        with self._lock:
+            self._seq += 1
+            self._pending.append({'seq': self._seq, 'type': kind, **fields})
+        self.publish()
+
+    def publish(self):
+        """标记状态已变化（元数据在后台线程中重新比较）"""
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f"status-{os.path.basename(self.path)}",
+                                                daemon=True)
+                self._worker.start()
+            self._idle.clear()
+            self._wakeup.set()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待待写入的状态落盘（测试和退出时使用）"""
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        """后台线程：被唤醒后等待 debounce 秒，把期间的所有更新合并写入一次"""
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.debounce)
+            with self._lock:
+                self._wakeup.clear()
+
+            try:
+                self._write()
+            except Exception as e:
+                logger.warning(f"更新状态文件失败: {e}")
+
+            with self._lock:
+                if not self._wakeup.is_set():
+                    self._idle.set()
+
+    def _write(self):
+        meta = self.build(False)
+        changed = {k: v for k, v in meta.items()
+                   if k not in self.ignore_keys and self._last_meta.get(k) != v}
+
+        with self._lock:
+            if changed:
+                self._seq += 1
+                self._pending.append({'seq': self._seq, 'type': META, **changed,
+                                      **{k: meta[k] for k in self.ignore_keys if k in meta}})
+            events, self._pending = self._pending, []
+        self._last_meta = meta
+
+        if not events:
+            self.skipped += 1
+            return
+
+        self._logged += len(events)
+        if self._logged >= self.compact_every:
+            self._compact()
+        else:
+            with open(self.events_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in events))
+        self.writes += 1
+
+    def _compact(self):
+        """重新生成快照并清空事件日志"""
+        snapshot = self.build(True)
+        seq = snapshot['seq']
+        write_json_atomic(self.path, snapshot)
+        with self._lock:
+            # 快照生成后才登记的事件留到下次写入
+            self._pending = [e for e in self._pending if e['seq'] > seq]
+        self._truncate_events()
+        self._logged = 0
+        self.compactions += 1
@@ -0,0 +1,148 @@
+"""测试上下文快照（按分钟缓存、新闻按文件版本失效、天气缺失时不阻塞）"""
+import json
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+import context_snapshot
+import news_fetcher
+import weather_service
+from context_snapshot import ContextSnapshotProvider
+from shared_cache import SharedCache
+from weather_service import CircuitBreaker, WeatherService
+
+REAL_DATETIME = context_snapshot.datetime
+REAL_PEEK_CITY_WEATHER = context_snapshot.peek_city_weather
+
+
+class FakeClock:
+    """替换 context_snapshot.datetime，让测试控制当前时间"""
+    current = datetime(2025, 10, 13, 22, 45, 5)
+
+    @classmethod
+    def now(cls):
+        return cls.current
+
+
+def test_snapshot_cached_per_minute():
+    """同一分钟内返回同一个字符串；换了分钟或天气变化时重新构建"""
+    print("=" * 60)
+    print("测试1: 按分钟缓存")
+    print("=" * 60)
+
+    weather = {"北京": "☀️晴朗，气温12°C"}
+    context_snapshot.datetime = FakeClock
+    context_snapshot.peek_city_weather = lambda city: weather.get(city)
+    try:
+        provider = ContextSnapshotProvider()
+        first = provider.get("北京", include_news=False)
+        print(f"  快照: {first}")
+        assert first == "2025年10月13日 星期一 22点45分，北京☀️晴朗，气温12°C"
+
+        FakeClock.current = datetime(2025, 10, 13, 22, 45, 50)
+        assert provider.get("北京", include_news=False) is first, "同一分钟内应复用同一个字符串"
+
+        weather["北京"] = "🌧️小雨，气温10°C"
+        assert "小雨" in provider.get("北京", include_news=False), "天气变化时应重新构建"
+
+        FakeClock.current = datetime(2025, 10, 13, 22, 46, 0)
+        assert "22点46分" in provider.get("北京", include_news=False)
+    finally:
+        context_snapshot.datetime = REAL_DATETIME
+        context_snapshot.peek_city_weather = REAL_PEEK_CITY_WEATHER
+        FakeClock.current = datetime(2025, 10, 13, 22, 45, 5)
+    print("\n✅ 测试通过\n")
+
+
+def test_news_invalidated_by_file_version():
+    """新闻文件不变时不重新读取；内容（mtime/大小）变化后立即生效"""
+    print("=" * 60)
+    print("测试2: 新闻按文件版本失效")
+    print("=" * 60)
+
+    real_file = news_fetcher.LATEST_NEWS_FILE
+    real_get_shared_cache = news_fetcher.get_shared_cache
+    real_load = news_fetcher.load_latest_news
+    loads = []
+
+    def counting_load():
+        loads.append(1)
+        return real_load()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        news_file = Path(tmp) / "latest_news.json"
+        news_file.write_text(json.dumps({"news": {"world": "旧闻"}}, ensure_ascii=False), encoding="utf-8")
+        news_fetcher.LATEST_NEWS_FILE = news_file
+        news_fetcher.get_shared_cache = lambda: None
+        news_fetcher.load_latest_news = counting_load
+        news_fetcher._formatted_news = None
+        context_snapshot.datetime = FakeClock
+        try:
+            provider = ContextSnapshotProvider()
+            first = provider.get(include_news=True)
+            assert "[今日要闻：🌍旧闻]" in first
+            assert provider.get(include_news=True) is first and len(loads) == 1, "文件不变时不应重新读取"
+
+            news_file.write_text(json.dumps({"news": {"world": "新的要闻"}}, ensure_ascii=False), encoding="utf-8")
+            second = provider.get(include_news=True)
+            print(f"  更新后: {second}")
+            assert "🌍新的要闻" in second and len(loads) == 2, "同一分钟内文件变化也应立即生效"
+
+            news_file.unlink()
+            assert "今日要闻" not in provider.get(include_news=True), "文件删除后不再注入新闻"
+        finally:
+            news_fetcher.LATEST_NEWS_FILE = real_file
+            news_fetcher.get_shared_cache = real_get_shared_cache
+            news_fetcher.load_latest_news = real_load
+            news_fetcher._formatted_news = None
+            context_snapshot.datetime = REAL_DATETIME
+    print("\n✅ 测试通过\n")
+
+
+def test_missing_weather_never_blocks():
+    """天气缓存缺失时立即返回（不含天气），在后台刷新，之后的快照带上天气"""
+    print("=" * 60)
+    print("测试3: 天气缺失不阻塞")
+    print("=" * 60)
+
+    def slow_provider(city):
+        time.sleep(0.5)
+        return "⛅多云"
+
+    service = WeatherService(shared_cache=SharedCache(":memory:"))
+    service.providers = [("slow", slow_provider)]
+    service.breakers = {"slow": CircuitBreaker("slow")}
+    service.refresh_interval = 3600
+
+    real_service = weather_service._weather_service
+    weather_service._weather_service = service
+    try:
+        provider = ContextSnapshotProvider()
+        start = time.monotonic()
+        text = provider.get("北京", include_news=False)
+        elapsed = time.monotonic() - start
+        print(f"  耗时: {elapsed:.3f}s  快照: {text}")
+        assert elapsed < 0.1, "缓存缺失时不应等待网络"
+        assert "北京天气信息暂时无法获取" in text
+
+        deadline = time.monotonic() + 2
+        while service.peek_weather("北京")[0] is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert "北京⛅多云" in provider.get("北京", include_news=False), "后台刷新完成后应带上天气"
+    finally:
+        weather_service._weather_service = real_service
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_snapshot_cached_per_minute()
+        test_news_invalidated_by_file_version()
+        test_missing_weather_never_blocks()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
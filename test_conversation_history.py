@@ -0,0 +1,118 @@
+"""测试按 token 预算管理的对话历史"""
+from config import AgentConfig, OpenAIConfig
+from conversation_history import ConversationHistory, estimate_tokens
+
+
+def test_estimate_tokens():
+    """中文按字计数，英文约 4 字符 1 token"""
+    print("=" * 60)
+    print("测试1: token 估算")
+    print("=" * 60)
+
+    assert estimate_tokens("大家好") == 3
+    assert estimate_tokens("hello world!") == 3
+    assert estimate_tokens("") == 0
+    print("\n✅ 测试通过\n")
+
+
+def test_evicts_oldest_within_budget():
+    """超出预算时从最旧的一端淘汰，系统提示和最新消息始终保留"""
+    print("=" * 60)
+    print("测试2: 按预算淘汰")
+    print("=" * 60)
+
+    history = ConversationHistory("系统", token_budget=40)
+    evicted = []
+    for i in range(10):
+        evicted += history.append({"role": "user", "content": f"第{i}条消息"})
+        assert history.total_tokens <= history.token_budget
+
+    messages = history.messages()
+    print(f"  保留: {[m['content'] for m in messages]}")
+    assert messages[0] == {"role": "system", "content": "系统"}
+    assert messages[-1]["content"] == "第9条消息"
+    assert [m["content"] for m in evicted] == [f"第{i}条消息" for i in range(len(evicted))]
+    assert len(evicted) + len(history) - 1 == 10
+
+    # 超长的单条消息也会保留（不能把最新消息淘汰掉）
+    history.append({"role": "user", "content": "长" * 100})
+    assert len(history) == 2
+    print("\n✅ 测试通过\n")
+
+
+def test_reset_and_copy():
+    """重置返回被清空的消息；副本的修改不影响原历史"""
+    print("=" * 60)
+    print("测试3: 重置与副本")
+    print("=" * 60)
+
+    history = ConversationHistory("系统", token_budget=1000)
+    history.append({"role": "user", "content": "你好"})
+    clone = history.copy()
+    clone.append({"role": "assistant", "content": "你好呀"})
+    assert len(history) == 2 and len(clone) == 3
+
+    assert [m["content"] for m in history.reset()] == ["你好"]
+    assert len(history) == 1
+    assert history.total_tokens == estimate_tokens("系统") + 4
+    print("\n✅ 测试通过\n")
+
+
+def test_bot_streak_is_incremental():
+    """连续 bot 轮数按发送者维护：bot 的用户消息不清零，人类发言清零"""
+    print("=" * 60)
+    print("测试4: 连续 bot 轮数")
+    print("=" * 60)
+
+    history = ConversationHistory("系统", token_budget=1000)
+    history.append({"role": "user", "content": "[来自 lemon 在 #c]: 聊聊 yueran 说的"}, sender="lemon")
+    history.append({"role": "assistant", "content": "好"}, sender="mingxuan")
+    history.append({"role": "user", "content": "[来自 yueran 在 #c]: 同意"}, sender="yueran", is_bot=True)
+    history.append({"role": "assistant", "content": "嗯"}, sender="mingxuan")
+    assert history.bot_streak == 2
+    assert history.copy().bot_streak == 2
+
+    history.append({"role": "user", "content": "[来自 lemon 在 #c]: yueran 怎么看"}, sender="lemon")
+    assert history.bot_streak == 0, "人类提到 bot 名字也应清零"
+    history.reset()
+    assert history.bot_streak == 0
+    print("\n✅ 测试通过\n")
+
+
+def test_agent_uses_sender_not_content():
+    """Agent 按发送者昵称判断 bot，人类消息里提到 bot 名字不算 bot 发言"""
+    print("=" * 60)
+    print("测试5: Agent 的 bot 判断")
+    print("=" * 60)
+
+    from ai_agent import AIAgent
+    agent = AIAgent(
+        OpenAIConfig(api_key="test"),
+        AgentConfig(trigger_keywords=[], location=None, summarize_history=False),
+        client=object()
+    )
+    messages = agent._prepare_messages("#c", "lemon", "yueran 你怎么看", commit=False)
+    assert "第 1 轮" in messages[-1]["content"]
+
+    agent._prepare_messages("#c", "lemon", "你好")
+    agent._record_reply("你好呀")
+    messages = agent._prepare_messages("#c", "yueran", "我也来了", commit=False)
+    assert "第 2 轮" in messages[-1]["content"]
+    assert agent.is_known_bot("YueRan") and not agent.is_known_bot("lemon")
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_estimate_tokens()
+        test_evicts_oldest_within_budget()
+        test_reset_and_copy()
+        test_bot_streak_is_incremental()
+        test_agent_uses_sender_not_content()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
@@ -0,0 +1,147 @@
+"""测试发言权仲裁（去重、点名优先、批量判断解析）"""
+import types
+import floor_arbiter
+from ai_agent import AIAgent
+from config import AgentConfig, OpenAIConfig
+from floor_arbiter import FloorArbiter
+
+NICKS = ["mingxuan", "yueran", "zhiyuan"]
+REAL_DELIVER_REPLY = floor_arbiter.deliver_reply
+
+
+class FakeIRC:
+    def on_receive(self, hook):
+        pass
+
+
+def fake_client(answer=None, calls=None):
+    """批量判断用的假客户端：answer 为 None 时调用即抛出异常"""
+    def create(**kwargs):
+        if calls is not None:
+            calls.append(kwargs["messages"][0]["content"])
+        if answer is None:
+            raise RuntimeError("judge unavailable")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=answer))])
+    return types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+
+
+def make_arbiter(answer=None, calls=None) -> tuple[FloorArbiter, list]:
+    """三个 Agent 的仲裁器；记录被派发发言的昵称"""
+    arbiter = FloorArbiter(fake_client(answer, calls), "judge-model")
+    for nick in NICKS:
+        agent = AIAgent(OpenAIConfig(api_key="test"),
+                        AgentConfig(trigger_keywords=["量子"], location=None, summarize_history=False),
+                        client=fake_client())
+        agent.agent_config.system_prompt = f"你是 {nick}。"
+        arbiter.register(agent, FakeIRC(), nick)
+    spoken = []
+    floor_arbiter.deliver_reply = lambda agent, irc, channel, sender, message, inflight: spoken.append(
+        next(nick for nick, p in arbiter.participants.items() if p.agent is agent))
+    return arbiter, spoken
+
+
+def test_each_line_arbitrated_once():
+    """每个连接都收到同一行时只仲裁一次；人类重复发同样的内容时每次都仲裁"""
+    print("=" * 60)
+    print("测试1: 按收到的行去重")
+    print("=" * 60)
+
+    arbiter = FloorArbiter(fake_client(), "judge-model")
+    arbitrated = []
+    arbiter.arbitrate = lambda channel, sender, message: arbitrated.append(message)
+    handlers = [arbiter.create_handler() for _ in NICKS]
+
+    for handler in handlers:
+        handler("#ai", "lemon", "量子计算怎么看")
+    assert arbitrated == ["量子计算怎么看"]
+
+    # 人类连发两次 "?"：各连接收到的顺序可以交错
+    handlers[0]("#ai", "lemon", "?")
+    handlers[1]("#ai", "lemon", "?")
+    handlers[0]("#ai", "lemon", "?")
+    handlers[2]("#ai", "lemon", "?")
+    handlers[1]("#ai", "lemon", "?")
+    handlers[2]("#ai", "lemon", "?")
+    print(f"  仲裁: {arbitrated}")
+    assert arbitrated == ["量子计算怎么看", "?", "?"]
+
+    # 不同频道、不同发送者互不影响
+    handlers[0]("#other", "lemon", "?")
+    handlers[0]("#ai", "alice", "?")
+    assert arbitrated[3:] == ["?", "?"]
+    print("\n✅ 测试通过\n")
+
+
+def test_mention_beats_greeting():
+    """点名的 Agent 独占发言权；只有问候时所有问候匹配的 Agent 都回复；都不调用批量判断"""
+    print("=" * 60)
+    print("测试2: 点名优先")
+    print("=" * 60)
+
+    calls = []
+    try:
+        arbiter, spoken = make_arbiter(calls=calls)
+        arbiter.arbitrate("#ai", "lemon", "yueran，大家好")
+        assert spoken == ["yueran"]
+        spoken.clear()
+        arbiter.arbitrate("#ai", "lemon", "大家好")
+        assert sorted(spoken) == sorted(NICKS)
+        assert calls == [], "本地规则能决定时不应调用批量判断"
+    finally:
+        floor_arbiter.deliver_reply = REAL_DELIVER_REPLY
+    print("\n✅ 测试通过\n")
+
+
+def test_judge_scores():
+    """批量判断选出得分最高且达到阈值的 Agent；判断失败时降级到关键词"""
+    print("=" * 60)
+    print("测试3: 批量判断")
+    print("=" * 60)
+
+    try:
+        calls = []
+        arbiter, spoken = make_arbiter('好的，打分如下：{"MingXuan": 7, "yueran": 9, "zhiyuan": 2}', calls)
+        arbiter.arbitrate("#ai", "lemon", "这个问题大家怎么看")
+        assert spoken == ["yueran"] and len(calls) == 1
+
+        arbiter, spoken = make_arbiter("mingxuan: 3, yueran：5")
+        arbiter.arbitrate("#ai", "lemon", "这个问题大家怎么看")
+        assert spoken == [], "都低于阈值时没人发言"
+
+        arbiter, spoken = make_arbiter(None)
+        arbiter.arbitrate("#ai", "lemon", "量子纠缠是什么")
+        assert spoken == ["mingxuan"], "判断失败时按关键词降级，且只选 max_speakers 个"
+    finally:
+        floor_arbiter.deliver_reply = REAL_DELIVER_REPLY
+    print("\n✅ 测试通过\n")
+
+
+def test_parse_scores():
+    """容忍代码块、多余文本、大小写、字符串分数和非 JSON 的回答"""
+    print("=" * 60)
+    print("测试4: 解析得分")
+    print("=" * 60)
+
+    parse = FloorArbiter._parse_scores
+    assert parse('{"mingxuan": 7, "yueran": 2}') == {"mingxuan": 7, "yueran": 2}
+    assert parse('```json\n{"MingXuan": "8"}\n```') == {"mingxuan": 8}
+    assert parse("mingxuan: 6\nyueran：3") == {"mingxuan": 6, "yueran": 3}
+    assert parse('{"mingxuan": 7, "yueran": }') == {"mingxuan": 7}, "JSON 不完整时退回逐项匹配"
+    assert parse('{"mingxuan": "高"}') == {}
+    assert parse("我觉得都不太合适") == {}
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_each_line_arbitrated_once()
+        test_mention_beats_greeting()
+        test_judge_scores()
+        test_parse_scores()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
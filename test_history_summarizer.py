@@ -0,0 +1,74 @@
+"""测试被淘汰对话的滚动摘要"""
+import types
+from history_summarizer import HistorySummarizer
+
+
+class FakeClient:
+    """记录摘要请求，返回固定摘要的假 OpenAI 客户端"""
+
+    def __init__(self, answer: str = "用户A和明轩讨论了货币的本质"):
+        self.answer = answer
+        self.prompts = []
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.prompts.append(kwargs["messages"][0]["content"])
+        message = types.SimpleNamespace(content=self.answer)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+def test_batches_until_threshold():
+    """累计不到阈值时不调用 LLM，force 时立即摘要"""
+    print("=" * 60)
+    print("测试1: 批量摘要")
+    print("=" * 60)
+
+    client = FakeClient()
+    summarizer = HistorySummarizer(client, "test-model", speaker="mingxuan", min_batch_tokens=1000)
+    summarizer.fold([{"role": "user", "content": "[来自 A 在 #c]: 货币有什么用？"}])
+    assert summarizer.wait_idle(1)
+    assert client.prompts == [] and summarizer.summary_message() is None
+
+    summarizer.fold([{"role": "assistant", "content": "本质是共识"}], force=True)
+    assert summarizer.wait_idle(2)
+    prompt = client.prompts[0]
+    print(f"  摘要请求:\n{prompt}")
+    assert "货币有什么用" in prompt and "[mingxuan]: 本质是共识" in prompt
+    assert summarizer.summary_message()["content"] == "[之前的对话摘要：用户A和明轩讨论了货币的本质]"
+    print("\n✅ 测试通过\n")
+
+
+def test_failure_keeps_pending_and_clear():
+    """摘要失败时保留待处理消息；clear 清空一切"""
+    print("=" * 60)
+    print("测试2: 失败重试与清空")
+    print("=" * 60)
+
+    client = FakeClient(answer="")
+    summarizer = HistorySummarizer(client, "test-model", min_batch_tokens=0)
+    summarizer.fold([{"role": "user", "content": "第一条"}])
+    assert summarizer.wait_idle(2)
+    assert summarizer.summary == "" and len(summarizer._pending) == 1
+
+    client.answer = "聊了第一条和第二条"
+    summarizer.fold([{"role": "user", "content": "第二条"}])
+    assert summarizer.wait_idle(2)
+    assert "第一条" in client.prompts[-1] and "第二条" in client.prompts[-1]
+    assert summarizer.summary == "聊了第一条和第二条"
+
+    summarizer.clear()
+    assert summarizer.summary_message() is None
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_batches_until_threshold()
+        test_failure_keeps_pending_and_clear()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
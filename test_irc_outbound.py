@@ -0,0 +1,174 @@
+"""测试 IRC 出站消息的字节切分与令牌桶限速"""
+import asyncio
+import random
+import threading
+import time
+from irc_client import AsyncIRCClient
+from irc_outbound import (
+    IRC_MAX_LINE_BYTES, PRIORITY_CHAT, OutboundQueue, TokenBucket, privmsg_payload_budget, split_irc_message
+)
+
+
+def test_split_chinese_by_bytes():
+    """长中文回复按字节切分，且转发后的整行不超过 512 字节"""
+    print("=" * 60)
+    print("测试1: 中文长消息切分")
+    print("=" * 60)
+
+    channel, nick = "#ai-collab-test", "zhiyuan"
+    message = "人类历史上，所有成功的协作都基于共同的虚构故事。" * 30
+    chunks = split_irc_message(channel, message, nick)
+
+    for chunk in chunks:
+        relayed = f":{nick}!{'u' * 10}@{'h' * 63} PRIVMSG {channel} :{chunk}\r\n"
+        size = len(relayed.encode('utf-8'))
+        print(f"  {size} 字节: {chunk[:20]}...")
+        assert size <= IRC_MAX_LINE_BYTES, "转发后的行超过 512 字节"
+
+    assert "".join(chunks) == message, "切分后内容不应丢失"
+    assert all(chunk.endswith("。") for chunk in chunks[:-1]), "应优先在句号处断开"
+    print("\n✅ 测试通过：中文消息按字节安全切分\n")
+
+
+def test_split_keeps_utf8_and_skips_blank_lines():
+    """不切断多字节字符，并跳过空行"""
+    print("=" * 60)
+    print("测试2: UTF-8 边界与空行")
+    print("=" * 60)
+
+    budget = privmsg_payload_budget("#c", "bot", userhost_bytes=0)
+    message = "第一行\n\n   \n" + "😊" * (budget // 4 + 5)
+    chunks = split_irc_message("#c", message, "bot", userhost_bytes=0)
+
+    print(f"  切分结果: {len(chunks)} 段")
+    assert chunks[0] == "第一行"
+    assert len(chunks) == 3, "空行应被跳过，emoji 行应被切成两段"
+    for chunk in chunks:
+        chunk.encode('utf-8').decode('utf-8')
+        assert len(chunk.encode('utf-8')) <= budget
+    print("\n✅ 测试通过：UTF-8 边界正确\n")
+
+
+def test_token_bucket():
+    """令牌桶：突发额度用完后按速率排队"""
+    print("=" * 60)
+    print("测试3: 令牌桶")
+    print("=" * 60)
+
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    delays = [bucket.reserve() for _ in range(5)]
+    print(f"  等待时间: {[round(d, 2) for d in delays]}")
+
+    assert delays[:3] == [0.0, 0.0, 0.0], "突发额度内应立即发送"
+    assert 0.4 < delays[3] <= 0.5 and 0.9 < delays[4] <= 1.0, "超出后应按 2 行/秒排队"
+
+    peek = TokenBucket(rate=2.0, capacity=1)
+    assert peek.delay() == 0.0 and peek.delay() == 0.0, "只查看不消耗"
+    peek.consume_now()
+    assert 0.4 < peek.delay() <= 0.5
+    print("\n✅ 测试通过：令牌桶限速正常\n")
+
+
+def test_control_jumps_throttled_chat():
+    """聊天消息等待令牌时，之后到达的 PONG 先发送"""
+    print("=" * 60)
+    print("测试4: 控制命令插队")
+    print("=" * 60)
+
+    sent = []
+    start = time.monotonic()
+    outbound = OutboundQueue(lambda line: sent.append((line, time.monotonic() - start)), TokenBucket(4.0, 1))
+    outbound.put("PRIVMSG #c :第一句")
+    outbound.put("PRIVMSG #c :第二句")
+    time.sleep(0.1)
+    outbound.put("PONG :server", priority=0)
+    time.sleep(0.8)
+    outbound.close()
+    print(f"  发送: {[(line, round(t, 2)) for line, t in sent]}")
+    assert [line for line, _ in sent] == ["PRIVMSG #c :第一句", "PONG :server", "PRIVMSG #c :第二句"]
+    assert sent[1][1] < 0.2, "PONG 不应等在被限速的聊天消息后面"
+
+    class FakeWriter:
+        def __init__(self):
+            self.lines = []
+
+        def write(self, data: bytes):
+            self.lines.append((data.decode("utf-8").strip(), time.monotonic() - start))
+
+        async def drain(self):
+            pass
+
+    async def run():
+        client = AsyncIRCClient("localhost", 6667, "bot", ["#c"], send_rate=4.0, send_burst=1)
+        client._outbound, client._outbound_ready = [], asyncio.Event()
+        writer = FakeWriter()
+        task = asyncio.create_task(client._writer_loop(writer))
+        client._put("PRIVMSG #c :第一句", PRIORITY_CHAT)
+        client._put("PRIVMSG #c :第二句", PRIORITY_CHAT)
+        await asyncio.sleep(0.1)
+        client._put("PONG :server")
+        await asyncio.sleep(0.8)
+        task.cancel()
+        return writer.lines
+
+    start = time.monotonic()
+    lines = asyncio.run(run())
+    print(f"  asyncio 发送: {[(line, round(t, 2)) for line, t in lines]}")
+    assert [line for line, _ in lines] == ["PRIVMSG #c :第一句", "PONG :server", "PRIVMSG #c :第二句"]
+    assert lines[1][1] < 0.2
+    print("\n✅ 测试通过\n")
+
+
+def test_dispatch_keeps_channel_order():
+    """多个分发 worker 并发处理，但同一频道的消息按到达顺序处理"""
+    print("=" * 60)
+    print("测试5: 分发顺序")
+    print("=" * 60)
+
+    channels = ["#a", "#b", "#c"]
+    lines = [f":u!u@h PRIVMSG {ch} :{i}" for i in range(8) for ch in channels]
+    handled: dict[str, list[str]] = {ch: [] for ch in channels}
+    done = threading.Event()
+
+    def handler(channel, sender, message):
+        time.sleep(random.uniform(0, 0.02))
+        handled[channel].append(message)
+        if sum(len(v) for v in handled.values()) == len(lines):
+            done.set()
+
+    async def serve(reader, writer):
+        writer.write(b":srv 001 bot :hi\r\n" + "".join(f"{line}\r\n" for line in lines).encode())
+        await writer.drain()
+        await reader.read()
+
+    async def run():
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        client = AsyncIRCClient("127.0.0.1", server.sockets[0].getsockname()[1], "bot", channels,
+                                dispatch_workers=4)
+        client.on_message(handler)
+        task = asyncio.create_task(client.run())
+        await asyncio.to_thread(done.wait, 5)
+        task.cancel()
+        server.close()
+
+    asyncio.run(run())
+    print(f"  处理顺序: {handled}")
+    for channel in channels:
+        assert handled[channel] == [str(i) for i in range(8)], f"{channel} 的消息乱序"
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_split_chinese_by_bytes()
+        test_split_keeps_utf8_and_skips_blank_lines()
+        test_token_bucket()
+        test_control_jumps_throttled_chat()
+        test_dispatch_keeps_channel_order()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
@@ -0,0 +1,53 @@
+"""测试 LLM 判断结果缓存"""
+import time
+from judge_cache import JudgeCache, fingerprint
+
+
+def test_fingerprint_normalization():
+    """大小写、标点、空白和重复字符不影响指纹"""
+    print("=" * 60)
+    print("测试1: 消息指纹")
+    print("=" * 60)
+
+    assert fingerprint("哈哈哈哈！") == fingerprint("哈哈")
+    assert fingerprint("好的。") == fingerprint(" 好的 ")
+    assert fingerprint("OK!!") == fingerprint("ok")
+    assert fingerprint("有意思") != fingerprint("没意思")
+    assert fingerprint("😂😂") != fingerprint("？？？"), "纯表情和纯标点不应混为一谈"
+    print("\n✅ 测试通过\n")
+
+
+def test_lru_ttl_and_counters():
+    """命中计数、容量淘汰和过期"""
+    print("=" * 60)
+    print("测试2: LRU 与过期")
+    print("=" * 60)
+
+    cache = JudgeCache(max_entries=2, ttl=0.2)
+    assert cache.get("a") is None
+    cache.put("a", False)
+    cache.put("b", True)
+    assert cache.get("a") is False
+    cache.put("c", True)  # 淘汰最久未使用的 b
+    assert cache.get("b") is None
+    assert cache.get("c") is True
+
+    time.sleep(0.25)
+    assert cache.get("a") is None, "过期后应未命中"
+    stats = cache.stats()
+    print(f"  统计: {stats}")
+    assert stats["hits"] == 2 and stats["misses"] == 3
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_fingerprint_normalization()
+        test_lru_ttl_and_counters()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
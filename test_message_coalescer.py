@@ -0,0 +1,122 @@
+"""测试连续消息合并"""
+import threading
+import time
+from message_coalescer import MessageCoalescer
+
+
+def make_coalescer(window: float, max_wait: float = None):
+    handled = []
+    coalescer = MessageCoalescer(lambda c, s, m: handled.append((c, s, m)), window, max_wait)
+    return coalescer, handled
+
+
+def test_merges_burst_from_same_sender():
+    """同一个人窗口内的几行合并成一条"""
+    print("=" * 60)
+    print("测试1: 合并连续消息")
+    print("=" * 60)
+
+    coalescer, handled = make_coalescer(0.2)
+    for line in ["等等", "我想问一下", "量子计算现在到哪一步了？"]:
+        coalescer.submit("#ai", "lemon", line)
+        time.sleep(0.05)
+    assert handled == [], "窗口内不应交出"
+    time.sleep(0.3)
+    print(f"  结果: {handled}")
+    assert handled == [("#ai", "lemon", "等等\n我想问一下\n量子计算现在到哪一步了？")]
+    print("\n✅ 测试通过\n")
+
+
+def test_sender_change_flushes_in_order():
+    """换人说话时先交出上一个人的消息；不同频道互不影响"""
+    print("=" * 60)
+    print("测试2: 换人与多频道")
+    print("=" * 60)
+
+    coalescer, handled = make_coalescer(0.2)
+    coalescer.submit("#ai", "lemon", "第一句")
+    coalescer.submit("#other", "bob", "别的频道")
+    coalescer.submit("#ai", "alice", "我插一句")
+    coalescer.join()
+    assert handled == [("#ai", "lemon", "第一句")]
+    time.sleep(0.3)
+    assert sorted(handled[1:]) == [("#ai", "alice", "我插一句"), ("#other", "bob", "别的频道")]
+    print("\n✅ 测试通过\n")
+
+
+def test_max_wait_caps_latency():
+    """一直有新消息时，最长等待 max_wait 就交出"""
+    print("=" * 60)
+    print("测试3: 最长等待")
+    print("=" * 60)
+
+    coalescer, handled = make_coalescer(0.15, max_wait=0.3)
+    start = time.monotonic()
+    while not handled and time.monotonic() - start < 1:
+        coalescer.submit("#ai", "lemon", "刷屏")
+        time.sleep(0.05)
+    elapsed = time.monotonic() - start
+    print(f"  {elapsed:.2f} 秒后交出 {handled[0][2].count('刷屏')} 行")
+    assert handled and elapsed < 0.5
+    print("\n✅ 测试通过\n")
+
+
+def test_bot_lines_pass_through():
+    """已知 bot 的消息不等待窗口；先交出频道里缓冲的人类消息，保证顺序"""
+    print("=" * 60)
+    print("测试4: bot 消息直接处理")
+    print("=" * 60)
+
+    handled = []
+    coalescer = MessageCoalescer(lambda c, s, m: handled.append((c, s, m)), 0.2,
+                                 passthrough=lambda sender: sender == "yueran")
+    coalescer.submit("#ai", "lemon", "人类的问题")
+    coalescer.submit("#ai", "yueran", "bot 的回答")
+    coalescer.join()
+    assert handled == [("#ai", "lemon", "人类的问题"), ("#ai", "yueran", "bot 的回答")]
+    coalescer.submit("#ai", "yueran", "bot 的第二句")
+    coalescer.join()
+    assert handled[-1] == ("#ai", "yueran", "bot 的第二句")
+    print("\n✅ 测试通过\n")
+
+
+def test_bounded_workers():
+    """处理在固定的 worker 线程中执行；队列满时丢弃最旧的消息"""
+    print("=" * 60)
+    print("测试5: 有界处理线程")
+    print("=" * 60)
+
+    release = threading.Event()
+    handled = []
+
+    def handler(channel, sender, message):
+        release.wait(2)
+        handled.append((threading.current_thread().name, message))
+
+    coalescer = MessageCoalescer(handler, 0.05, passthrough=lambda sender: True, workers=1, queue_size=2)
+    coalescer.submit("#ai", "bot", "消息0")
+    time.sleep(0.05)  # worker 取走第一条后阻塞，后面的消息在队列中排队
+    for i in range(1, 5):
+        coalescer.submit("#ai", "bot", f"消息{i}")
+    release.set()
+    coalescer.join()
+    print(f"  处理: {handled}")
+    assert {name for name, _ in handled} == {"coalescer-0"}
+    assert [message for _, message in handled] == ["消息0", "消息3", "消息4"]
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_merges_burst_from_same_sender()
+        test_sender_change_flushes_in_order()
+        test_max_wait_caps_latency()
+        test_bot_lines_pass_through()
+        test_bounded_workers()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
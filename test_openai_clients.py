@@ -0,0 +1,138 @@
+"""测试共享 OpenAI 客户端的连接池和并发限制"""
+import asyncio
+import gc
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import openai_clients
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """每个请求耗时 0.05 秒，记录同时处理的最大请求数"""
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    active = 0
+    peak = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+        time.sleep(0.05)
+        body = json.dumps({
+            "id": "x", "object": "chat.completion", "created": 0, "model": "m",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "好"}}]
+        }).encode()
+        with cls.lock:
+            cls.active -= 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server() -> str:
+    SlowHandler.active = SlowHandler.peak = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/v1"
+
+
+def ask(client):
+    return client.chat.completions.create(model="m", messages=[{"role": "user", "content": "你好"}])
+
+
+def test_sync_client_shared_and_limited():
+    """同一端点共用一个客户端；同时发出的请求不超过每个服务商的上限"""
+    print("=" * 60)
+    print("测试1: 同步客户端共享与并发限制")
+    print("=" * 60)
+
+    base_url = start_server()
+    client = openai_clients.get_openai_client("test", base_url)
+    assert openai_clients.get_openai_client("test", base_url) is client
+
+    threads = [threading.Thread(target=ask, args=(client,)) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f"  最大并发: {SlowHandler.peak}")
+    assert SlowHandler.peak <= openai_clients.MAX_CONCURRENCY_PER_PROVIDER
+    assert openai_clients._provider_semaphores["127.0.0.1"]._value == openai_clients.MAX_CONCURRENCY_PER_PROVIDER
+    print("\n✅ 测试通过\n")
+
+
+def test_async_client_per_loop():
+    """异步客户端在同一事件循环内共享，并发同样受限"""
+    print("=" * 60)
+    print("测试2: 异步客户端")
+    print("=" * 60)
+
+    base_url = start_server()
+
+    async def run():
+        client = openai_clients.get_async_openai_client("test", base_url)
+        assert openai_clients.get_async_openai_client("test", base_url) is client
+        responses = await asyncio.gather(*(ask(client) for _ in range(20)))
+        return client, responses
+
+    first, responses = asyncio.run(run())
+    second, _ = asyncio.run(run())
+    print(f"  最大并发: {SlowHandler.peak}")
+    assert len(responses) == 20 and responses[0].choices[0].message.content == "好"
+    assert SlowHandler.peak <= openai_clients.MAX_CONCURRENCY_PER_PROVIDER
+    assert first is not second, "不同事件循环不应共用异步连接池"
+    print("\n✅ 测试通过\n")
+
+
+def test_abandoned_stream_releases_permit():
+    """流式响应没读完也没关闭就被丢弃时，垃圾回收后名额照样归还"""
+    print("=" * 60)
+    print("测试3: 丢弃的流式响应")
+    print("=" * 60)
+
+    base_url = start_server()
+    http_client = openai_clients.get_openai_client("test", base_url)._client
+    semaphore = openai_clients._provider_semaphores["127.0.0.1"]
+    response = http_client.send(http_client.build_request("POST", f"{base_url}/chat/completions", json={}),
+                                stream=True)
+    assert semaphore._value == openai_clients.MAX_CONCURRENCY_PER_PROVIDER - 1
+    del response
+    gc.collect()
+    assert semaphore._value == openai_clients.MAX_CONCURRENCY_PER_PROVIDER
+
+    async def run():
+        client = openai_clients.get_async_openai_client("test", base_url)._client
+        response = await client.send(client.build_request("POST", f"{base_url}/chat/completions", json={}),
+                                     stream=True)
+        semaphore = openai_clients._async_semaphores[asyncio.get_running_loop()]["127.0.0.1"]
+        assert semaphore._value == openai_clients.MAX_CONCURRENCY_PER_PROVIDER - 1
+        del response
+        gc.collect()
+        await asyncio.sleep(0)
+        return semaphore._value
+
+    assert asyncio.run(run()) == openai_clients.MAX_CONCURRENCY_PER_PROVIDER
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_sync_client_shared_and_limited()
+        test_async_client_per_loop()
+        test_abandoned_stream_releases_permit()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
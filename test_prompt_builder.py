@@ -0,0 +1,69 @@
+"""测试前缀缓存友好的提示组装"""
+import types
+from config import AgentConfig, OpenAIConfig
+from prompt_builder import PromptCacheStats, build_messages
+
+
+def test_volatile_context_goes_to_tail():
+    """易变上下文只附加在最后一条消息的副本上"""
+    print("=" * 60)
+    print("测试1: 易变上下文放在末尾")
+    print("=" * 60)
+
+    history = [{"role": "system", "content": "人格"}, {"role": "user", "content": "你好"}]
+    summary = {"role": "system", "content": "[之前的对话摘要：聊过天气]"}
+    messages = build_messages(history, summary, "[当前时间：10点]")
+    assert [m["content"] for m in messages] == ["人格", "[之前的对话摘要：聊过天气]", "你好\n\n[当前时间：10点]"]
+    assert history[-1]["content"] == "你好", "不应修改历史中的消息"
+    print("\n✅ 测试通过\n")
+
+
+def test_agent_requests_share_prefix():
+    """连续两次请求：前一次请求除最后一条外的内容是后一次请求的前缀"""
+    print("=" * 60)
+    print("测试2: 请求前缀稳定")
+    print("=" * 60)
+
+    from ai_agent import AIAgent
+    agent = AIAgent(OpenAIConfig(api_key="test"),
+                    AgentConfig(trigger_keywords=[], location=None, summarize_history=False),
+                    client=object())
+    first = agent._prepare_messages("#ai", "lemon", "第一个问题")
+    agent._record_reply("第一个回答")
+    second = agent._prepare_messages("#ai", "lemon", "第二个问题")
+
+    assert second[0]["content"] == agent.agent_config.system_prompt, "系统提示不应包含时间"
+    assert second[:len(first) - 1] == first[:-1]
+    assert second[len(first) - 1]["content"] == "[来自 lemon 在 #ai]: 第一个问题", "历史中不应留下易变上下文"
+    assert "[当前时间：" in second[-1]["content"] and "第 1 轮" in second[-1]["content"]
+    print("\n✅ 测试通过\n")
+
+
+def test_cache_stats_from_usage():
+    """从 usage.prompt_tokens_details.cached_tokens 统计命中率"""
+    print("=" * 60)
+    print("测试3: 缓存命中统计")
+    print("=" * 60)
+
+    stats = PromptCacheStats()
+    stats.record(types.SimpleNamespace(prompt_tokens=2000, prompt_tokens_details=types.SimpleNamespace(cached_tokens=1536)))
+    stats.record(types.SimpleNamespace(prompt_tokens=2000, prompt_tokens_details=None))
+    stats.record(None)
+    result = stats.stats()
+    print(f"  统计: {result}")
+    assert result == {"requests": 2, "prompt_tokens": 4000, "cached_tokens": 1536, "cached_ratio": 0.384}
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_volatile_context_goes_to_tail()
+        test_agent_requests_share_prefix()
+        test_cache_stats_from_usage()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
@@ -0,0 +1,98 @@
+"""测试本地相关性预判"""
+import json
+import tempfile
+from pathlib import Path
+from relevance_filter import RelevanceFilter, load_judge_log
+
+NO_REPLY = ["哈哈", "好的", "嗯嗯", "明白了", "哈哈哈", "ok", "好吧", "收到"]
+REPLY = ["你们怎么看这个问题？", "为什么会这样呢？", "有人能解释一下吗？", "这个问题怎么解决？"]
+
+
+def test_learns_obvious_cases_and_escalates():
+    """样本不足时全部交给 LLM；学够之后显而易见的消息本地决定"""
+    print("=" * 60)
+    print("测试1: 在线学习与升级")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = Path(tmp) / "judge.jsonl"
+        relevance = RelevanceFilter("mingxuan", min_samples=50, explore_rate=0, log_path=log_path, model_dir=Path(tmp))
+        assert relevance.decide("哈哈", False) is None, "样本不足时不应给出结论"
+
+        for _ in range(10):
+            for message in NO_REPLY:
+                relevance.record(message, False, False)
+            for message in REPLY:
+                relevance.record(message, False, True)
+
+        print(f"  '哈哈哈哈' -> {relevance.model.predict('哈哈哈哈', False):.2f}")
+        print(f"  '大家怎么看？' -> {relevance.model.predict('大家怎么看？', False):.2f}")
+        assert relevance.decide("哈哈哈哈", False) is False
+        assert relevance.decide("你们怎么看这个问题？", False) is True
+        print(f"  统计: {relevance.stats}")
+
+        # 判断记录写入日志，重启后可以从日志重新训练
+        assert len(load_judge_log("mingxuan", log_path)) == 120
+        assert load_judge_log("yueran", log_path) == []
+        first = json.loads(log_path.read_text(encoding="utf-8").splitlines()[0])
+        assert first["agent"] == "mingxuan" and first["decision"] is False
+    print("\n✅ 测试通过\n")
+
+
+def test_retrains_from_log_on_start():
+    """没有模型文件时从判断记录训练"""
+    print("=" * 60)
+    print("测试2: 启动时从日志训练")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = Path(tmp) / "judge.jsonl"
+        with open(log_path, "w", encoding="utf-8") as f:
+            for _ in range(10):
+                for message in NO_REPLY:
+                    f.write(json.dumps({"agent": "yueran", "message": message, "decision": False}) + "\n")
+                for message in REPLY:
+                    f.write(json.dumps({"agent": "yueran", "message": message, "decision": True}) + "\n")
+
+        relevance = RelevanceFilter("yueran", min_samples=50, explore_rate=0, log_path=log_path, model_dir=Path(tmp))
+        assert relevance.model.samples == 120
+        assert relevance.decide("好的好的", False) is False
+    print("\n✅ 测试通过\n")
+
+
+def test_explores_confident_decisions():
+    """有把握的结论也按比例交给 LLM 复核；数据目录不存在时自动创建"""
+    print("=" * 60)
+    print("测试3: 抽样复核")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "relevance"
+        relevance = RelevanceFilter("zhiyuan", min_samples=50, explore_rate=1.0,
+                                    log_path=data_dir / "judge.jsonl", model_dir=data_dir)
+        for _ in range(10):
+            for message in NO_REPLY:
+                relevance.record(message, False, False)
+            for message in REPLY:
+                relevance.record(message, False, True)
+        assert relevance.decide("哈哈哈哈", False) is None, "被抽中复核时应交给 LLM"
+        assert relevance.stats["explored"] == 1 and relevance.stats["local_no"] == 0
+        assert (data_dir / "judge.jsonl").exists() and (data_dir / "relevance_model_zhiyuan.json").exists()
+
+        relevance.explore_rate = 0
+        assert relevance.decide("哈哈哈哈", False) is False
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_learns_obvious_cases_and_escalates()
+        test_retrains_from_log_on_start()
+        test_explores_confident_decisions()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
@@ -0,0 +1,75 @@
+"""测试跨进程共享缓存（天气结果与刷新租约）"""
+import os
+import tempfile
+from shared_cache import SharedCache
+from weather_service import WeatherService
+
+
+def make_service(cache_path: str, calls: list) -> WeatherService:
+    """创建一个只有假数据源的天气服务，记录网络调用次数"""
+    service = WeatherService(shared_cache=SharedCache(cache_path))
+
+    def fake_provider(city: str):
+        calls.append(city)
+        return "☀️晴，气温12°C"
+
+    service.providers = [("fake", fake_provider)]
+    service.breakers = {"fake": service.breakers["wttr_json"]}
+    return service
+
+
+def test_restart_serves_shared_weather():
+    """一个进程取到的天气，另一个（或重启后的）进程直接复用，不访问网络"""
+    print("=" * 60)
+    print("测试1: 共享天气缓存")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cache.sqlite3")
+        calls = []
+        first = make_service(path, calls)
+        assert first.get_weather("北京") == "☀️晴，气温12°C"
+        assert calls == ["北京"]
+
+        second = make_service(path, calls)
+        weather, fresh = second.peek_weather("北京")
+        print(f"  第二个进程: {weather} (fresh={fresh})")
+        assert weather == "☀️晴，气温12°C" and fresh
+        assert calls == ["北京"], "第二个进程不应再请求网络"
+    print("\n✅ 测试通过\n")
+
+
+def test_refresh_lease_is_exclusive():
+    """同一城市的刷新租约同时只属于一个持有者"""
+    print("=" * 60)
+    print("测试2: 刷新租约")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SharedCache(os.path.join(tmp, "cache.sqlite3"))
+        assert cache.try_lease("weather:北京", 30)
+        assert cache.try_lease("weather:北京", 30), "持有者可以续期"
+        # 模拟另一个进程持有未过期的租约
+        cache._conn.execute("UPDATE leases SET owner = owner + 1")
+        assert not cache.try_lease("weather:北京", 30)
+        cache._conn.execute("UPDATE leases SET expires_at = 0")
+        assert cache.try_lease("weather:北京", 30), "过期后可以接手"
+        cache.release_lease("weather:北京")
+        cache._conn.execute("INSERT INTO leases VALUES ('weather:上海', -1, 1e12)")
+        cache.release_lease("weather:上海")
+        assert cache.try_lease("weather:北京", 30), "释放后立即可以重新获得"
+        assert not cache.try_lease("weather:上海", 30), "不能释放其他进程的租约"
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_restart_serves_shared_weather()
+        test_refresh_lease_is_exclusive()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
@@ -0,0 +1,129 @@
+"""测试投机生成（判断与生成并行）"""
+import threading
+import types
+from agent_runtime import SpeculativeBudget, create_message_handler, respond_speculatively
+from ai_agent import AIAgent
+from config import AgentConfig, OpenAIConfig
+
+MESSAGE = "这个方案你们怎么看"
+
+
+class FakeIRC:
+    def __init__(self):
+        self.sent = []
+
+    def on_receive(self, hook):
+        pass
+
+    def send_message(self, channel, message):
+        self.sent.append(message)
+
+
+def make_agent(judge_answer: str, replies: list, speculative: bool = True, waste_per_hour: int = 30):
+    """
+    假客户端：投机模式下判断调用（max_tokens=10）等生成开始后才返回 judge_answer，保证草稿已在进行中；
+    生成调用依次取 replies，Exception 表示这次生成失败
+    """
+    calls = []
+    generating = threading.Event()
+
+    def create(**kwargs):
+        if kwargs["max_tokens"] == 10:
+            if speculative and waste_per_hour:
+                generating.wait(2)
+            calls.append("judge")
+            content = judge_answer
+        else:
+            calls.append("generate")
+            generating.set()
+            reply = replies.pop(0)
+            if isinstance(reply, Exception):
+                raise reply
+            content = reply
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    agent = AIAgent(OpenAIConfig(api_key="test", stream=False),
+                    AgentConfig(trigger_keywords=[], location=None, summarize_history=False,
+                                speculative_generation=speculative, speculative_waste_per_hour=waste_per_hour),
+                    client=client)
+    return agent, calls
+
+
+def history_roles(agent: AIAgent) -> list[str]:
+    return [m["role"] for m in agent.conversation_history.messages()]
+
+
+def test_judge_no_discards_draft():
+    """判断不回复：草稿丢弃并计入浪费，历史不变"""
+    print("=" * 60)
+    print("测试1: 判断不通过")
+    print("=" * 60)
+
+    agent, calls = make_agent("否", ["不该发出的草稿"])
+    irc, budget = FakeIRC(), SpeculativeBudget(30)
+    respond_speculatively(agent, irc, "mingxuan", budget, "#ai", "lemon", MESSAGE)
+    assert irc.sent == []
+    assert len(budget._wasted) == 1
+    assert history_roles(agent) == ["system"], "丢弃的草稿不应写入历史"
+    print("\n✅ 测试通过\n")
+
+
+def test_judge_yes_commits_draft():
+    """判断回复：发送草稿，并把用户消息和回复一起写入历史"""
+    print("=" * 60)
+    print("测试2: 判断通过")
+    print("=" * 60)
+
+    agent, calls = make_agent("是", ["我觉得可行。"])
+    irc, budget = FakeIRC(), SpeculativeBudget(30)
+    respond_speculatively(agent, irc, "mingxuan", budget, "#ai", "lemon", MESSAGE)
+    assert irc.sent == ["我觉得可行。"] and calls.count("generate") == 1
+    assert history_roles(agent) == ["system", "user", "assistant"]
+    assert MESSAGE in agent.conversation_history.messages()[1]["content"]
+    assert not budget._wasted
+    print("\n✅ 测试通过\n")
+
+
+def test_failed_draft_falls_back():
+    """草稿生成失败：按普通流程重新生成，不把错误提示发出去"""
+    print("=" * 60)
+    print("测试3: 草稿失败")
+    print("=" * 60)
+
+    agent, calls = make_agent("是", [RuntimeError("timeout"), "重新生成的回复。"])
+    irc, budget = FakeIRC(), SpeculativeBudget(30)
+    respond_speculatively(agent, irc, "mingxuan", budget, "#ai", "lemon", MESSAGE)
+    print(f"  发送: {irc.sent}")
+    assert irc.sent == ["重新生成的回复。"] and calls.count("generate") == 2
+    assert history_roles(agent) == ["system", "user", "assistant"]
+    print("\n✅ 测试通过\n")
+
+
+def test_exhausted_budget_uses_serial_path():
+    """浪费预算用完后先判断再生成"""
+    print("=" * 60)
+    print("测试4: 预算用完")
+    print("=" * 60)
+
+    agent, calls = make_agent("是", ["串行的回复。"], waste_per_hour=0)
+    irc = FakeIRC()
+    create_message_handler(agent, irc, "mingxuan")("#ai", "lemon", MESSAGE)
+    assert calls == ["judge", "generate"], "预算用完时应先判断、后生成"
+    assert irc.sent == ["串行的回复。"]
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_judge_no_discards_draft()
+        test_judge_yes_commits_draft()
+        test_failed_draft_falls_back()
+        test_exhausted_budget_uses_serial_path()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
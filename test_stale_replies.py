@@ -0,0 +1,174 @@
+"""测试过时回复的检测与中断"""
+import asyncio
+import threading
+import time
+import types
+from config import AgentConfig, OpenAIConfig
+from stale_replies import ChannelActivity
+
+BOTS = ["mingxuan", "yueran", "zhiyuan"]
+
+
+def test_newer_messages_make_reply_stale():
+    """同一频道来了足够多的新消息后回复过时；自己的消息和其他频道不计数"""
+    print("=" * 60)
+    print("测试1: 新消息计数")
+    print("=" * 60)
+
+    activity = ChannelActivity("mingxuan", BOTS, stale_after=2)
+    inflight = activity.observe("#ai", "lemon", "量子计算怎么样？")
+    activity.observe("#ai", "mingxuan", "我自己的回复")
+    activity.observe("#other", "bob", "别的频道")
+    activity.observe("#ai", "alice", "第一条")
+    assert not inflight.is_stale()
+    activity.observe("#ai", "yueran", "第二条")
+    assert inflight.is_stale()
+    print("\n✅ 测试通过\n")
+
+
+def test_human_addressing_other_bot():
+    """人类点名其他 bot 时放弃；同时点名自己或 bot 之间互相点名不算"""
+    print("=" * 60)
+    print("测试2: 点名其他 bot")
+    print("=" * 60)
+
+    activity = ChannelActivity("mingxuan", BOTS, stale_after=0)
+    inflight = activity.observe("#ai", "lemon", "大家怎么看？")
+    activity.observe("#ai", "zhiyuan", "yueran 你说呢")
+    activity.observe("#ai", "lemon", "mingxuan 和 yueran 都说说")
+    assert not inflight.is_stale()
+    activity.observe("#ai", "lemon", "YueRan，你来回答")
+    assert inflight.is_stale()
+    print("\n✅ 测试通过\n")
+
+
+class FakeStream:
+    """逐句返回的假流式响应"""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.closed = False
+
+    def __iter__(self):
+        for delta in self.deltas:
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=delta))])
+
+    def close(self):
+        self.closed = True
+
+
+def test_stream_is_interrupted():
+    """流式生成过时后中断请求，只把已发出的句子写入历史"""
+    print("=" * 60)
+    print("测试3: 中断流式生成")
+    print("=" * 60)
+
+    from ai_agent import AIAgent
+    stream = FakeStream(["第一句。", "第二句。", "第三句。"])
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(
+        completions=types.SimpleNamespace(create=lambda **kwargs: stream)))
+    agent = AIAgent(OpenAIConfig(api_key="test"),
+                    AgentConfig(trigger_keywords=[], location=None, summarize_history=False),
+                    client=client)
+
+    sent = []
+    for sentence in agent.generate_response_stream("#ai", "lemon", "说三句", cancelled=lambda: len(sent) >= 1):
+        sent.append(sentence)
+    print(f"  已发送: {sent}")
+    assert sent == ["第一句。"]
+    assert stream.closed
+    assert agent.conversation_history.messages()[-1] == {"role": "assistant", "content": "第一句。"}
+    print("\n✅ 测试通过\n")
+
+
+def run_through_irc_client(coalesce_window: float) -> tuple[list[str], int]:
+    """经过真实的 AsyncIRCClient 分发（以及合并器）处理 4 条几乎同时到达的消息"""
+    from agent_runtime import create_message_handler
+    from ai_agent import AIAgent
+    from irc_client import AsyncIRCClient
+
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs["messages"][-1]["content"])
+        time.sleep(0.3)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(
+            message=types.SimpleNamespace(content="好的。"))])
+
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    agent = AIAgent(OpenAIConfig(api_key="test", stream=False),
+                    AgentConfig(trigger_keywords=[], location=None, summarize_history=False,
+                                speculative_generation=False, coalesce_window=coalesce_window,
+                                stale_reply_after=2),
+                    client=client)
+    agent.should_respond = lambda message, sender, nickname: True
+
+    lines = "".join(f":user{i}!u@h PRIVMSG #ai :问题{i}\r\n" for i in range(4))
+    sent = []
+    finished = threading.Event()
+
+    async def serve(reader, writer):
+        writer.write(b":srv 001 mingxuan :hi\r\n" + lines.encode())
+        await writer.drain()
+        await reader.read()
+
+    async def run():
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        irc_client = AsyncIRCClient("127.0.0.1", server.sockets[0].getsockname()[1], "mingxuan", ["#ai"])
+        irc_client.send_message = lambda channel, message: (sent.append(message), len(sent) == 2 and finished.set())
+        irc_client.on_message(create_message_handler(agent, irc_client, "mingxuan"))
+        task = asyncio.create_task(irc_client.run())
+        await asyncio.to_thread(finished.wait, 5)
+        await asyncio.sleep(0.4)
+        task.cancel()
+        server.close()
+
+    asyncio.run(run())
+    return sent, len(calls)
+
+
+def test_queued_messages_count_while_generating():
+    """排在分发队列（或合并器）里的消息收到时就计数，前一条的回复因此过时"""
+    print("=" * 60)
+    print("测试4: 经过分发队列和合并器")
+    print("=" * 60)
+
+    for window in (0, 0.05):
+        sent, calls = run_through_irc_client(window)
+        print(f"  合并窗口 {window}: 发送 {len(sent)} 条，调用 LLM {calls} 次")
+        # 第 1、2 条处理时（或生成期间）已有 2 条以上更新的消息 → 放弃；只有第 3、4 条回复
+        assert len(sent) == 2 and calls <= 3, "排队中的消息应在收到时计数"
+    print("\n✅ 测试通过\n")
+
+
+def test_claim_merged_and_dropped_lines():
+    """合并消息取最后一行的标记；被丢弃的行不会留在登记里；没有登记过时现在计数"""
+    print("=" * 60)
+    print("测试5: 取回收到时的标记")
+    print("=" * 60)
+
+    activity = ChannelActivity("mingxuan", BOTS, stale_after=2)
+    for sender, message in (("alice", "a"), ("alice", "b"), ("bob", "被丢弃"), ("carol", "c")):
+        activity.received("#ai", sender, message)
+    merged = activity.claim("#ai", "alice", "a\nb")
+    assert merged.seq == 2
+    assert activity.claim("#ai", "carol", "c").seq == 4
+    assert not activity._received["#ai"]
+    assert activity.claim("#ai", "dave", "未登记").seq == 5
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_newer_messages_make_reply_stale()
+        test_human_addressing_other_bot()
+        test_stream_is_interrupted()
+        test_queued_messages_count_while_generating()
+        test_claim_merged_and_dropped_lines()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
@@ -0,0 +1,166 @@
+"""测试后台状态发布器（快照 + 增量事件日志）"""
+import os
+import tempfile
+import threading
+from status_publisher import APPEND, EVICT, RESET, StatusPublisher, load_status
+
+
+class FakeAgent:
+    """模拟 AIAgent：持锁修改历史并登记事件"""
+
+    def __init__(self, path: str, compact_every: int = 200):
+        self.lock = threading.RLock()
+        self.history = [{"role": "system", "content": "人格"}]
+        self.max_bot_turns = 2
+        self.builds = 0
+        self.publisher = StatusPublisher(path, self.build, debounce=0.02, compact_every=compact_every)
+
+    def build(self, include_history: bool) -> dict:
+        with self.lock:
+            self.builds += 1
+            status = {"nickname": "test", "last_update": self.builds, "max_bot_turns": self.max_bot_turns}
+            if include_history:
+                status["conversation_history"] = list(self.history)
+                status["history_length"] = len(self.history)
+                status["seq"] = self.publisher.current_seq()
+            return status
+
+    def append(self, content: str, evict: int = 0):
+        with self.lock:
+            message = {"role": "user", "content": content}
+            self.history.append(message)
+            self.publisher.emit(APPEND, message=message)
+            if evict:
+                del self.history[1:1 + evict]
+                self.publisher.emit(EVICT, count=evict)
+
+    def reset(self):
+        with self.lock:
+            del self.history[1:]
+            self.publisher.emit(RESET)
+
+
+def test_snapshot_plus_events():
+    """首次写快照，之后只追加事件；读取方重建出与内存一致的状态"""
+    print("=" * 60)
+    print("测试1: 快照 + 事件日志")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "irc_agent_test.json")
+        agent = FakeAgent(path)
+        agent.publisher.publish()
+        assert agent.publisher.flush(2)
+        assert agent.publisher.compactions == 1
+
+        for i in range(10):
+            agent.append(f"消息{i}")
+        assert agent.publisher.flush(2)
+        agent.append("消息10", evict=4)
+        agent.max_bot_turns = 3
+        assert agent.publisher.flush(2)
+
+        status = load_status(path)
+        print(f"  历史: {[m['content'] for m in status['conversation_history']]}")
+        assert status["conversation_history"] == agent.history
+        assert status["history_length"] == 8 and status["max_bot_turns"] == 3
+        assert agent.publisher.compactions == 1, "事件数未到阈值不应重写快照"
+
+        agent.reset()
+        assert agent.publisher.flush(2)
+        assert load_status(path)["conversation_history"] == agent.history
+
+        writes = agent.publisher.writes
+        agent.publisher.publish()
+        assert agent.publisher.flush(2)
+        assert agent.publisher.writes == writes, "只有 last_update 变化时不应写入"
+    print("\n✅ 测试通过\n")
+
+
+def test_compaction():
+    """事件累计到阈值后重写快照并清空日志"""
+    print("=" * 60)
+    print("测试2: 压缩")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "irc_agent_test.json")
+        agent = FakeAgent(path, compact_every=5)
+        for i in range(12):
+            agent.append(f"消息{i}")
+            assert agent.publisher.flush(2)
+
+        print(f"  压缩 {agent.publisher.compactions} 次")
+        assert agent.publisher.compactions >= 3
+        assert load_status(path)["conversation_history"] == agent.history
+        assert sorted(os.listdir(tmp)) == ["irc_agent_test.events.jsonl", "irc_agent_test.json"], "不应留下临时文件"
+    print("\n✅ 测试通过\n")
+
+
+def test_build_failure_is_logged():
+    """生成状态出错时只记录日志，之后的更新照常写入"""
+    print("=" * 60)
+    print("测试3: 生成状态失败")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "irc_agent_test.json")
+        failures = [RuntimeError("boom")]
+
+        def build(include_history):
+            if failures:
+                raise failures.pop()
+            return {"seq": 0, "conversation_history": [], "history_length": 0}
+
+        publisher = StatusPublisher(path, build, debounce=0.01)
+        publisher.publish()
+        assert publisher.flush(2)
+        assert load_status(path) is None
+        publisher.publish()
+        assert publisher.flush(2)
+        assert load_status(path)["history_length"] == 0
+    print("\n✅ 测试通过\n")
+
+
+def test_restart_discards_old_events():
+    """重启后序号从头开始，上一次运行的事件日志不会接到新快照上"""
+    print("=" * 60)
+    print("测试4: 重启")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "irc_agent_test.json")
+        old = FakeAgent(path)
+        old.publisher.publish()
+        assert old.publisher.flush(2)
+        for i in range(5):
+            old.append(f"旧消息{i}")
+        assert old.publisher.flush(2)
+        assert len(load_status(path)["conversation_history"]) == 6
+
+        # 新快照写入之前旧日志就已清空：此时读到的是旧快照本身，而不是旧快照配上序号对不上的事件
+        restarted = FakeAgent(path)
+        assert os.path.getsize(restarted.publisher.events_path) == 0
+        assert len(load_status(path)["conversation_history"]) == 1
+        restarted.publisher.publish()
+        restarted.append("新消息")
+        assert restarted.publisher.flush(2)
+        status = load_status(path)
+        print(f"  历史: {[m['content'] for m in status['conversation_history']]}")
+        assert status["conversation_history"] == restarted.history
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_snapshot_plus_events()
+        test_compaction()
+        test_build_failure_is_logged()
+        test_restart_discards_old_events()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
@@ -0,0 +1,69 @@
+"""测试流式回复的增量括号清理"""
+from ai_agent import StreamingParenStripper, remove_parenthetical_content
+
+
+def feed_all(deltas: list[str]) -> list[str]:
+    """模拟逐个 token 喂入，返回产出的所有句子"""
+    stripper = StreamingParenStripper()
+    sentences = []
+    for delta in deltas:
+        sentences.extend(stripper.feed(delta))
+    tail = stripper.flush()
+    if tail:
+        sentences.append(tail)
+    return sentences
+
+
+def test_sentences_flush_as_they_finish():
+    """句子完成就立即产出，连续标点归入同一句"""
+    print("=" * 60)
+    print("测试1: 按句产出")
+    print("=" * 60)
+
+    stripper = StreamingParenStripper()
+    assert stripper.feed("这就像货币") == []
+    assert stripper.feed("，本身没价值！！") == [], "句末标点后还可能有连续标点，先不产出"
+    assert stripper.feed("关键") == ["这就像货币，本身没价值！！"]
+    assert stripper.flush() == "关键"
+    print("\n✅ 测试通过：句子按完成顺序产出\n")
+
+
+def test_hold_back_inside_brackets():
+    """括号未闭合时暂存，闭合后按原规则整体移除"""
+    print("=" * 60)
+    print("测试2: 括号内暂存")
+    print("=" * 60)
+
+    deltas = ["说白了就是节奏把控。", "（注：当前", "为第2轮对话。）", "该出手时才出手。"]
+    sentences = feed_all(deltas)
+    print(f"  产出: {sentences}")
+    assert sentences == ["说白了就是节奏把控。", "该出手时才出手。"]
+    print("\n✅ 测试通过：括号内容被完整移除\n")
+
+
+def test_matches_batch_cleaning():
+    """拼接后的流式结果与整段清理一致"""
+    print("=" * 60)
+    print("测试3: 与整段清理一致")
+    print("=" * 60)
+
+    text = "正文内容 (English parentheses) 继续。暴雨冲刷后的土壤更肥沃？（注：延续植物隐喻）(未闭合"
+    streamed = "".join(feed_all(list(text)))
+    print(f"  流式: {streamed}")
+    print(f"  整段: {remove_parenthetical_content(text)}")
+    assert streamed == remove_parenthetical_content(text)
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_sentences_flush_as_they_finish()
+        test_hold_back_inside_brackets()
+        test_matches_batch_cleaning()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
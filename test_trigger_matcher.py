@@ -0,0 +1,54 @@
+"""测试预编译的触发词匹配器"""
+from trigger_matcher import GREETING, KEYWORD, MENTION, TriggerMatcher
+
+
+def test_trigger_classes():
+    """点名、问候、关键词分别识别，同时出现时点名优先"""
+    print("=" * 60)
+    print("测试1: 触发类型")
+    print("=" * 60)
+
+    matcher = TriggerMatcher("mingxuan", ["help", "帮助"])
+    cases = [
+        ("MingXuan 你怎么看", MENTION),
+        ("大家好，mingxuan 在吗", MENTION),
+        ("晚上好", GREETING),
+        ("Good Morning everyone", GREETING),
+        ("谁能帮助我一下", KEYWORD),
+        ("今天股市跌了", None),
+    ]
+    for message, expected in cases:
+        result = matcher.match(message)
+        print(f"  {message!r} -> {result}")
+        assert result == expected, f"{message!r} 应为 {expected}，实际 {result}"
+
+    assert matcher.scan("各位 help") == {GREETING, KEYWORD}
+    print("\n✅ 测试通过\n")
+
+
+def test_ascii_word_boundaries():
+    """英文问候语按单词匹配，"hi" 不会匹配到 zhiyuan、this"""
+    print("=" * 60)
+    print("测试2: 英文单词边界")
+    print("=" * 60)
+
+    matcher = TriggerMatcher("mingxuan", [])
+    assert matcher.match("zhiyuan 说得对") is None
+    assert matcher.match("this is fine") is None
+    assert matcher.match("hi~") == GREETING
+    assert matcher.match("嗨hi大家") == GREETING, "中文紧挨着英文也算边界"
+    assert matcher.match("@mingxuan: 你好") == MENTION
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_trigger_classes()
+        test_ascii_word_boundaries()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
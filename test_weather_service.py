@@ -0,0 +1,175 @@
+"""测试天气服务的熔断器、对冲请求与后台刷新缓存"""
+import time
+from shared_cache import SharedCache
+from weather_service import CircuitBreaker, WeatherService
+
+
+def make_service(providers: dict, fetch_mode: str = "sequential", cooldown: float = 300) -> WeatherService:
+    """创建只有假数据源的天气服务（内存缓存，不访问网络）"""
+    service = WeatherService(fetch_mode=fetch_mode, hedge_delay=0.05, shared_cache=SharedCache(":memory:"))
+    service.providers = list(providers.items())
+    service.breakers = {name: CircuitBreaker(name, cooldown=cooldown) for name in providers}
+    return service
+
+
+def test_circuit_breaker():
+    """连续失败后熔断；冷却结束只放行一次试探，成功后恢复"""
+    print("=" * 60)
+    print("测试1: 熔断器")
+    print("=" * 60)
+
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.allow() and not breaker.is_open()
+    breaker.record_failure()
+    assert breaker.is_open() and not breaker.allow()
+
+    time.sleep(0.06)
+    assert not breaker.is_open(), "冷却结束后 is_open 不应占用试探名额"
+    assert breaker.allow(), "冷却结束后放行一次试探"
+    assert not breaker.allow(), "试探进行中不再放行"
+    breaker.record_success()
+    assert breaker.allow() and breaker.failures == 0
+    print("\n✅ 测试通过\n")
+
+
+def test_probe_not_wasted_when_earlier_provider_answers():
+    """前面的数据源已经返回时，刚冷却结束的后备数据源保留试探名额"""
+    print("=" * 60)
+    print("测试2: 只在真正请求前检查熔断器")
+    print("=" * 60)
+
+    calls = []
+    answers = {"a": "☀️晴"}
+    service = make_service({
+        "a": lambda city: calls.append("a") or answers["a"],
+        "b": lambda city: calls.append("b") or "⛅多云",
+    }, cooldown=0.05)
+    for _ in range(3):
+        service.breakers["b"].record_failure()
+    time.sleep(0.06)
+
+    assert service.fetch_weather("北京") == "☀️晴" and calls == ["a"]
+    answers["a"] = None
+    assert service.fetch_weather("北京") == "⛅多云", "a 失败后应立即试探已冷却的 b"
+    assert calls == ["a", "a", "b"] and service.breakers["b"].opened_at is None
+
+    for name in ("a", "b"):
+        service.breakers[name].opened_at = time.monotonic()
+    assert service.fetch_weather("北京") is None and calls == ["a", "a", "b"]
+    print("\n✅ 测试通过\n")
+
+
+def test_fetch_hedged():
+    """首选数据源慢或失败时追加下一个，取最先返回的有效结果；熔断中的数据源跳过"""
+    print("=" * 60)
+    print("测试3: 对冲请求")
+    print("=" * 60)
+
+    def slow(city):
+        time.sleep(0.3)
+        return "慢"
+
+    calls = []
+    service = make_service({"slow": slow, "fast": lambda city: calls.append("fast") or "快"}, "hedged")
+    start = time.monotonic()
+    assert service.fetch_weather("北京") == "快"
+    elapsed = time.monotonic() - start
+    print(f"  对冲耗时: {elapsed:.2f}s")
+    assert elapsed < 0.2, "首选数据源慢时不应等它超时"
+
+    service = make_service({"fail": lambda city: None, "ok": lambda city: "好"}, "hedged")
+    start = time.monotonic()
+    assert service.fetch_weather("北京") == "好"
+    assert time.monotonic() - start < 0.05, "首选失败时立即追加下一个，不必等 hedge_delay"
+
+    service = make_service({"a": lambda city: None, "b": lambda city: None}, "hedged")
+    assert service.fetch_weather("北京") is None
+
+    called = []
+    service = make_service({"tripped": lambda city: called.append("tripped") or "旧",
+                            "ok": lambda city: "好"}, "hedged")
+    service.breakers["tripped"].opened_at = time.monotonic()
+    assert service.fetch_weather("北京") == "好" and called == []
+    print("\n✅ 测试通过\n")
+
+
+def wait_until(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def make_cached_service(age: float) -> tuple[WeatherService, list]:
+    """缓存里有一条 age 秒前的北京天气；数据源返回新数据并记录调用"""
+    calls = []
+    service = make_service({"fake": lambda city: calls.append(city) or "新数据"})
+    service.cache["北京"] = (time.time() - age, "旧数据")
+    return service, calls
+
+
+def test_stale_while_revalidate():
+    """新鲜缓存直接用；过期但可用时先返回旧数据并后台刷新；过期太久的不再使用"""
+    print("=" * 60)
+    print("测试4: 后台刷新缓存")
+    print("=" * 60)
+
+    service, calls = make_cached_service(age=60)
+    assert service.peek_weather("北京") == ("旧数据", True)
+    assert service.get_weather("北京") == "旧数据" and calls == []
+
+    service, calls = make_cached_service(age=service.cache_duration + 60)
+    assert service.peek_weather("北京") == ("旧数据", False)
+    assert service.get_weather("北京") == "旧数据", "过期但仍可用时不等网络"
+    assert wait_until(lambda: service.cache["北京"][1] == "新数据"), "应在后台刷新"
+    assert calls == ["北京"] and service.peek_weather("北京") == ("新数据", True)
+
+    service, calls = make_cached_service(age=service.cache_duration + service.max_stale + 1)
+    assert service.peek_weather("北京") == (None, False)
+    assert service.get_weather("北京") == "新数据" and calls == ["北京"], "没有可用缓存时同步请求"
+
+    # 一天零十秒前的数据：按总秒数计算已远超有效期（timedelta.seconds 会回绕成 10 秒）
+    service, calls = make_cached_service(age=86400 + 10)
+    assert service.peek_weather("北京") == (None, False)
+    print("\n✅ 测试通过\n")
+
+
+def test_refresh_loop_refreshes_ahead():
+    """后台刷新线程只刷新用掉了 refresh_ahead 有效期的城市"""
+    print("=" * 60)
+    print("测试5: 提前刷新")
+    print("=" * 60)
+
+    service, calls = make_cached_service(age=0)
+    service.refresh_interval = 0.02
+    service.cache["北京"] = (time.time() - service.cache_duration * 0.5, "旧数据")
+    service.track_city("北京")
+    time.sleep(0.1)
+    assert calls == [], "有效期还剩一半时不应刷新"
+
+    service.cache["北京"] = (time.time() - service.cache_duration * 0.9, "旧数据")
+    assert wait_until(lambda: calls == ["北京"]), "快过期时应提前刷新"
+    assert wait_until(lambda: service.peek_weather("北京") == ("新数据", True))
+    time.sleep(0.1)
+    assert calls == ["北京"], "刷新后不应重复请求"
+    service.refresh_interval = 3600  # 让后台线程在测试结束后休眠
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_circuit_breaker()
+        test_probe_not_wasted_when_earlier_provider_answers()
+        test_fetch_hedged()
+        test_stale_while_revalidate()
+        test_refresh_loop_refreshes_ahead()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
@@ -0,0 +1,180 @@
+"""测试 Web 监控的状态推送"""
+import contextlib
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "web"))
+import app as web_app
+from status_publisher import write_json_atomic
+
+
+@contextlib.contextmanager
+def status_dir():
+    """把 Web 监控指向一个临时状态目录"""
+    original = (web_app.STATUS_DIR, web_app.watcher)
+    with tempfile.TemporaryDirectory() as tmp:
+        web_app.STATUS_DIR = tmp
+        web_app.watcher = web_app.StatusWatcher(interval=0.05)
+        web_app._status_cache.clear()
+        try:
+            yield tmp
+        finally:
+            web_app.STATUS_DIR, web_app.watcher = original
+            web_app._status_cache.clear()
+
+
+def make_status(contents, **fields):
+    history = [{"role": "system", "content": "人格"}] + [{"role": "user", "content": c} for c in contents]
+    return {"nickname": "test", "conversation_history": history, "history_length": len(history), **fields}
+
+
+def test_diff_status():
+    """增量只包含变化的字段、淘汰条数和新增消息"""
+    print("=" * 60)
+    print("测试1: 状态增量")
+    print("=" * 60)
+
+    old = make_status(["a", "b", "c"], max_bot_turns=1)
+    new = make_status(["c", "d"], max_bot_turns=1)
+    delta = web_app.diff_status(old, new)
+    print(f"  增量: {delta}")
+    assert delta == {"fields": {"history_length": 3},
+                     "history": {"drop": 2, "append": [{"role": "user", "content": "d"}]}}
+
+    assert web_app.diff_status(old, make_status(["a", "b", "c"], max_bot_turns=2)) == {"fields": {"max_bot_turns": 2}}
+    assert web_app.diff_status(old, make_status([])) == {"fields": {"history_length": 1},
+                                                          "history": {"drop": 3, "append": []}}
+    changed_prompt = make_status(["a"])
+    changed_prompt["conversation_history"][0] = {"role": "system", "content": "新人格"}
+    assert web_app.diff_status(old, changed_prompt) == {"status": changed_prompt}
+    print("\n✅ 测试通过\n")
+
+
+def read_event(chunks):
+    """从 SSE 响应中读取下一条事件（跳过保活注释）"""
+    while True:
+        chunk = next(chunks)
+        chunk = chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        if chunk.startswith(":"):
+            continue
+        event, data = chunk.strip().split("\n")
+        return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+def test_stream_pushes_deltas():
+    """连接时收到全部状态，文件变化后只收到增量"""
+    print("=" * 60)
+    print("测试2: SSE 推送")
+    print("=" * 60)
+
+    nickname = "mingxuan"
+    with status_dir() as tmp:
+        path = os.path.join(tmp, f"irc_agent_{nickname}.json")
+        write_json_atomic(path, make_status(["a"]))
+        response = web_app.app.test_client().get("/api/stream")
+        chunks = iter(response.response)
+
+        event, data = read_event(chunks)
+        assert event == "snapshot" and data[nickname]["history_length"] == 2
+
+        write_json_atomic(path, make_status(["a", "b"]))
+        event, data = read_event(chunks)
+        print(f"  {event}: {data}")
+        assert event == "delta" and data["nickname"] == nickname
+        assert data["history"] == {"drop": 0, "append": [{"role": "user", "content": "b"}]}
+        assert data["fields"]["last_message"] == "b"
+        response.close()
+
+        # 只订阅元数据：不推送历史，只有历史变化时也会推送 last_message
+        response = web_app.app.test_client().get("/api/stream?history=0")
+        chunks = iter(response.response)
+        event, data = read_event(chunks)
+        assert "conversation_history" not in data[nickname] and data[nickname]["last_message"] == "b"
+        write_json_atomic(path, make_status(["a", "b", "c"]))
+        event, data = read_event(chunks)
+        assert "history" not in data and data["fields"]["last_message"] == "c"
+        response.close()
+    print("\n✅ 测试通过\n")
+
+
+def test_etag_and_parse_cache():
+    """文件没变时不重新解析；带 If-None-Match 的请求返回 304"""
+    print("=" * 60)
+    print("测试3: 解析缓存与 ETag")
+    print("=" * 60)
+
+    nickname = "yueran"
+    original_read = web_app.read_agent_status
+    reads = []
+    web_app.read_agent_status = lambda name: reads.append(name) or original_read(name)
+    with status_dir() as tmp, contextlib.ExitStack() as stack:
+        stack.callback(setattr, web_app, "read_agent_status", original_read)
+        path = os.path.join(tmp, f"irc_agent_{nickname}.json")
+        write_json_atomic(path, make_status(["a"]))
+        client = web_app.app.test_client()
+        first = client.get(f"/api/agents/{nickname}")
+        etag = first.headers["ETag"]
+        assert first.status_code == 200 and first.get_json()["history_length"] == 2
+
+        again = client.get(f"/api/agents/{nickname}", headers={"If-None-Match": etag})
+        assert again.status_code == 304 and again.data == b""
+        listing = client.get("/api/agents")
+        assert client.get("/api/agents", headers={"If-None-Match": listing.headers["ETag"]}).status_code == 304
+        print(f"  解析次数: {len(reads)}")
+        assert len(reads) == 1, "文件没变时不应重新解析"
+
+        write_json_atomic(path, make_status(["a", "b"]))
+        changed = client.get(f"/api/agents/{nickname}", headers={"If-None-Match": etag})
+        assert changed.status_code == 200 and changed.get_json()["history_length"] == 3
+        assert client.get("/api/agents/nobody_here").status_code == 404
+    print("\n✅ 测试通过\n")
+
+
+def test_discovery_and_pagination():
+    """从状态目录发现 agent；按字段裁剪；历史分页"""
+    print("=" * 60)
+    print("测试4: 自动发现与分页")
+    print("=" * 60)
+
+    with status_dir() as tmp:
+        for nickname, count in (("mingxuan", 5), ("新人格", 1)):
+            write_json_atomic(os.path.join(tmp, f"irc_agent_{nickname}.json"),
+                              make_status([f"m{i}" for i in range(count)], max_bot_turns=2))
+        with open(os.path.join(tmp, "irc_agent_mingxuan.events.jsonl"), "w", encoding="utf-8"):
+            pass
+        client = web_app.app.test_client()
+
+        agents = client.get("/api/agents?history=0").get_json()
+        print(f"  发现: {sorted(agents)}")
+        assert sorted(agents) == ["mingxuan", "新人格"]
+        assert "conversation_history" not in agents["mingxuan"] and agents["mingxuan"]["last_message"] == "m4"
+
+        selected = client.get("/api/agents/mingxuan?fields=max_bot_turns&history=2").get_json()
+        assert selected == {"nickname": "test", "max_bot_turns": 2}
+        trimmed = client.get("/api/agents/mingxuan?history=2").get_json()
+        assert [m["content"] for m in trimmed["conversation_history"]] == ["m3", "m4"]
+        assert client.get("/api/agents?history=-1").status_code == 400
+
+        page = client.get("/api/agents/mingxuan/history?limit=4").get_json()
+        assert page["total"] == 6 and [m["index"] for m in page["messages"]] == [2, 3, 4, 5]
+        older = client.get(f"/api/agents/mingxuan/history?limit=4&before={page['next_before']}").get_json()
+        assert [m["content"] for m in older["messages"]] == ["人格", "m0"] and older["next_before"] is None
+        assert client.get("/api/agents/nobody/history").status_code == 404
+    print("\n✅ 测试通过\n")
+
+
+if __name__ == "__main__":
+    try:
+        test_diff_status()
+        test_stream_pushes_deltas()
+        test_etag_and_parse_cache()
+        test_discovery_and_pagination()
+
+        print("=" * 60)
+        print("🎉 所有测试通过！")
+        print("=" * 60)
+
+    except AssertionError as e:
+        print(f"\n❌ 测试失败: {e}")
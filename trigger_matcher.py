@@ -0,0 +1,72 @@
+"""触发词匹配 - 问候语、点名、关键词合并成一个预编译正则，一次扫描得出触发类型"""
+import re
+from typing import Optional
+
+# 触发类型（按优先级从高到低）
+MENTION = "mention"
+GREETING = "greeting"
+KEYWORD = "keyword"
+
+# 常见问候语（匹配到就快速回复）
+GREETINGS = [
+    # 通用问候
+    "大家好", "有人么", "有人吗", "在吗", "在不在",
+    "hello", "hi", "hey", "anyone", "anyone here",
+    "有没有人", "人呢", "都在吗",
+    # 时间问候
+    "早上好", "上午好", "中午好", "下午好", "晚上好", "晚安",
+    "good morning", "good afternoon", "good evening", "good night",
+    # 称呼问候
+    "两位", "各位", "大伙", "诸位"
+]
+
+
+def _pattern(word: str) -> str:
+    """
+    单个词的正则
+
+    以英文字母或数字开头/结尾的词加上单词边界，避免 "hi" 匹配到 "zhiyuan"、"this"；
+    中文词没有边界，按子串匹配。
+    """
+    pattern = re.escape(word.lower())
+    if word[:1].isascii() and word[:1].isalnum():
+        pattern = r"(?<![a-z0-9])" + pattern
+    if word[-1:].isascii() and word[-1:].isalnum():
+        pattern += r"(?![a-z0-9])"
+    return pattern
+
+
+class TriggerMatcher:
+    """
+    预编译的多模式匹配器
+
+    所有模式合并成一个带命名分组的正则，对消息只扫描一遍；
+    同一位置上点名优先于问候，问候优先于关键词。
+    """
+
+    def __init__(self, nickname: Optional[str], keywords: list[str], greetings: list[str] = GREETINGS):
+        self.nickname = nickname
+        groups = []
+        for name, words in ((MENTION, [nickname] if nickname else []),
+                            (GREETING, greetings),
+                            (KEYWORD, keywords or [])):
+            words = [w for w in words if w]
+            if words:
+                # 长词优先，避免 "anyone" 抢先匹配 "anyone here" 的前缀
+                alternatives = "|".join(_pattern(w) for w in sorted(words, key=len, reverse=True))
+                groups.append(f"(?P<{name}>{alternatives})")
+        self._regex = re.compile("|".join(groups)) if groups else None
+
+    def scan(self, message: str) -> set[str]:
+        """返回消息中出现的所有触发类型"""
+        if self._regex is None:
+            return set()
+        return {match.lastgroup for match in self._regex.finditer(message.lower())}
+
+    def match(self, message: str) -> Optional[str]:
+        """返回优先级最高的触发类型，没有匹配返回 None"""
+        found = self.scan(message)
+        for name in (MENTION, GREETING, KEYWORD):
+            if name in found:
+                return name
+        return None
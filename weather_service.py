@@ -1,8 +1,14 @@
 """天气查询服务模块"""
 import requests
 import logging
-from typing import Optional, Dict
-from datetime import datetime
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Optional, Dict
+from requests.adapters import HTTPAdapter
+from shared_cache import SharedCache, get_shared_cache
 
 logger = logging.getLogger(__name__)
 
@@ -26,59 +32,314 @@ WEATHER_ICONS = {
 }
 
 
+class CircuitBreaker:
+    """
+    单个天气数据源的熔断器
+    
+    连续失败 failure_threshold 次后熔断 cooldown 秒，期间直接跳过该数据源，
+    不再白白等待它的超时；冷却结束后放行一次试探请求，成功即恢复。
+    """
+    
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 300):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        """是否允许请求（熔断中返回 False；冷却结束后放行一次试探）"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # 半开状态：放行这一次，失败会重新计时
+                self.opened_at = time.monotonic()
+                return True
+            return False
+    
+    def is_open(self) -> bool:
+        """是否熔断中且冷却未结束（只查看，不占用半开状态的试探名额）"""
+        with self._lock:
+            return self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown
+    
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"天气数据源 {self.name} 已恢复")
+            self.failures = 0
+            self.opened_at = None
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"天气数据源 {self.name} 连续失败 {self.failures} 次，熔断 {self.cooldown} 秒")
+                self.opened_at = time.monotonic()
+
+
 class WeatherService:
     """天气服务类 - 支持多个免费天气API"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, fetch_mode: Optional[str] = None,
+                 hedge_delay: Optional[float] = None, shared_cache: Optional[SharedCache] = None):
         """
         初始化天气服务
         
         Args:
             api_key: 和风天气API密钥（可选，不提供则使用免费接口）
+            fetch_mode: "sequential" 依次尝试各数据源；"hedged" 先请求首选数据源，
+                        hedge_delay 秒内没有结果就并行请求下一个，取最先返回的有效结果
+            hedge_delay: 对冲请求的间隔（秒，默认读取 WEATHER_HEDGE_DELAY，未设置为 1.0），0 表示所有数据源同时竞速
+            shared_cache: 跨进程共享缓存（默认使用全局的 SQLite 缓存，不可用时只用进程内缓存）
         """
         self.api_key = api_key
-        self.cache = {}  # 简单缓存，避免频繁请求
+        self.fetch_mode = fetch_mode or os.getenv("WEATHER_FETCH_MODE", "sequential")
+        self.hedge_delay = hedge_delay if hedge_delay is not None else float(os.getenv("WEATHER_HEDGE_DELAY", "1.0"))
+        
+        # 复用连接池，避免每次请求重新建立 TCP/TLS 连接
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=6, thread_name_prefix="weather-fetch")
+        
+        # 数据源按优先级排列，每个数据源一个熔断器
+        self.providers: list[tuple[str, Callable[[str], Optional[str]]]] = []
+        if api_key:
+            self.providers.append(("qweather", self._get_weather_qweather))
+        self.providers.append(("wttr_json", self._get_weather_free_api))
+        self.providers.append(("wttr_text", self._get_weather_wttr))
+        self.breakers = {name: CircuitBreaker(name) for name, _ in self.providers}
+        
+        self.cache: Dict[str, tuple[float, str]] = {}  # 城市 -> (获取时间戳, 天气信息)
         self.cache_duration = 1800  # 缓存30分钟
+        self.max_stale = 3 * 3600  # 过期后最多继续使用3小时（后台刷新失败时兜底）
+        self.refresh_ahead = 0.8  # 缓存用掉 80% 有效期时提前刷新
+        self.refresh_interval = 60  # 后台刷新线程的检查间隔（秒）
+        self._tracked_cities: set[str] = set()  # 需要后台保持新鲜的城市
+        self._refresher: Optional[threading.Thread] = None
+        self._refreshing: set[str] = set()  # 正在刷新的城市
+        self._refresh_lock = threading.Lock()
+        
+        # 多个 bot 进程共享天气结果：一个进程刷新后其他进程（包括重启后的进程）直接复用
+        self.shared = shared_cache or get_shared_cache()
+        self.refresh_lease = 30  # 跨进程刷新租约（秒），同一城市同时只有一个进程请求网络
+    
+    def _cache_age(self, city: str) -> Optional[float]:
+        """缓存年龄（秒），没有缓存返回 None；进程内缓存快过期时先看共享缓存有没有更新的"""
+        entry = self.cache.get(city)
+        if entry is None or time.time() - entry[0] >= self.cache_duration * self.refresh_ahead:
+            self._load_shared(city)
+            entry = self.cache.get(city)
+        if entry is None:
+            return None
+        return time.time() - entry[0]
+    
+    def _load_shared(self, city: str):
+        """共享缓存里的数据比进程内的新时，采用共享缓存"""
+        if self.shared is None:
+            return
+        try:
+            shared_entry = self.shared.get("weather", city)
+        except sqlite3.Error as e:
+            logger.warning(f"读取共享天气缓存失败: {e}")
+            return
+        if shared_entry is None:
+            return
+        weather_info, stored_at = shared_entry
+        entry = self.cache.get(city)
+        if entry is None or stored_at > entry[0]:
+            self.cache[city] = (stored_at, weather_info)
+    
+    def _store(self, city: str, weather_info: str):
+        """写入进程内缓存和共享缓存"""
+        now = time.time()
+        self.cache[city] = (now, weather_info)
+        if self.shared is None:
+            return
+        try:
+            self.shared.set("weather", city, weather_info, stored_at=now)
+        except sqlite3.Error as e:
+            logger.warning(f"写入共享天气缓存失败: {e}")
         
     def get_weather(self, city: str) -> Optional[str]:
         """
         获取指定城市的天气信息
         
+        有新鲜缓存直接返回；缓存过期但仍可用时返回旧数据并在后台刷新（stale-while-revalidate）；
+        只有完全没有可用缓存时才同步请求网络。
+        
         Args:
             city: 城市名称（北京/上海/深圳）
             
         Returns:
             格式化的天气信息字符串，失败返回 None
         """
-        # 检查缓存
-        cache_key = city
-        if cache_key in self.cache:
-            cached_time, cached_data = self.cache[cache_key]
-            if (datetime.now() - cached_time).seconds < self.cache_duration:
+        weather, fresh = self.peek_weather(city)
+        if weather is not None:
+            if fresh:
                 logger.info(f"使用缓存的天气数据: {city}")
-                return cached_data
-        
-        # 尝试多个API
-        weather_info = None
+            else:
+                logger.info(f"天气缓存已过期，先返回旧数据并后台刷新: {city}")
+                self.refresh_in_background(city)
+            return weather
         
-        # 方案1: 使用和风天气API（需要key）
-        if self.api_key:
-            weather_info = self._get_weather_qweather(city)
+        return self.fetch_weather(city)
+    
+    def fetch_weather(self, city: str) -> Optional[str]:
+        """
+        请求天气 API（按 fetch_mode 依次尝试或对冲竞速，跳过熔断中的数据源）并写入缓存
         
-        # 方案2: 使用免费的天气API（无需key）
-        if not weather_info:
-            weather_info = self._get_weather_free_api(city)
+        熔断器在真正请求某个数据源之前才检查：前面的数据源已经返回时，
+        后面刚冷却结束的数据源不会白白用掉试探名额。
+        """
+        if all(self.breakers[name].is_open() for name, _ in self.providers):
+            logger.warning(f"所有天气数据源均在熔断中: {city}")
+            return None
         
-        # 方案3: 使用另一个备用API
-        if not weather_info:
-            weather_info = self._get_weather_wttr(city)
+        if self.fetch_mode == "hedged":
+            weather_info = self._fetch_hedged(city, self.providers)
+        else:
+            weather_info = None
+            for name, fn in self.providers:
+                if not self.breakers[name].allow():
+                    continue
+                weather_info = self._call_provider(name, fn, city)
+                if weather_info:
+                    break
         
         # 缓存结果
         if weather_info:
-            self.cache[cache_key] = (datetime.now(), weather_info)
+            self._store(city, weather_info)
         
         return weather_info
     
+    def _call_provider(self, name: str, fn: Callable[[str], Optional[str]], city: str) -> Optional[str]:
+        """调用一个数据源并更新其熔断器"""
+        result = fn(city)
+        if result:
+            self.breakers[name].record_success()
+        else:
+            self.breakers[name].record_failure()
+        return result
+    
+    def _fetch_hedged(self, city: str, providers: list) -> Optional[str]:
+        """
+        对冲请求：先发首选数据源，hedge_delay 内没有有效结果（超时或失败）就追加下一个，
+        取最先返回的有效结果；慢的请求在后台自然结束，结果只用于更新熔断器。
+        熔断中的数据源在轮到它时跳过
+        """
+        pending = set()
+        next_index = 0
+        while True:
+            while next_index < len(providers):
+                name, fn = providers[next_index]
+                next_index += 1
+                if self.breakers[name].allow():
+                    pending.add(self._pool.submit(self._call_provider, name, fn, city))
+                    break
+            if not pending:
+                return None
+            
+            timeout = self.hedge_delay if next_index < len(providers) else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result:
+                    return result
+    
+    def peek_weather(self, city: str) -> tuple[Optional[str], bool]:
+        """
+        只读缓存，不访问网络
+        
+        Returns:
+            (缓存的天气信息, 是否仍在有效期内)；没有缓存或过期太久时返回 (None, False)
+        """
+        age = self._cache_age(city)
+        if age is None or age >= self.cache_duration + self.max_stale:
+            return None, False
+        return self.cache[city][1], age < self.cache_duration
+    
+    def refresh_in_background(self, city: str):
+        """在后台线程中刷新天气（同一城市同时只有一个刷新任务）"""
+        with self._refresh_lock:
+            if city in self._refreshing:
+                return
+            self._refreshing.add(city)
+        
+        threading.Thread(target=self._refresh, args=(city,), name=f"weather-{city}", daemon=True).start()
+    
+    def _refresh(self, city: str):
+        """刷新一个城市（调用方已在 _refreshing 中登记）"""
+        try:
+            if not self._acquire_refresh_lease(city):
+                logger.debug(f"其他进程正在刷新天气: {city}")
+                return
+            try:
+                self.fetch_weather(city)
+            finally:
+                self._release_refresh_lease(city)
+        except Exception as e:
+            logger.error(f"后台刷新天气失败 {city}: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(city)
+    
+    def _acquire_refresh_lease(self, city: str) -> bool:
+        """获取跨进程刷新租约；共享缓存不可用时总是返回 True"""
+        if self.shared is None:
+            return True
+        try:
+            return self.shared.try_lease(f"weather:{city}", self.refresh_lease)
+        except sqlite3.Error as e:
+            logger.warning(f"获取天气刷新租约失败: {e}")
+            return True
+    
+    def _release_refresh_lease(self, city: str):
+        """刷新完成后释放租约，其他进程不必等到过期"""
+        if self.shared is None:
+            return
+        try:
+            self.shared.release_lease(f"weather:{city}")
+        except sqlite3.Error as e:
+            logger.warning(f"释放天气刷新租约失败: {e}")
+    
+    def track_city(self, city: str):
+        """
+        登记需要保持新鲜的城市，并启动后台刷新线程
+        
+        后台线程在缓存快过期前主动刷新，调用方几乎总能拿到新鲜数据，不会等待网络。
+        """
+        with self._refresh_lock:
+            self._tracked_cities.add(city)
+            if self._refresher is None:
+                self._refresher = threading.Thread(
+                    target=self._refresh_loop, name="weather-refresher", daemon=True
+                )
+                self._refresher.start()
+                logger.info("天气后台刷新线程已启动")
+    
+    def _refresh_loop(self):
+        """后台刷新线程：定期检查登记的城市，快过期或已过期的提前刷新"""
+        while True:
+            with self._refresh_lock:
+                cities = list(self._tracked_cities)
+            
+            for city in cities:
+                age = self._cache_age(city)
+                if age is not None and age < self.cache_duration * self.refresh_ahead:
+                    continue
+                with self._refresh_lock:
+                    if city in self._refreshing:
+                        continue
+                    self._refreshing.add(city)
+                self._refresh(city)
+            
+            time.sleep(self.refresh_interval)
+    
     def _get_weather_qweather(self, city: str) -> Optional[str]:
         """
         使用和风天气API获取天气
@@ -96,7 +357,7 @@ class WeatherService:
                 "key": self.api_key
             }
             
-            response = requests.get(url, params=params, timeout=5)
+            response = self.session.get(url, params=params, timeout=5)
             response.raise_for_status()
             data = response.json()
             
@@ -148,7 +409,7 @@ class WeatherService:
             # 这个API不需要key，但有请求限制
             url = f"https://wttr.in/{city_pinyin}?format=j1&lang=zh"
             
-            response = requests.get(url, timeout=5)
+            response = self.session.get(url, timeout=5)
             response.raise_for_status()
             data = response.json()
             
@@ -194,7 +455,7 @@ class WeatherService:
             # 使用最简单的格式
             url = f"https://wttr.in/{city_pinyin}?format=%C+%t+湿度%h"
             
-            response = requests.get(url, timeout=5)
+            response = self.session.get(url, timeout=5)
             response.raise_for_status()
             
             weather_info = response.text.strip()
@@ -208,12 +469,15 @@ class WeatherService:
 
 # 全局单例
 _weather_service = None
+_weather_service_lock = threading.Lock()
 
 def get_weather_service(api_key: Optional[str] = None) -> WeatherService:
     """获取天气服务单例"""
     global _weather_service
     if _weather_service is None:
-        _weather_service = WeatherService(api_key=api_key)
+        with _weather_service_lock:
+            if _weather_service is None:
+                _weather_service = WeatherService(api_key=api_key)
     return _weather_service
 
 
@@ -236,6 +500,24 @@ def get_city_weather(city: str) -> str:
         return f"{city}天气信息暂时无法获取"
 
 
+def peek_city_weather(city: str) -> Optional[str]:
+    """
+    便捷函数：非阻塞地获取城市天气
+    
+    只返回缓存（过期的也返回），缓存缺失或过期时在后台刷新，绝不在调用线程里访问网络。
+    查询过的城市会登记到后台刷新线程，之后在过期前自动刷新。
+    
+    Returns:
+        天气信息字符串，尚无缓存时返回 None
+    """
+    service = get_weather_service()
+    service.track_city(city)
+    weather, fresh = service.peek_weather(city)
+    if not fresh:
+        service.refresh_in_background(city)
+    return weather
+
+
 if __name__ == "__main__":
     # 测试代码
     logging.basicConfig(
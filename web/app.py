@@ -1,57 +1,392 @@
 #!/usr/bin/env python3
 """简单的Web服务器，用于查看Agent的历史记忆"""
 
+import glob
+import hashlib
 import json
 import os
+import queue
+import sys
 import tempfile
+import threading
+import time
 from datetime import datetime
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, jsonify, request
+
+# 状态文件格式（快照 + 事件日志）由项目根目录的 status_publisher 定义
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from status_publisher import events_path_for, load_status
 
 app = Flask(__name__)
 
+STATUS_DIR = tempfile.gettempdir()
+STATUS_PREFIX = "irc_agent_"
+
+def status_file_for(nickname):
+    """agent 状态快照文件路径"""
+    return os.path.join(STATUS_DIR, f"{STATUS_PREFIX}{nickname}.json")
+
+def discover_agents():
+    """从状态目录中发现所有 agent（每个 agent 启动时都会写入 irc_agent_<nick>.json）"""
+    paths = glob.glob(os.path.join(glob.escape(STATUS_DIR), f"{STATUS_PREFIX}*.json"))
+    return sorted(os.path.basename(path)[len(STATUS_PREFIX):-len(".json")] for path in paths)
+
 def read_agent_status(nickname):
-    """从文件读取agent状态"""
-    status_file = os.path.join(tempfile.gettempdir(), f"irc_agent_{nickname}.json")
+    """从状态文件读取agent状态（快照 + 之后的增量事件）"""
+    status_file = status_file_for(nickname)
     
     try:
-        if not os.path.exists(status_file):
-            return None
-        
-        with open(status_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return data
+        return load_status(status_file)
     except Exception as e:
         print(f"读取 {nickname} 状态文件失败: {e}")
         return None
 
+def file_signature(status_file):
+    """快照和事件日志的 (mtime, size)，用来判断状态是否变化（文件不存在时为 None）"""
+    signature = []
+    for path in (status_file, events_path_for(status_file)):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+# 解析结果缓存：nickname -> (文件签名, 状态)，文件没变时不重新解析
+_status_cache = {}
+_status_cache_lock = threading.Lock()
+
+def get_agent_status(nickname):
+    """
+    读取agent状态（带缓存）
+
+    Returns:
+        (文件签名, 状态)；签名可用作 ETag，状态文件不存在时状态为 None
+    """
+    signature = file_signature(status_file_for(nickname))
+    with _status_cache_lock:
+        cached = _status_cache.get(nickname)
+    if cached and cached[0] == signature:
+        return cached
+    
+    if not signature[0]:
+        return signature, None
+    status = read_agent_status(nickname)
+    if status:
+        # 派生字段：最近一条消息（概览只需要这一条，不必传输整段历史）
+        history = status.get('conversation_history') or []
+        status['last_message'] = history[-1]['content'] if len(history) > 1 else None
+    with _status_cache_lock:
+        _status_cache[nickname] = (signature, status)
+    return signature, status
+
+def shape_status(status, fields=None, history=None):
+    """
+    按请求裁剪状态
+
+    Args:
+        fields: 只保留这些字段（nickname 总是保留），None 表示全部
+        history: 对话历史只保留最后 N 条，0 表示不返回历史，None 表示全部
+    """
+    if fields is not None:
+        status = {k: v for k, v in status.items() if k in fields or k == 'nickname'}
+    if history is not None and 'conversation_history' in status:
+        status = dict(status)
+        if history:
+            status['conversation_history'] = status['conversation_history'][-history:]
+        else:
+            del status['conversation_history']
+    return status
+
+def shape_args():
+    """从查询参数读取 fields（逗号分隔）和 history（非负整数）"""
+    fields = request.args.get('fields')
+    history = request.args.get('history')
+    if history is not None:
+        history = int(history)
+        if history < 0:
+            raise ValueError("history 不能为负数")
+    return (set(fields.split(',')) if fields else None), history
+
+def shape_delta(delta, fields=None, omit_history=False):
+    """
+    按订阅参数裁剪推送的增量
+
+    Returns:
+        裁剪后的增量；裁剪后没有任何变化时返回 None
+    """
+    if 'status' in delta:
+        history = 0 if omit_history else None
+        return {'nickname': delta['nickname'], 'status': shape_status(delta['status'], fields, history)}
+    if 'fields' not in delta:
+        return delta
+    
+    shaped = {'nickname': delta['nickname'], 'fields': delta['fields']}
+    if fields is not None:
+        shaped['fields'] = {k: v for k, v in delta['fields'].items() if k in fields}
+    if 'history' in delta and not omit_history and (fields is None or 'conversation_history' in fields):
+        shaped['history'] = delta['history']
+    if not shaped['fields'] and 'history' not in shaped:
+        return None
+    return shaped
+
+def make_etag(signatures):
+    """由状态文件签名生成 ETag"""
+    return hashlib.sha1(repr(signatures).encode('utf-8')).hexdigest()[:16]
+
+def conditional_json(etag, build):
+    """带 ETag 的 JSON 响应：浏览器缓存仍然有效时返回 304，不生成响应体"""
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # 每次都向服务器确认，但可以复用缓存
+    return response
+
+def diff_status(old, new):
+    """
+    计算两个状态之间的增量
+
+    Returns:
+        {'fields': 变化的字段, 'history': {'drop': 从最旧处淘汰的条数, 'append': 新增的消息}}；
+        系统提示变化时返回 {'status': new}（整体替换）
+    """
+    old_history = old.get('conversation_history') or []
+    new_history = new.get('conversation_history') or []
+    if old_history[:1] != new_history[:1]:
+        return {'status': new}
+    
+    fields = {k: v for k, v in new.items() if k != 'conversation_history' and old.get(k) != v}
+    delta = {'fields': fields}
+    # 历史只会从头部淘汰、在尾部追加：找到旧历史中仍保留的部分
+    old_messages, new_messages = old_history[1:], new_history[1:]
+    drop = next(k for k in range(len(old_messages) + 1)
+                if new_messages[:len(old_messages) - k] == old_messages[k:])
+    append = new_messages[len(old_messages) - drop:]
+    if drop or append:
+        delta['history'] = {'drop': drop, 'append': append}
+    return delta
+
+# 推送队列满时（浏览器读得太慢）清空队列并放入此标记，改为重新推送全部状态
+RESYNC = object()
+
+class StatusWatcher:
+    """
+    后台监视 agent 状态文件，把变化推送给所有订阅者
+
+    所有浏览器连接共用一个监视线程：每 interval 秒 stat 一次状态文件，
+    只有文件变化时才重新解析，并计算增量推送。没有订阅者时不做任何磁盘读取。
+    """
+    
+    def __init__(self, interval=1.0, max_queue=100):
+        self.interval = interval
+        self.max_queue = max_queue
+        self._statuses = {}
+        self._signatures = {}
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._has_subscribers = threading.Event()
+        self._worker = None
+    
+    def subscribe(self):
+        """
+        订阅状态变化
+
+        Returns:
+            (队列, 当前全部状态)；之后的变化从队列中按顺序取出
+        """
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="status-watcher", daemon=True)
+                self._worker.start()
+            self._poll()
+            subscriber = queue.Queue(maxsize=self.max_queue)
+            self._subscribers.add(subscriber)
+            self._has_subscribers.set()
+            return subscriber, dict(self._statuses)
+    
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                self._has_subscribers.clear()
+    
+    def resync(self, subscriber):
+        """清空订阅者积压的增量，返回当前全部状态"""
+        with self._lock:
+            while not subscriber.empty():
+                subscriber.get_nowait()
+            return dict(self._statuses)
+    
+    def _run(self):
+        while True:
+            self._has_subscribers.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                self._poll()
+    
+    def _poll(self):
+        """检查所有状态文件，有变化的重新读取并推送增量（调用方持有 _lock）"""
+        nicknames = set(discover_agents()) | set(self._statuses)
+        for nickname in sorted(nicknames):
+            signature, new = get_agent_status(nickname)
+            if signature == self._signatures.get(nickname):
+                continue
+            self._signatures[nickname] = signature
+            
+            old = self._statuses.get(nickname)
+            if new is None:
+                if old is None:
+                    continue
+                del self._statuses[nickname]
+                delta = {'removed': True}
+            else:
+                self._statuses[nickname] = new
+                delta = diff_status(old, new) if old else {'status': new}
+                if delta == {'fields': {}}:
+                    continue
+            delta['nickname'] = nickname
+            self._broadcast(delta)
+    
+    def _broadcast(self, delta):
+        for subscriber in self._subscribers:
+            try:
+                subscriber.put_nowait(delta)
+            except queue.Full:
+                while not subscriber.empty():
+                    subscriber.get_nowait()
+                subscriber.put_nowait(RESYNC)
+
+watcher = StatusWatcher()
+
+def format_sse(event, data):
+    """格式化一条 Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @app.route('/')
 def index():
     """主页面"""
     return render_template('index.html')
 
+def bad_request(e):
+    return jsonify({'error': f'参数错误: {e}'}), 400
+
 @app.route('/api/agents')
 def get_agents():
-    """获取所有agent状态的API"""
+    """
+    获取所有agent状态的API
+
+    查询参数:
+        fields: 只返回这些字段（逗号分隔），如 fields=max_bot_turns,last_message
+        history: 对话历史只返回最后 N 条，history=0 只返回元数据
+    """
+    try:
+        fields, history = shape_args()
+    except ValueError as e:
+        return bad_request(e)
+    
     agents_data = {}
+    signatures = []
     
-    # 读取三个agent的状态文件
-    for nickname in ['mingxuan', 'yueran', 'zhiyuan']:
-        data = read_agent_status(nickname)
+    # 读取状态目录中所有agent的状态文件
+    for nickname in discover_agents():
+        signature, data = get_agent_status(nickname)
+        signatures.append((nickname, signature))
         if data:
-            agents_data[nickname] = data
+            agents_data[nickname] = shape_status(data, fields, history)
     
-    return jsonify(agents_data)
+    etag = make_etag((signatures, request.query_string))
+    return conditional_json(etag, lambda: agents_data)
 
 @app.route('/api/agents/<agent_name>')
 def get_agent(agent_name):
-    """获取特定agent状态的API"""
-    data = read_agent_status(agent_name)
+    """获取特定agent状态的API（支持与 /api/agents 相同的 fields、history 参数）"""
+    try:
+        fields, history = shape_args()
+    except ValueError as e:
+        return bad_request(e)
+    
+    signature, data = get_agent_status(agent_name)
     
     if data:
-        return jsonify(data)
+        etag = make_etag((signature, request.query_string))
+        return conditional_json(etag, lambda: shape_status(data, fields, history))
     else:
         return jsonify({'error': 'Agent not found'}), 404
 
+@app.route('/api/agents/<agent_name>/history')
+def get_agent_history(agent_name):
+    """
+    分页获取agent的对话历史（从最新往前翻）
+
+    查询参数:
+        limit: 每页条数（1~500，默认50）
+        before: 只返回下标小于此值的消息（上一页返回的 next_before），默认从最新开始
+    """
+    signature, data = get_agent_status(agent_name)
+    if not data:
+        return jsonify({'error': 'Agent not found'}), 404
+    
+    history = data.get('conversation_history') or []
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        before = min(int(request.args.get('before', len(history))), len(history))
+    except ValueError as e:
+        return bad_request(e)
+    start = max(before - limit, 0)
+    
+    def build():
+        return {
+            'nickname': agent_name,
+            'total': len(history),
+            'messages': [{'index': i, **history[i]} for i in range(start, before)],
+            'next_before': start if start > 0 else None
+        }
+    
+    return conditional_json(make_etag((signature, request.query_string)), build)
+
+@app.route('/api/stream')
+def stream_agents():
+    """
+    Server-Sent Events：连接时推送全部状态，之后只推送变化的部分
+
+    查询参数:
+        fields: 只推送这些字段（逗号分隔）
+        history: history=0 时不推送对话历史（概览页面只需要 last_message）
+    """
+    try:
+        fields, history = shape_args()
+    except ValueError as e:
+        return bad_request(e)
+    omit_history = history == 0
+    
+    def generate():
+        def snapshot(statuses):
+            return format_sse('snapshot', {name: shape_status(status, fields, 0 if omit_history else None)
+                                           for name, status in statuses.items()})
+        
+        subscriber, statuses = watcher.subscribe()
+        try:
+            yield snapshot(statuses)
+            while True:
+                try:
+                    delta = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ': keepalive\n\n'  # 保持连接，及时发现浏览器已断开
+                    continue
+                if delta is RESYNC:
+                    yield snapshot(watcher.resync(subscriber))
+                    continue
+                delta = shape_delta(delta, fields, omit_history)
+                if delta:
+                    yield format_sse('delta', delta)
+        finally:
+            watcher.unsubscribe(subscriber)
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 def start_web_server():
     """启动web服务器"""
     app.run(host='127.0.0.1', port=5000, debug=False, use_reloader=False)